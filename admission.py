@@ -0,0 +1,153 @@
+"""
+Допуск апдейтов к обработчикам.
+
+Без него PTB обрабатывает апдейты по одному, и пользователь, который
+жмёт кнопки без остановки, задерживает всех остальных. AdmissionControl
+подключается через Application.builder().concurrent_updates(...) и
+* обрабатывает не больше `concurrency` апдейтов одновременно;
+* ограничивает каждого пользователя ведром токенов: `rate` апдейтов в
+  секунду со всплесками до `burst`; лишние отбрасываются до обработчика.
+  Inline-запросы под ограничение не попадают: при поиске по мере набора
+  отброшенным оказывался бы последний, нужный запрос, а клиент показывал
+  бы устаревшие результаты; частоту inline-запросов и так сдерживает
+  клиент Telegram;
+* повторное нажатие той же кнопки в том же сообщении, пока первое ещё
+  обрабатывается или только что обработано, не запускает обработчик
+  второй раз.
+
+Проверки выполняются уже после того, как апдейт получил слот, но
+стоят микросекунды, так что отброшенный апдейт почти не занимает его.
+Отброшенному нажатию кнопки отвечают answerCallbackQuery, чтобы у
+пользователя не висели часики, но не чаще раза в секунду на пользователя:
+иначе каждый лишний апдейт стоил бы запроса к Bot API. Ответ уходит в
+фоне и не держит слот.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+
+from telegram.ext import BaseUpdateProcessor
+
+from metrics import admission_rejected
+from sender import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд после обработки нажатия повтор той же кнопки считается дублем
+DUPLICATE_WINDOW = 1.0
+# Не чаще чем раз во столько секунд отвечать пользователю на отброшенные нажатия
+ANSWER_INTERVAL = 1.0
+# Раз во сколько секунд забывать полные вёдра неактивных пользователей
+BUCKET_SWEEP_INTERVAL = 60.0
+
+RATE_LIMITED_TEXT = "⏳ Слишком часто, подождите немного"
+
+
+class AdmissionControl(BaseUpdateProcessor):
+    def __init__(self, concurrency: int = 32, rate: float = 2.0, burst: float = 8.0):
+        super().__init__(concurrency)
+        self.rate = rate
+        self.burst = burst
+        self.in_flight = 0
+        self._buckets = {}
+        self._swept = time.monotonic()
+        # Нажатия ((чат, сообщение), данные кнопки) в обработке и последнее
+        # обработанное нажатие в каждом сообщении со временем, до которого его повтор — дубль
+        self._pressing = set()
+        self._pressed = {}
+        self._expiry = deque()
+        # Фоновые ответы на отброшенные нажатия: ссылки, чтобы задачи не собрал GC
+        self._answers = set()
+        self._answered_at = {}
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        if self._answers:
+            await asyncio.gather(*self._answers, return_exceptions=True)
+
+    def _allow(self, user_id: int, now: float) -> bool:
+        if now - self._swept > BUCKET_SWEEP_INTERVAL:
+            self._sweep(now)
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(self.rate, self.burst, now)
+        if bucket.delay(now) > 0:
+            return False
+        bucket.take(now)
+        return True
+
+    def _sweep(self, now: float):
+        self._buckets = {user_id: bucket for user_id, bucket in self._buckets.items()
+                         if bucket.full_in(now) > 0}
+        self._answered_at = {user_id: at for user_id, at in self._answered_at.items()
+                             if now - at < ANSWER_INTERVAL}
+        self._swept = now
+
+    def _press(self, update):
+        query = getattr(update, "callback_query", None)
+        if query is None or query.message is None:
+            return None
+        return (query.message.chat.id, query.message.message_id), query.data
+
+    def _is_duplicate(self, press, now: float) -> bool:
+        while self._expiry and self._expiry[0][0] <= now:
+            expires, message = self._expiry.popleft()
+            last = self._pressed.get(message)
+            if last is not None and last[1] == expires:
+                del self._pressed[message]
+        if press in self._pressing:
+            return True
+        # Нажатие другой кнопки между повторами — не дубль: «назад» и снова тот же раздел
+        message, data = press
+        last = self._pressed.get(message)
+        return last is not None and last[0] == data
+
+    def _answer(self, query, text=None):
+        task = asyncio.create_task(query.answer(text))
+        self._answers.add(task)
+        task.add_done_callback(self._answered)
+
+    def _answered(self, task):
+        self._answers.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug("Не удалось ответить на отброшенное нажатие: %s", task.exception())
+
+    def _reject(self, update, coroutine, reason: str, now: float, text=None):
+        coroutine.close()
+        admission_rejected.inc((reason,))
+        query = getattr(update, "callback_query", None)
+        if query is None:
+            return
+        user_id = query.from_user.id
+        if now - self._answered_at.get(user_id, -ANSWER_INTERVAL) >= ANSWER_INTERVAL:
+            self._answered_at[user_id] = now
+            self._answer(query, text)
+
+    async def do_process_update(self, update, coroutine):
+        now = time.monotonic()
+        press = self._press(update)
+        if press is not None and self._is_duplicate(press, now):
+            self._reject(update, coroutine, "duplicate", now)
+            return
+        user = getattr(update, "effective_user", None)
+        inline = getattr(update, "inline_query", None) is not None
+        if user is not None and not inline and not self._allow(user.id, now):
+            self._reject(update, coroutine, "rate", now, RATE_LIMITED_TEXT)
+            return
+
+        if press is not None:
+            self._pressing.add(press)
+        self.in_flight += 1
+        try:
+            await coroutine
+        finally:
+            self.in_flight -= 1
+            if press is not None:
+                self._pressing.discard(press)
+                message, data = press
+                expires = time.monotonic() + DUPLICATE_WINDOW
+                self._pressed[message] = (data, expires)
+                self._expiry.append((expires, message))
@@ -0,0 +1,189 @@
+"""
+Статистика использования: что открывают, что ищут и сколько это стоит.
+
+Обработчики записывают события — вид апдейта с временем обработки,
+открытый раздел и материал, нормализованный поисковый запрос — в
+кольцевой буфер в памяти: запись события — добавление кортежа в deque,
+без обращения к базе. Если буфер переполнится раньше сброса, теряются
+самые старые события. Фоновая задача раз в FLUSH_INTERVAL секунд
+переносит буфер в usage_events одной пачкой, а раз в ROLLUP_INTERVAL
+сворачивает сырые события в дневные счётчики usage_daily и удаляет их.
+
+По usage_daily бот при запуске прогревает кеши самыми популярными за
+WARM_DAYS дней материалами и запросами (см. warm_caches в main.py).
+Отчёт из консоли:
+
+    python analytics.py --days 7
+"""
+import argparse
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import date, timedelta
+
+from metrics import usage_events_dropped
+
+logger = logging.getLogger(__name__)
+
+BUFFER_SIZE = 10000
+FLUSH_INTERVAL = 5.0
+ROLLUP_INTERVAL = 600.0
+# Сколько дней хранить дневные счётчики и за сколько дней брать популярное для прогрева
+KEEP_DAYS = 90
+WARM_DAYS = 7
+
+
+def init_usage(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS usage_events (
+            at REAL NOT NULL,
+            event TEXT NOT NULL,
+            key TEXT NOT NULL,
+            latency REAL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS usage_daily (
+            day TEXT NOT NULL,
+            event TEXT NOT NULL,
+            key TEXT NOT NULL,
+            hits INTEGER NOT NULL,
+            latency_sum REAL NOT NULL,
+            PRIMARY KEY (day, event, key)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _insert(conn, rows):
+    conn.executemany("INSERT INTO usage_events (at, event, key, latency) VALUES (?, ?, ?, ?)", rows)
+
+
+def _rollup(conn, keep_from):
+    # Сворачиваем только то, что уже есть: события, вставленные после max(rowid), дождутся следующего раза
+    last = conn.execute("SELECT max(rowid) FROM usage_events").fetchone()[0]
+    if last is not None:
+        conn.execute('''
+            INSERT INTO usage_daily (day, event, key, hits, latency_sum)
+            SELECT date(at, 'unixepoch', 'localtime'), event, key, count(*), total(latency)
+            FROM usage_events WHERE rowid <= ?
+            GROUP BY 1, 2, 3
+            ON CONFLICT (day, event, key) DO UPDATE
+            SET hits = hits + excluded.hits, latency_sum = latency_sum + excluded.latency_sum
+        ''', (last,))
+        conn.execute("DELETE FROM usage_events WHERE rowid <= ?", (last,))
+    conn.execute("DELETE FROM usage_daily WHERE day < ?", (keep_from,))
+
+
+def _hottest(conn, event, since, limit):
+    return conn.execute('''
+        SELECT key, sum(hits), sum(latency_sum) FROM usage_daily
+        WHERE event = ? AND day >= ?
+        GROUP BY key ORDER BY sum(hits) DESC LIMIT ?
+    ''', (event, since, limit)).fetchall()
+
+
+def _since(days: int) -> str:
+    return (date.today() - timedelta(days=days)).isoformat()
+
+
+class UsageLog:
+    """
+    Кольцевой буфер событий с фоновым сбросом. События:
+    handler (вид апдейта, время обработки), section и material (id),
+    query (запрос после нормализации). Запись идёт через `writer`
+    (база или RemoteWriter рабочего процесса).
+    """
+
+    def __init__(self, db, size: int = BUFFER_SIZE, writer=None):
+        self.db = db
+        self.writer = writer or db
+        self._buffer = deque(maxlen=size)
+        self._task = None
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def record(self, event: str, key, latency=None):
+        if len(self._buffer) == self._buffer.maxlen:
+            usage_events_dropped.inc()
+        self._buffer.append((time.time(), event, str(key), latency))
+
+    def handler(self, handler: str, kind: str, latency: float):
+        """Наблюдатель для metrics.timed: вид кнопки, а для команд — имя обработчика."""
+        self.record("handler", kind or handler, latency)
+
+    async def hottest(self, event: str, limit: int, days: int = WARM_DAYS):
+        """Самые частые ключи события за days дней: [(ключ, обращений, суммарное время)]."""
+        return await self.db.run(_hottest, event, _since(days), limit)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        await self.writer.run(_rollup, _since(KEEP_DAYS))
+
+    async def _loop(self):
+        rolled_up = time.monotonic()
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                await self.flush()
+                if time.monotonic() - rolled_up >= ROLLUP_INTERVAL:
+                    await self.writer.run(_rollup, _since(KEEP_DAYS))
+                    rolled_up = time.monotonic()
+            except Exception:
+                logger.exception("Не удалось сохранить статистику использования")
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        rows = list(self._buffer)
+        self._buffer.clear()
+        await self.writer.run(_insert, rows)
+
+
+def main():
+    from db import DB_PATH, Database
+    from migrations import migrate
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--days", type=int, default=WARM_DAYS, help="за сколько дней")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    db = Database(args.db, size=1)
+    db.open()
+    try:
+        with db.connection() as conn:
+            migrate(conn)
+            _rollup(conn, _since(KEEP_DAYS))
+            conn.commit()
+            titles = dict(conn.execute("SELECT id, title FROM materials"))
+            names = dict(conn.execute("SELECT id, name FROM sections"))
+            for event, caption, label in (
+                    ("handler", "Апдейты (обращений, среднее время)", None),
+                    ("section", "Разделы", names),
+                    ("material", "Материалы", titles),
+                    ("query", "Запросы", None)):
+                print(f"\n{caption} за {args.days} дн.:")
+                for key, hits, latency_sum in _hottest(conn, event, _since(args.days), args.top):
+                    name = label.get(int(key), key) if label else key
+                    average = f"  {latency_sum / hits * 1000:.1f} мс" if event == "handler" else ""
+                    print(f"{hits:>8}  {name}{average}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Рассылка большому числу подписчиков без сети.
+
+Заполняет копию базы подписчиками, часть из которых «заблокировала» бота,
+и рассылает им сообщение через OutboundScheduler с заглушкой вместо
+Bot API. Посередине рассылка прерывается, как при падении процесса, и
+продолжается новым Broadcaster с сохранённого курсора. Одновременно раз в
+100 мс уходит интерактивное сообщение — печатается, сколько оно ждало в
+очереди за рассылкой.
+
+    python benchmarks/bench_broadcast.py --subscribers 100000 --rate 5000
+
+При реальном лимите 30 сообщений в секунду время рассылки — число
+подписчиков / 30; бенчмарк с большим --rate меряет накладные расходы бота.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+sys.path.insert(0, ROOT)
+
+from telegram.error import Forbidden  # noqa: E402
+
+import broadcast  # noqa: E402
+from broadcast import Broadcaster  # noqa: E402
+from db import Database  # noqa: E402
+from migrations import migrate  # noqa: E402
+from normalize import register_functions  # noqa: E402
+from sender import OutboundScheduler  # noqa: E402
+
+BLOCKED_EVERY = 50
+# chat_id интерактивных сообщений, чтобы не путать их с подписчиками
+INTERACTIVE_CHATS = 10 ** 9
+
+
+class FakeBot:
+    def __init__(self, latency):
+        self.latency = latency
+        self.deliveries = {}
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(self.latency)
+        if chat_id < INTERACTIVE_CHATS and chat_id % BLOCKED_EVERY == 0:
+            raise Forbidden("Forbidden: bot was blocked by the user")
+        self.deliveries[chat_id] = self.deliveries.get(chat_id, 0) + 1
+
+
+def fill(path, count):
+    conn = sqlite3.connect(path)
+    register_functions(conn)
+    migrate(conn)
+    now = time.time()
+    conn.executemany("INSERT OR IGNORE INTO subscriptions (chat_id, subscribed_at) VALUES (?, ?)",
+                     ((chat_id, now) for chat_id in range(1, count + 1)))
+    broadcast._create(conn, "notice:bench", "notice", "Новый раздел: ряды", None, now)
+    conn.commit()
+    conn.close()
+
+
+async def run(args, db):
+    bot = FakeBot(args.latency)
+    outbound = OutboundScheduler(global_rate=args.rate, chat_rate=1.0)
+    outbound.start()
+    waits = []
+
+    async def interactive(stop):
+        user = INTERACTIVE_CHATS
+        while not stop.is_set():
+            started = time.perf_counter()
+            await outbound.send(user, bot.send_message, user, "ответ")
+            waits.append(time.perf_counter() - started - args.latency)
+            user += 1
+            await asyncio.sleep(0.1)
+
+    stop = asyncio.Event()
+    background = asyncio.create_task(interactive(stop))
+    started = time.perf_counter()
+
+    first = Broadcaster(db, outbound)
+    first._bot = bot
+    task = asyncio.create_task(first.deliver("notice:bench", "Новый раздел: ряды", None))
+    await asyncio.sleep(args.subscribers / args.rate / 2)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    # «Перезапуск»: новый объект читает курсор из базы
+    key, text, parse_mode, last_chat_id = (await db.run(broadcast._pending))[0]
+    print(f"Прервано на chat_id {last_chat_id}")
+    second = Broadcaster(db, outbound)
+    second._bot = bot
+    await second.deliver(key, text, parse_mode, last_chat_id)
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await background
+    await outbound.stop()
+
+    row = await db.run(lambda conn: conn.execute(
+        "SELECT sent, failed, blocked FROM broadcasts WHERE key = 'notice:bench'").fetchone())
+    left = await db.run(lambda conn: conn.execute("SELECT count(*) FROM subscriptions").fetchone()[0])
+    repeated = sum(1 for count in bot.deliveries.values() if count > 1)
+    received = sum(1 for chat_id in bot.deliveries if chat_id < INTERACTIVE_CHATS)
+    print(f"Подписчиков: {args.subscribers}, время: {elapsed:.1f} с, "
+          f"{args.subscribers / elapsed:.0f} сообщений/с при лимите {args.rate:.0f}/с")
+    print(f"Получили: {received}, повторно: {repeated}, заблокировали: {row[2]}, ошибок: {row[1]}, "
+          f"осталось подписчиков: {left}")
+    waits_ms = sorted(wait * 1000 for wait in waits)
+    print(f"Интерактивные сообщения во время рассылки: {len(waits_ms)}, ожидание "
+          f"p50 {statistics.median(waits_ms):.1f} мс, max {waits_ms[-1]:.1f} мс")
+    print(f"При лимите 30/с рассылка заняла бы {args.subscribers / 30 / 60:.0f} мин")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=100000)
+    parser.add_argument("--rate", type=float, default=5000.0, help="глобальный лимит, сообщений/с")
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка ответа Bot API, с")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "math_bot.db")
+        shutil.copy(os.path.join(ROOT, "math_bot.db"), path)
+        fill(path, args.subscribers)
+        db = Database(path)
+        db.open()
+        try:
+            asyncio.run(run(args, db))
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
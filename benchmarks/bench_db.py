@@ -0,0 +1,109 @@
+"""
+Сравнение старого доступа к базе (sqlite3.connect() на каждый вызов прямо
+в обработчике) с пулом соединений из db.py.
+
+Каждый «пользователь» — корутина, которая обрабатывает поток апдейтов:
+делает те же чтения, что и обработчики кнопок, и ждёт имитацию ответа
+Telegram API. Отдельная корутина меряет задержку event loop.
+
+    python benchmarks/bench_db.py --users 200 --updates 20
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+from db import DB_PATH, Database  # noqa: E402
+
+
+def legacy_reads(path, section_id, material_id):
+    # Копия прежних get_sections / get_section_materials / запроса из show_material
+    conn = sqlite3.connect(path)
+    conn.execute("SELECT id, name, description FROM sections ORDER BY id").fetchall()
+    conn.close()
+    conn = sqlite3.connect(path)
+    conn.execute("SELECT id, title, content FROM materials WHERE section_id = ?", (section_id,)).fetchall()
+    conn.close()
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        SELECT m.title, m.content, s.name
+        FROM materials m
+        JOIN sections s ON m.section_id = s.id
+        WHERE m.id = ?
+    ''', (material_id,)).fetchone()
+    conn.close()
+
+
+def pooled_reads(conn, section_id, material_id):
+    conn.execute("SELECT id, name, description FROM sections ORDER BY id").fetchall()
+    conn.execute("SELECT id, title, content FROM materials WHERE section_id = ?", (section_id,)).fetchall()
+    conn.execute('''
+        SELECT m.title, m.content, s.name
+        FROM materials m
+        JOIN sections s ON m.section_id = s.id
+        WHERE m.id = ?
+    ''', (material_id,)).fetchone()
+
+
+async def measure_lag(stop: asyncio.Event, interval=0.001):
+    worst = 0.0
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        worst = max(worst, loop.time() - started - interval)
+    return worst
+
+
+async def run(mode, path, users, updates, api_latency):
+    db = None
+    if mode == "pool":
+        db = Database(path)
+        db.open()
+
+    async def user(n):
+        for i in range(updates):
+            section_id = (n + i) % 5 + 1
+            material_id = (n * 7 + i) % 17 + 1
+            if db is None:
+                legacy_reads(path, section_id, material_id)
+            else:
+                await db.run(pooled_reads, section_id, material_id)
+            await asyncio.sleep(api_latency)
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_lag(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(user(n) for n in range(users)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    worst_lag = await lag_task
+    if db is not None:
+        db.close()
+    return users * updates / elapsed, worst_lag
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--updates", type=int, default=20)
+    parser.add_argument("--api-latency", type=float, default=0.005, help="имитация ответа Telegram, сек")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        shutil.copy(os.path.join(ROOT, DB_PATH), path)
+        for mode in ("legacy", "pool"):
+            rate, lag = asyncio.run(run(mode, path, args.users, args.updates, args.api_latency))
+            print(f"{mode:>6}: {rate:8.0f} updates/s, max event loop stall {lag * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Микробенчмарк отрисовки материала: полная обработка на каждый просмотр
+(html.escape, замена слэшей, нарезка) против выдачи готовых частей.
+С --check сначала проверяет нарезку на случайных текстах: страницы не
+длиннее лимита, текст не теряется и нет страниц из одних пробелов
+(Telegram не примет пустой текст при листании).
+
+    python benchmarks/bench_render.py --sizes 4000 50000 500000 --check 20000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+from render import MAX_MESSAGE_LEN, render_material, split_pages, utf16_len  # noqa: E402
+
+SAMPLE = "Пусть a < b и 1/n → 0, тогда ∀ε>0 ∃N∈ℕ ∀n≥N: |xₙ - a| < ε & sup X ≤ M.\n"
+
+
+def per_call_us(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def check_pages(count):
+    rnd = random.Random(1)
+    pieces = (lambda: "а" * rnd.randint(0, 5000), lambda: " " * rnd.randint(0, 400),
+              lambda: "\n" * rnd.randint(0, 5), lambda: "слово " * rnd.randint(0, 900),
+              lambda: "𝔼" * rnd.randint(0, 300))
+    for _ in range(count):
+        text = "".join(rnd.choice(pieces)() for _ in range(rnd.randint(1, 6)))
+        first_limit = rnd.randint(3000, MAX_MESSAGE_LEN)
+        pages = split_pages(text, first_limit)
+        assert "".join(text.split()) == "".join("".join(pages).split()), "потерян текст"
+        for n, page in enumerate(pages):
+            assert utf16_len(page) <= (first_limit if n == 0 else MAX_MESSAGE_LEN), f"страница {n} длиннее лимита"
+            assert n == 0 or page.strip(), f"страница {n} из одних пробелов"
+    print(f"Нарезка: {count} случайных текстов без ошибок")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[4000, 50000, 500000])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--check", type=int, default=0, help="сколько случайных текстов проверить")
+    args = parser.parse_args()
+
+    if args.check:
+        check_pages(args.check)
+
+    for size in args.sizes:
+        content = (SAMPLE * (size // len(SAMPLE) + 1))[:size]
+        rendered = {1: render_material("Материал", content)}
+        render_us = per_call_us(lambda: render_material("Материал", content), args.repeat)
+        lookup_us = per_call_us(lambda: rendered.get(1), args.repeat)
+        print(f"{size:>8} символов: отрисовка {render_us:10.1f} мкс, готовые части {lookup_us:6.2f} мкс "
+              f"({len(rendered[1])} частей)")
+
+
+if __name__ == "__main__":
+    main()
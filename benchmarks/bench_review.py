@@ -0,0 +1,132 @@
+"""
+Повторение карточек на большой базе без сети.
+
+Заполняет копию базы состоянием повторения: --users пользователей по
+--cards карточек со сроками в прошлом и будущем. Печатает время загрузки
+кучи напоминаний, задержку выбора следующей карточки и оценки для
+случайных пользователей и скорость рассылки напоминаний пачками через
+OutboundScheduler с заглушкой вместо Bot API.
+
+    python benchmarks/bench_review.py --users 100000 --cards 14
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+sys.path.insert(0, ROOT)
+
+import review  # noqa: E402
+from catalog import Catalog  # noqa: E402
+from db import Database  # noqa: E402
+from migrations import migrate  # noqa: E402
+from normalize import register_functions  # noqa: E402
+from review import DAY, ReviewEngine  # noqa: E402
+from sender import OutboundScheduler  # noqa: E402
+
+
+class FakeBot:
+    def __init__(self, latency):
+        self.latency = latency
+        self.sent = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.sent += 1
+
+
+def fill(path, users, cards):
+    conn = sqlite3.connect(path)
+    register_functions(conn)
+    migrate(conn)
+    card_ids = [row[0] for row in conn.execute("SELECT id FROM materials")]
+    rng = random.Random(1)
+    now = time.time()
+    for first in range(1, users + 1, 10000):
+        card_rows = []
+        user_rows = []
+        for user_id in range(first, min(first + 10000, users + 1)):
+            dues = [now + rng.uniform(-5, 30) * DAY for _ in range(cards)]
+            card_rows.extend((user_id, card_id, due, 6.0, 2.5, 2, 0)
+                             for card_id, due in zip(rng.choices(card_ids, k=cards), dues))
+            user_rows.append((user_id, min(dues), now - rng.uniform(0, 3) * DAY))
+        conn.executemany("INSERT OR IGNORE INTO review_cards VALUES (?, ?, ?, ?, ?, ?, ?)", card_rows)
+        conn.executemany("INSERT INTO review_users VALUES (?, ?, ?)", user_rows)
+    conn.commit()
+    conn.close()
+
+
+def percentiles(samples):
+    samples = sorted(sample * 1000 for sample in samples)
+    return f"p50 {statistics.median(samples):.2f} мс, p99 {samples[int(len(samples) * 0.99)]:.2f} мс"
+
+
+async def run(args, db):
+    catalog = Catalog(db)
+    catalog.load_sync()
+    outbound = OutboundScheduler(global_rate=args.rate, chat_rate=1.0)
+    outbound.start()
+    engine = ReviewEngine(db, catalog, outbound)
+
+    started = time.perf_counter()
+    engine.load_sync()
+    print(f"Куча напоминаний: {engine.scheduled} пользователей за {time.perf_counter() - started:.2f} с")
+
+    rng = random.Random(2)
+    lookups = []
+    grades = []
+    for _ in range(args.samples):
+        user_id = rng.randint(1, args.users)
+        started = time.perf_counter()
+        card = await engine.next_card(user_id)
+        lookups.append(time.perf_counter() - started)
+        if card is not None:
+            started = time.perf_counter()
+            await engine.grade(user_id, card[0].id, rng.choice((1, 3, 4, 5)))
+            grades.append(time.perf_counter() - started)
+    print(f"Следующая карточка: {percentiles(lookups)}")
+    print(f"Оценка: {percentiles(grades)}")
+
+    engine._bot = bot = FakeBot(args.latency)
+    started = time.perf_counter()
+    batches = 0
+    while await engine.remind_due() == review.REMIND_BATCH:
+        batches += 1
+    elapsed = time.perf_counter() - started
+    print(f"Напоминания: {bot.sent} за {elapsed:.1f} с пачками по {review.REMIND_BATCH} "
+          f"({batches + 1} пачек), {bot.sent / elapsed:.0f}/с при лимите {args.rate:.0f}/с")
+    await outbound.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--cards", type=int, default=14, help="карточек на пользователя")
+    parser.add_argument("--samples", type=int, default=2000, help="сколько раз выбрать и оценить карточку")
+    parser.add_argument("--rate", type=float, default=5000.0, help="глобальный лимит, сообщений/с")
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка ответа Bot API, с")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "math_bot.db")
+        shutil.copy(os.path.join(ROOT, "math_bot.db"), path)
+        started = time.perf_counter()
+        fill(path, args.users, args.cards)
+        print(f"База заполнена за {time.perf_counter() - started:.1f} с")
+        db = Database(path)
+        db.open()
+        try:
+            asyncio.run(run(args, db))
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Время поиска FTS5 против прежнего LIKE '%q%' на синтетическом корпусе
+и цена дальних страниц: OFFSET против курсора (rank, id).
+
+    python benchmarks/bench_search.py --materials 20000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+from search import _RANK, _search, build_match_query, init_normalized_search  # noqa: E402
+
+WORDS = (
+    "предел последовательности сходится ограничена монотонная аксиома полноты "
+    "супремум инфимум множество число доказательство противного индукция "
+    "критерий коши теорема вейерштрасса непрерывность функция отрезок"
+).split()
+QUERIES = ("предел", "аксиомы", "критерий коши", "супремум множества", "индукция")
+
+
+def fill(conn, count):
+    conn.execute("CREATE TABLE sections (id INTEGER PRIMARY KEY, name TEXT, description TEXT)")
+    conn.execute('''
+        CREATE TABLE materials (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            section_id INTEGER, title TEXT NOT NULL, content TEXT NOT NULL
+        )
+    ''')
+    conn.execute("INSERT INTO sections VALUES (1, 'Раздел', '')")
+    init_normalized_search(conn)
+    rnd = random.Random(1)
+    # Термины из WORDS встречаются редко, остальное — разнообразный «шум»
+    filler = [f"слово{n}" for n in range(50000)]
+
+    def text(k):
+        return " ".join(rnd.choice(WORDS) if rnd.random() < 0.01 else rnd.choice(filler) for _ in range(k))
+
+    conn.executemany(
+        "INSERT INTO materials (section_id, title, content) VALUES (1, ?, ?)",
+        ((text(3), text(300)) for _ in range(count)),
+    )
+    conn.commit()
+
+
+def like_search(conn, query):
+    return conn.execute('''
+        SELECT m.id, m.title, m.content, s.name
+        FROM materials m
+        JOIN sections s ON m.section_id = s.id
+        WHERE m.title LIKE ? OR m.content LIKE ?
+    ''', (f'%{query}%', f'%{query}%')).fetchall()[:5]
+
+
+def offset_page(conn, match, offset):
+    return conn.execute(f'''
+        SELECT m.id, m.title, snippet(materials_fts, 1, '', '', '…', 16), {_RANK}
+        FROM materials_fts JOIN materials m ON m.id = materials_fts.rowid
+        WHERE materials_fts MATCH ?
+        ORDER BY {_RANK}, m.id
+        LIMIT 5 OFFSET ?
+    ''', (match, offset)).fetchall()
+
+
+def timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--materials", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "bench.db"))
+        fill(conn, args.materials)
+        for query in QUERIES:
+            match = build_match_query(query)
+            like_ms = timed(lambda: like_search(conn, query), args.repeat)
+            fts_ms = timed(lambda: _search(conn, match, 5), args.repeat)
+            print(f"{query:>20}: LIKE {like_ms:8.2f} ms, FTS5 {fts_ms:8.2f} ms")
+
+        match = build_match_query(QUERIES[0])
+        hits = conn.execute(
+            f"SELECT {_RANK}, rowid FROM materials_fts WHERE materials_fts MATCH ? ORDER BY {_RANK}, rowid",
+            (match,)).fetchall()
+        print(f"\nСтраницы по запросу «{QUERIES[0]}» ({len(hits)} совпадений):")
+        for depth in (0, len(hits) // 2, len(hits) - 5):
+            after = tuple(hits[depth - 1]) if depth else None
+            offset_ms = timed(lambda: offset_page(conn, match, depth), args.repeat)
+            keyset_ms = timed(lambda: _search(conn, match, 5, after), args.repeat)
+            print(f"{depth:>20}: OFFSET {offset_ms:8.2f} ms, курсор {keyset_ms:8.2f} ms")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Время холодного старта: от запуска процесса бота до первого ответа.
+
+Собирает базу с большим числом синтетических материалов, запускает бота
+отдельным процессом против локальной заглушки Bot API и сразу кладёт в
+очередь /start. Первый запуск создаёт схему и отрисовывает материалы,
+следующие — обычный перезапуск, который и должен быть быстрым.
+
+    python benchmarks/bench_startup.py --materials 20000 --restarts 3
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_bot_api import TEST_TOKEN, FakeBotAPI, command_update  # noqa: E402
+
+sys.path.insert(0, ROOT)
+from normalize import register_functions  # noqa: E402
+
+WORDS = (
+    "предел последовательности сходится ограничена монотонная аксиома полноты "
+    "супремум инфимум множество число доказательство противного индукция "
+    "критерий коши теорема вейерштрасса непрерывность функция отрезок"
+).split()
+
+
+def fill(path, count):
+    """Добавляет `count` материалов в копию рабочей базы."""
+    conn = sqlite3.connect(path)
+    # Если база уже прошла миграции, триггеры индекса вызывают math_normalize
+    register_functions(conn)
+    rnd = random.Random(1)
+    sections = [row[0] for row in conn.execute("SELECT id FROM sections")]
+
+    def text(k):
+        return " ".join(rnd.choice(WORDS) if rnd.random() < 0.3 else f"слово{rnd.randrange(50000)}"
+                        for _ in range(k))
+
+    conn.executemany(
+        "INSERT INTO materials (section_id, title, content) VALUES (?, ?, ?)",
+        ((rnd.choice(sections), text(4), text(300)) for _ in range(count)),
+    )
+    conn.commit()
+    conn.close()
+
+
+async def first_reply(workdir, user_id):
+    """Секунды от запуска процесса до первого ответа бота на /start."""
+    api = FakeBotAPI()
+    await api.start()
+    env = dict(os.environ, BOT_API_URL=api.base_url, BOT_TOKEN=TEST_TOKEN, BOT_MODE="polling")
+    log = open(os.path.join(workdir, "bot.log"), "a")
+    reply = api.wait_reply(user_id)
+    # Апдейт уже ждёт в очереди: бот заберёт его первым же getUpdates
+    api.push_update(command_update(user_id, user_id, "/start"))
+    started = time.perf_counter()
+    bot = subprocess.Popen([sys.executable, os.path.join(ROOT, "main.py")],
+                           cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        return await asyncio.wait_for(reply, 120) - started
+    finally:
+        bot.terminate()
+        bot.wait(timeout=30)
+        log.close()
+        await api.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--materials", type=int, default=20000)
+    parser.add_argument("--restarts", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, "math_bot.db")
+        shutil.copy(os.path.join(ROOT, "math_bot.db"), db_path)
+        fill(db_path, args.materials)
+        size_mb = os.path.getsize(db_path) / 2 ** 20
+        print(f"База: {args.materials} материалов, {size_mb:.0f} МБ")
+        print(f"{'первый запуск':>16}: {asyncio.run(first_reply(workdir, 1)):6.2f} s")
+        for n in range(1, args.restarts + 1):
+            print(f"{f'перезапуск {n}':>16}: {asyncio.run(first_reply(workdir, n + 1)):6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Сквозная задержка «апдейт → первый ответ бота» в режимах polling и webhook.
+
+Запускает локальную заглушку Bot API, поднимает бота отдельным процессом
+(с копией базы во временном каталоге) и прогоняет через него апдейты
+от синтетических пользователей. Для режима webhook нужен
+python-telegram-bot[webhooks].
+
+    python benchmarks/bench_transport.py --updates 500 --concurrency 20
+    python benchmarks/bench_transport.py --workers 4   # бот в нескольких процессах (workers.py)
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_bot_api import TEST_TOKEN, FakeBotAPI, callback_update, command_update, post_update  # noqa: E402
+
+WEBHOOK_PORT = 8765
+WEBHOOK_SECRET = "bench-secret"
+
+
+def synthetic_update(update_id, rnd):
+    user_id = rnd.randint(1, 5000)
+    kind = rnd.random()
+    if kind < 0.2:
+        return user_id, command_update(update_id, user_id, "/start")
+    if kind < 0.3:
+        return user_id, command_update(update_id, user_id, "/quote")
+    if kind < 0.6:
+        return user_id, callback_update(update_id, user_id, f"section_{rnd.randint(1, 5)}")
+    return user_id, callback_update(update_id, user_id, f"material_{rnd.randint(1, 18)}")
+
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else values[0]
+
+
+async def run_mode(mode, updates, concurrency, workdir, workers=1):
+    api = FakeBotAPI()
+    await api.start()
+    env = dict(
+        os.environ,
+        BOT_API_URL=api.base_url,
+        BOT_TOKEN=TEST_TOKEN,
+        BOT_MODE=mode,
+        WEBHOOK_LISTEN="127.0.0.1",
+        WEBHOOK_PORT=str(WEBHOOK_PORT),
+        WEBHOOK_PATH="hook",
+        WEBHOOK_URL=f"http://127.0.0.1:{WEBHOOK_PORT}",
+        WEBHOOK_SECRET=WEBHOOK_SECRET,
+        # Меряем транспорт, а не лимит Telegram на исходящие
+        OUTBOUND_GLOBAL_RATE="100000",
+    )
+    log = open(os.path.join(workdir, f"{mode}.log"), "w")
+    command = [sys.executable, os.path.join(ROOT, "main.py")]
+    if workers > 1:
+        command = [sys.executable, os.path.join(ROOT, "workers.py"), "--workers", str(workers)]
+    bot = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    latencies = []
+    try:
+        await api.wait_for_call("getUpdates" if mode == "polling" else "setWebhook")
+        await asyncio.sleep(0.5)
+        rnd = random.Random(1)
+        semaphore = asyncio.Semaphore(concurrency)
+        webhook_url = f"http://127.0.0.1:{WEBHOOK_PORT}/hook"
+
+        async with httpx.AsyncClient() as client:
+            async def one(update_id):
+                async with semaphore:
+                    user_id, update = synthetic_update(update_id, rnd)
+                    reply = api.wait_reply(user_id)
+                    started = time.perf_counter()
+                    if mode == "polling":
+                        api.push_update(update)
+                    else:
+                        await post_update(client, webhook_url, update, WEBHOOK_SECRET)
+                    latencies.append(await asyncio.wait_for(reply, 30) - started)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(one(n) for n in range(1, updates + 1)))
+            elapsed = time.perf_counter() - started
+    finally:
+        bot.terminate()
+        bot.wait(timeout=30)
+        log.close()
+        await api.stop()
+
+    latencies_ms = [value * 1000 for value in latencies]
+    print(f"{mode:>8}: {updates / elapsed:7.0f} updates/s, "
+          f"p50 {percentile(latencies_ms, 50):6.1f} ms, "
+          f"p95 {percentile(latencies_ms, 95):6.1f} ms, "
+          f"p99 {percentile(latencies_ms, 99):6.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--modes", nargs="+", default=["polling", "webhook"])
+    parser.add_argument("--workers", type=int, default=1, help="число процессов бота")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        shutil.copy(os.path.join(ROOT, "math_bot.db"), workdir)
+        for mode in args.modes:
+            asyncio.run(run_mode(mode, args.updates, args.concurrency, workdir, args.workers))
+
+
+if __name__ == "__main__":
+    main()
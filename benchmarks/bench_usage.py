@@ -0,0 +1,105 @@
+"""
+Стоимость статистики использования и польза прогрева.
+
+Печатает время записи события в буфер, скорость сброса буфера в
+usage_events пачками и свёртки в usage_daily, а затем сравнивает первые
+поиски после запуска с холодным кешем и после прогрева по свёрнутым
+запросам.
+
+    python benchmarks/bench_usage.py --events 200000
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+sys.path.insert(0, ROOT)
+
+import analytics  # noqa: E402
+from analytics import UsageLog  # noqa: E402
+from catalog import Catalog  # noqa: E402
+from db import Database  # noqa: E402
+from migrations import migrate  # noqa: E402
+from search import PAGE_SIZE, SearchCache, search_materials  # noqa: E402
+
+QUERIES = ("предел", "аксиома", "супремум", "последовательность", "доказательство", "критерий коши",
+           "теорема", "инфимум", "сходимость", "ограниченность", "метод", "полнота")
+
+
+async def first_searches(db, cache, queries):
+    times = []
+    for text in queries:
+        started = time.perf_counter()
+        await search_materials(db, text, limit=PAGE_SIZE, cache=cache)
+        times.append(time.perf_counter() - started)
+    return times
+
+
+async def run(args, db):
+    catalog = Catalog(db)
+    catalog.load_sync()
+    usage = UsageLog(db, size=args.events)
+    rng = random.Random(1)
+    material_ids = [material.id for material in catalog.materials()]
+
+    started = time.perf_counter()
+    for n in range(args.events):
+        if n % 4 == 0:
+            usage.record("query", rng.choice(QUERIES))
+        elif n % 4 == 1:
+            usage.record("material", rng.choice(material_ids))
+        else:
+            usage.handler("button_handler", "material", 0.002)
+    record_us = (time.perf_counter() - started) / args.events * 1e6
+    print(f"Запись события: {record_us:.2f} мкс")
+
+    started = time.perf_counter()
+    await usage.flush()
+    elapsed = time.perf_counter() - started
+    print(f"Сброс {args.events} событий: {elapsed:.2f} с, {args.events / elapsed:.0f} событий/с")
+    started = time.perf_counter()
+    await db.run(analytics._rollup, analytics._since(analytics.KEEP_DAYS))
+    print(f"Свёртка в дневные счётчики: {time.perf_counter() - started:.2f} с")
+
+    traffic = [rng.choice(QUERIES) for _ in range(args.searches)]
+    cold = await first_searches(db, SearchCache(catalog), traffic)
+    warm_cache = SearchCache(catalog)
+    started = time.perf_counter()
+    for text, _, _ in await usage.hottest("query", 100):
+        await search_materials(db, text, limit=PAGE_SIZE, cache=warm_cache)
+    warm_up = time.perf_counter() - started
+    warm = await first_searches(db, warm_cache, traffic)
+    print(f"Прогрев кеша поиска: {warm_up * 1000:.1f} мс")
+    for name, times in (("холодный кеш", cold), ("после прогрева", warm)):
+        print(f"Первые {len(times)} поисков, {name}: сумма {sum(times) * 1000:.1f} мс, "
+              f"p50 {statistics.median(times) * 1000:.3f} мс, max {max(times) * 1000:.3f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--searches", type=int, default=200, help="поисков после «запуска»")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "math_bot.db")
+        shutil.copy(os.path.join(ROOT, "math_bot.db"), path)
+        db = Database(path)
+        db.open()
+        try:
+            with db.connection() as conn:
+                migrate(conn)
+                conn.commit()
+            asyncio.run(run(args, db))
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
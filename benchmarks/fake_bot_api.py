@@ -0,0 +1,298 @@
+"""
+Локальная заглушка Telegram Bot API для нагрузочных тестов без сети.
+
+Понимает ровно те методы, которые вызывает бот, и отвечает правдоподобными
+объектами. Апдейты для режима polling кладутся в очередь push_update() и
+отдаются через getUpdates; в режиме webhook их отправляет post_update().
+wait_reply(chat_id) позволяет дождаться первого сообщения бота в чат и
+померить задержку от апдейта до ответа.
+
+Бот направляется сюда переменными окружения BOT_API_URL=<base_url> и
+BOT_TOKEN=TEST_TOKEN: токен заглушка не проверяет.
+Заглушку можно запустить и отдельным процессом, чтобы она не делила
+процессор с ботом:
+
+    python benchmarks/fake_bot_api.py --port 8081
+
+Служебный метод _stats возвращает счётчики вызовов.
+"""
+import argparse
+import asyncio
+import email.parser
+import email.policy
+import itertools
+import json
+import time
+from collections import Counter, defaultdict, deque
+from urllib.parse import parse_qsl
+
+import httpx
+
+# Токен для бота под нагрузочным тестом: настоящий не нужен и не должен утечь
+TEST_TOKEN = "123456:TEST"
+
+# Методы, которые означают «бот ответил пользователю»
+REPLY_METHODS = frozenset({
+    "sendMessage", "editMessageText", "sendPhoto", "editMessageReplyMarkup",
+    "answerInlineQuery",
+})
+
+BOT_USER = {
+    "id": 1, "is_bot": True, "first_name": "MathBot", "username": "math_bot",
+    "can_join_groups": False, "can_read_all_group_messages": False,
+    "supports_inline_queries": True,
+}
+
+
+def _user(user_id):
+    return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}", "language_code": "ru"}
+
+
+def _chat(chat_id):
+    return {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"}
+
+
+def command_update(update_id: int, user_id: int, text: str) -> dict:
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": _chat(user_id),
+        "from": _user(user_id),
+        "text": text,
+    }
+    if text.startswith("/"):
+        command = text.split()[0]
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+    return {"update_id": update_id, "message": message}
+
+
+def callback_update(update_id: int, user_id: int, data: str, message_id: int = 1) -> dict:
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            # id несёт номер пользователя, чтобы связать answerCallbackQuery с чатом
+            "id": f"{user_id}:{update_id}",
+            "from": _user(user_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": _chat(user_id),
+                "from": BOT_USER,
+                "text": "📚 Выберите раздел:",
+            },
+        },
+    }
+
+
+def inline_update(update_id: int, user_id: int, query: str) -> dict:
+    return {
+        "update_id": update_id,
+        "inline_query": {
+            "id": f"{user_id}:{update_id}",
+            "from": _user(user_id),
+            "query": query,
+            "offset": "",
+        },
+    }
+
+
+def _parse_body(headers: dict, body: bytes) -> dict:
+    content_type = headers.get("content-type", "")
+    if content_type.startswith("application/json"):
+        return json.loads(body or b"{}")
+    if content_type.startswith("multipart/form-data"):
+        message = email.parser.BytesParser(policy=email.policy.default).parsebytes(
+            b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body)
+        params = {}
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            payload = part.get_payload(decode=True)
+            if part.get_filename():
+                params[name] = payload
+            else:
+                params[name] = payload.decode("utf-8")
+        return params
+    return dict(parse_qsl(body.decode("utf-8"), keep_blank_values=True))
+
+
+def _chat_id_of(method: str, params: dict):
+    if "chat_id" in params:
+        try:
+            return int(params["chat_id"])
+        except ValueError:
+            return None
+    if "callback_query_id" in params or "inline_query_id" in params:
+        query_id = params.get("callback_query_id") or params.get("inline_query_id")
+        return int(query_id.split(":")[0])
+    return None
+
+
+class FakeBotAPI:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        self.host = host
+        self.port = port
+        # Имитация сетевой задержки до настоящего Bot API
+        self.latency = latency
+        self.calls = Counter()
+        self.webhook_url = None
+        self.sent_photos = 0
+        self._updates = deque()
+        self._updates_ready = None
+        self._waiters = defaultdict(deque)
+        self._message_ids = itertools.count(1000)
+        self._file_ids = itertools.count(1)
+        self._server = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/bot"
+
+    async def start(self):
+        self._updates_ready = asyncio.Event()
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def push_update(self, update: dict):
+        self._updates.append(update)
+        self._updates_ready.set()
+
+    def wait_reply(self, chat_id: int) -> asyncio.Future:
+        """Future с моментом (time.perf_counter) первого ответа бота в чат."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[chat_id].append(future)
+        return future
+
+    async def wait_for_call(self, method: str, timeout: float = 30.0):
+        deadline = time.monotonic() + timeout
+        while not self.calls[method]:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"бот не вызвал {method}")
+            await asyncio.sleep(0.05)
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                _, path, _ = request_line.split(" ", 2)
+                headers = {}
+                for line in header_lines:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                method = path.rsplit("/", 1)[-1]
+                result = await self._call(method, _parse_body(headers, body))
+                payload = json.dumps({"ok": True, "result": result}).encode("utf-8")
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: " + str(len(payload)).encode() + b"\r\n\r\n" + payload)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionError):
+            # Клиент закрыл соединение или заглушка останавливается
+            pass
+        finally:
+            writer.close()
+
+    async def _call(self, method: str, params: dict):
+        if method == "_stats":
+            return dict(self.calls)
+        self.calls[method] += 1
+        if method == "getUpdates":
+            return await self._get_updates(params)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if method in REPLY_METHODS:
+            chat_id = _chat_id_of(method, params)
+            waiters = self._waiters.get(chat_id)
+            if waiters:
+                waiters.popleft().set_result(time.perf_counter())
+        if method == "getMe":
+            return BOT_USER
+        if method == "setWebhook":
+            self.webhook_url = params.get("url")
+            return True
+        if method == "deleteWebhook":
+            self.webhook_url = None
+            return True
+        if method == "getWebhookInfo":
+            return {"url": self.webhook_url or "", "has_custom_certificate": False, "pending_update_count": 0}
+        if method in ("sendMessage", "editMessageText", "editMessageReplyMarkup"):
+            chat_id = int(params.get("chat_id", 0))
+            return {
+                "message_id": int(params.get("message_id") or next(self._message_ids)),
+                "date": int(time.time()),
+                "chat": _chat(chat_id),
+                "from": BOT_USER,
+                "text": params.get("text", ""),
+            }
+        if method == "sendPhoto":
+            self.sent_photos += 1
+            chat_id = int(params.get("chat_id", 0))
+            file_no = next(self._file_ids)
+            return {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": _chat(chat_id),
+                "from": BOT_USER,
+                "photo": [{"file_id": f"photo{file_no}", "file_unique_id": f"u{file_no}",
+                           "width": 100, "height": 50}],
+            }
+        return True
+
+    async def _get_updates(self, params: dict):
+        timeout = float(params.get("timeout", 0) or 0)
+        limit = int(params.get("limit", 100) or 100)
+        if not self._updates and timeout:
+            self._updates_ready.clear()
+            try:
+                await asyncio.wait_for(self._updates_ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        batch = []
+        while self._updates and len(batch) < limit:
+            batch.append(self._updates.popleft())
+        return batch
+
+
+async def post_update(client: httpx.AsyncClient, url: str, update: dict, secret: str = None):
+    """Доставляет апдейт боту в режиме webhook."""
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    response = await client.post(url, json=update, headers=headers)
+    response.raise_for_status()
+
+
+async def fetch_stats(client: httpx.AsyncClient, base_url: str) -> dict:
+    response = await client.post(f"{base_url}0/_stats")
+    return response.json()["result"]
+
+
+async def _serve_forever(host, port, latency):
+    api = FakeBotAPI(host, port, latency)
+    await api.start()
+    print(f"Заглушка Bot API: {api.base_url}", flush=True)
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа, сек")
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve_forever(args.host, args.port, args.latency))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
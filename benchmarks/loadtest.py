@@ -0,0 +1,197 @@
+"""
+Нагрузочный тест обработчиков бота без сети.
+
+Поднимает заглушку Bot API отдельным процессом, собирает приложение из main.py на копии базы
+и прогоняет через application.process_update сценарии тысяч синтетических
+пользователей: /start, разделы, материалы, /search, /quote, случайная
+цитата, inline-запрос. Печатает пропускную способность, p50/p95/p99 времени обработки
+по видам апдейтов и время, проведённое в базе. Апдейты проходят через допуск
+(admission.py), как при работе бота; --hammers добавляет пользователей,
+которые без пауз жмут одну и ту же кнопку, чтобы проверить, что они не
+замедляют остальных.
+
+    python benchmarks/loadtest.py --users 1000 --think 10
+    python benchmarks/loadtest.py --users 500 --think 2 --hammers 20
+    python benchmarks/loadtest.py --users 500 --fail-p95-ms 50   # для CI
+
+С --fail-p95-ms скрипт завершается с кодом 1, если p95 любого вида
+апдейтов превышает порог.
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.abspath(os.path.join(HERE, os.pardir))
+sys.path.insert(0, HERE)
+sys.path.insert(0, ROOT)
+
+import httpx  # noqa: E402
+
+from fake_bot_api import TEST_TOKEN, callback_update, command_update, fetch_stats, inline_update  # noqa: E402
+
+QUERIES = ("предел", "аксиома", "доказательство", "супремум", "Коши", "индукция", "sup")
+
+
+def scenario(rnd, user_id, next_id):
+    """Последовательность апдейтов одного пользователя: (вид, апдейт)."""
+    section_id = rnd.randint(1, 5)
+    steps = [
+        ("/start", command_update(next_id(), user_id, "/start")),
+        ("section", callback_update(next_id(), user_id, f"section_{section_id}")),
+        ("material", callback_update(next_id(), user_id, f"material_{rnd.randint(1, 18)}")),
+        ("/search", command_update(next_id(), user_id, f"/search {rnd.choice(QUERIES)}")),
+        ("main_menu", callback_update(next_id(), user_id, "main_menu")),
+        ("random_quote", callback_update(next_id(), user_id, "random_quote")),
+        ("/quote", command_update(next_id(), user_id, "/quote")),
+        ("inline", inline_update(next_id(), user_id, rnd.choice(QUERIES)[:rnd.randint(2, 6)])),
+    ]
+    rest = steps[1:]
+    rnd.shuffle(rest)
+    return steps[:1] + rest
+
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else values[0]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run(args, workdir, base_url):
+    os.environ["BOT_API_URL"] = base_url
+    os.environ["BOT_TOKEN"] = TEST_TOKEN
+    # Меряем обработчики, а не лимиты Telegram на исходящие
+    os.environ["OUTBOUND_GLOBAL_RATE"] = "100000"
+    os.environ["OUTBOUND_CHAT_RATE"] = "100000"
+    os.environ["HANDLER_CONCURRENCY"] = str(args.concurrency)
+    os.chdir(workdir)
+
+    import logging
+    import main
+    from telegram import Update
+
+    from metrics import admission_rejected
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    main.db.open()
+    main.init_database()
+    main.catalog.load_sync()
+    application = main.build_application()
+    await application.initialize()
+    await main.on_startup(application)
+
+    latencies = defaultdict(list)
+    rnd = random.Random(args.seed)
+    counter = iter(range(1, 10 ** 9))
+    processor = application.update_processor
+    done = asyncio.Event()
+
+    async def process(payload):
+        update = Update.de_json(payload, application.bot)
+        await processor.process_update(update, application.process_update(update))
+
+    async def user(user_id):
+        steps = scenario(rnd, user_id, lambda: next(counter))
+        for kind, payload in steps:
+            # Пауза «на чтение» между действиями пользователя
+            await asyncio.sleep(rnd.uniform(0.5, 1.5) * args.think)
+            started = time.perf_counter()
+            await process(payload)
+            latencies[kind].append(time.perf_counter() - started)
+
+    async def hammer(user_id):
+        # 20 нажатий одной кнопки в секунду, не дожидаясь ответа
+        pending = set()
+        while not done.is_set():
+            task = asyncio.create_task(process(callback_update(next(counter), user_id, "material_1")))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            await asyncio.sleep(0.05)
+        await asyncio.gather(*pending)
+
+    rejected = {reason: admission_rejected._values.get((reason,), 0) for reason in ("rate", "duplicate")}
+    db_count, db_time = main.db.query_count, main.db.query_time
+    started = time.perf_counter()
+    hammers = [asyncio.create_task(hammer(10 ** 6 + n)) for n in range(args.hammers)]
+    await asyncio.gather(*(user(user_id) for user_id in range(1, args.users + 1)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await asyncio.gather(*hammers)
+    rejected = {reason: int(admission_rejected._values.get((reason,), 0) - count)
+                for reason, count in rejected.items()}
+    db_count = main.db.query_count - db_count
+    db_time = main.db.query_time - db_time
+
+    await main.on_shutdown(application)
+    await application.shutdown()
+    async with httpx.AsyncClient() as client:
+        calls = await fetch_stats(client, base_url)
+
+    total = sum(len(values) for values in latencies.values())
+    print(f"Пользователей: {args.users}, апдейтов: {total}, время: {elapsed:.1f} с, "
+          f"{total / elapsed:.0f} апдейтов/с")
+    print(f"{'вид':>14} {'кол-во':>7} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9}")
+    worst_p95 = 0.0
+    for kind in sorted(latencies):
+        values = [value * 1000 for value in latencies[kind]]
+        p95 = percentile(values, 95)
+        worst_p95 = max(worst_p95, p95)
+        print(f"{kind:>14} {len(values):>7} {percentile(values, 50):9.2f} {p95:9.2f} "
+              f"{percentile(values, 99):9.2f}")
+    print(f"База: {db_count} запросов, {db_time * 1000:.0f} мс всего, "
+          f"{db_time / total * 1000:.3f} мс на апдейт")
+    print(f"Вызовы Bot API: {calls}")
+    print(f"Отброшено допуском: по частоте {rejected['rate']}, дублей {rejected['duplicate']}")
+
+    if args.fail_p95_ms and worst_p95 > args.fail_p95_ms:
+        print(f"p95 {worst_p95:.2f} мс превышает порог {args.fail_p95_ms} мс")
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=256,
+                        help="сколько апдейтов обрабатывается одновременно (HANDLER_CONCURRENCY)")
+    parser.add_argument("--think", type=float, default=10.0, help="средняя пауза между действиями, сек")
+    parser.add_argument("--api-latency", type=float, default=0.0,
+                        help="имитация задержки ответа Bot API, сек")
+    parser.add_argument("--hammers", type=int, default=0,
+                        help="пользователи, которые без пауз жмут одну кнопку")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--fail-p95-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    port = free_port()
+    api = subprocess.Popen([sys.executable, os.path.join(HERE, "fake_bot_api.py"),
+                            "--port", str(port), "--latency", str(args.api_latency)],
+                           stdout=subprocess.PIPE, text=True)
+    try:
+        api.stdout.readline()
+        with tempfile.TemporaryDirectory() as workdir:
+            shutil.copy(os.path.join(ROOT, "math_bot.db"), workdir)
+            code = asyncio.run(run(args, workdir, f"http://127.0.0.1:{port}/bot"))
+            os.chdir(ROOT)
+    finally:
+        api.terminate()
+        api.wait()
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
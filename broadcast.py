@@ -0,0 +1,253 @@
+"""
+Рассылки подписчикам: цитата дня и объявления.
+
+Пользователь подписывается командой /subscribe. Рассылка — строка в
+таблице broadcasts: текст и курсор, chat_id последнего обработанного
+подписчика. Получатели читаются из subscriptions пачками по BATCH_SIZE
+в порядке chat_id, сообщения уходят через очередь исходящих с приоритетом
+BULK: ответы на действия пользователей обгоняют рассылку, а общий темп
+не превышает глобальный лимит Telegram. После каждой пачки курсор
+сохраняется, поэтому после падения рассылка продолжается с места
+остановки и повторно получит сообщение не больше одной пачки. Чаты, где
+бота заблокировали или удалили, убираются из подписки.
+
+Цитата дня создаётся ботом раз в день после BROADCAST_TIME, объявление
+можно поставить из консоли — работающий бот подхватит его в течение минуты:
+
+    python broadcast.py "Добавлен раздел про ряды, загляните в /start"
+    python broadcast.py --status
+"""
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+from telegram.error import BadRequest, Forbidden
+
+from metrics import broadcast_messages
+from sender import BULK
+
+logger = logging.getLogger(__name__)
+
+# Получателей на пачку: столько сообщений в худшем случае уйдёт повторно после падения
+BATCH_SIZE = 200
+# Раз во сколько секунд проверять, не пора ли слать цитату дня и нет ли новых рассылок
+CHECK_INTERVAL = 60.0
+# Курсор до первого подписчика: у групп chat_id отрицательный
+_START = -(1 << 63)
+
+UNSUBSCRIBE_HINT = "\n\n/unsubscribe — отписаться от рассылки"
+
+
+def init_broadcasts(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS subscriptions (
+            chat_id INTEGER PRIMARY KEY,
+            subscribed_at REAL NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            key TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            text TEXT NOT NULL,
+            parse_mode TEXT,
+            created_at REAL NOT NULL,
+            last_chat_id INTEGER,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            blocked INTEGER NOT NULL DEFAULT 0,
+            finished_at REAL
+        )
+    ''')
+
+
+def _subscribe(conn, chat_id, now):
+    conn.execute("INSERT OR IGNORE INTO subscriptions (chat_id, subscribed_at) VALUES (?, ?)", (chat_id, now))
+
+
+def _unsubscribe(conn, chat_id):
+    conn.execute("DELETE FROM subscriptions WHERE chat_id = ?", (chat_id,))
+
+
+def _create(conn, key, kind, text, parse_mode, now):
+    conn.execute('''
+        INSERT OR IGNORE INTO broadcasts (key, kind, text, parse_mode, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (key, kind, text, parse_mode, now))
+
+
+def _save_progress(conn, key, last_chat_id, sent, failed, blocked_chats):
+    # Курсор и удаление заблокированных чатов — одной транзакцией
+    conn.executemany("DELETE FROM subscriptions WHERE chat_id = ?", [(chat_id,) for chat_id in blocked_chats])
+    conn.execute('''
+        UPDATE broadcasts
+        SET last_chat_id = ?, sent = sent + ?, failed = failed + ?, blocked = blocked + ?
+        WHERE key = ?
+    ''', (last_chat_id, sent, failed, len(blocked_chats), key))
+
+
+def _finish(conn, key, now):
+    conn.execute("UPDATE broadcasts SET finished_at = ? WHERE key = ?", (now, key))
+
+
+def _recipients(conn, after, limit):
+    return [row[0] for row in conn.execute(
+        "SELECT chat_id FROM subscriptions WHERE chat_id > ? ORDER BY chat_id LIMIT ?", (after, limit))]
+
+
+def _pending(conn):
+    return conn.execute('''
+        SELECT key, text, parse_mode, last_chat_id FROM broadcasts
+        WHERE finished_at IS NULL ORDER BY created_at
+    ''').fetchall()
+
+
+def _last_daily(conn):
+    return conn.execute("SELECT max(key) FROM broadcasts WHERE kind = 'daily'").fetchone()[0]
+
+
+def _is_gone(error) -> bool:
+    """Чат больше недоступен: бот заблокирован, пользователь удалён, чат не найден."""
+    if isinstance(error, Forbidden):
+        return True
+    return isinstance(error, BadRequest) and "chat not found" in str(error).lower()
+
+
+class Broadcaster:
+    """
+    Фоновая задача рассылок. Раз в CHECK_INTERVAL секунд создаёт цитату
+    дня (daily(date) возвращает текст в Markdown, at — время «ЧЧ:ММ» или
+    пусто, чтобы не слать) и доставляет незаконченные рассылки по очереди.
+    Записи идут через `writer` (база или RemoteWriter рабочего процесса).
+    """
+
+    def __init__(self, db, outbound, daily=None, at: str = "", writer=None):
+        self.db = db
+        self.outbound = outbound
+        self.daily = daily
+        self.at = datetime.strptime(at, "%H:%M").time() if at else None
+        self.writer = writer or db
+        self._bot = None
+        self._task = None
+        self._last_daily = None
+        # Законченные в этом процессе: запись finished_at может ещё не дойти до базы
+        self._finished = set()
+
+    async def subscribe(self, chat_id: int):
+        await self.writer.run(_subscribe, chat_id, time.time())
+
+    async def unsubscribe(self, chat_id: int):
+        await self.writer.run(_unsubscribe, chat_id)
+
+    def start(self, bot):
+        if self._task is None:
+            self._bot = bot
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        self._last_daily = await self.db.run(_last_daily)
+        while True:
+            try:
+                await self._create_daily()
+                for key, text, parse_mode, last_chat_id in await self.db.run(_pending):
+                    if key not in self._finished:
+                        await self.deliver(key, text, parse_mode, last_chat_id)
+            except Exception:
+                logger.exception("Ошибка рассылки")
+            await asyncio.sleep(CHECK_INTERVAL)
+
+    async def _create_daily(self):
+        if self.at is None or self.daily is None:
+            return
+        now = datetime.now()
+        key = f"daily:{now.date().isoformat()}"
+        if now.time() < self.at or (self._last_daily is not None and self._last_daily >= key):
+            return
+        text = self.daily(now.date())
+        if text:
+            await self.writer.run(_create, key, "daily", text + UNSUBSCRIBE_HINT, "Markdown", time.time())
+            # Пока запись идёт к писателю, рассылку доставляем сразу, не дожидаясь _pending
+            await self.deliver(key, text + UNSUBSCRIBE_HINT, "Markdown", None)
+        self._last_daily = key
+
+    async def deliver(self, key: str, text: str, parse_mode, last_chat_id=None):
+        after = _START if last_chat_id is None else last_chat_id
+        started = time.perf_counter()
+        total = 0
+        logger.info("Рассылка %s: начата с chat_id > %s", key, after)
+        while True:
+            chats = await self.db.run(_recipients, after, BATCH_SIZE)
+            if not chats:
+                break
+            results = await asyncio.gather(
+                *(self.outbound.send(chat_id, self._bot.send_message, chat_id, text,
+                                     parse_mode=parse_mode, priority=BULK) for chat_id in chats),
+                return_exceptions=True)
+            sent = failed = 0
+            blocked = []
+            for chat_id, result in zip(chats, results):
+                if not isinstance(result, Exception):
+                    sent += 1
+                elif _is_gone(result):
+                    blocked.append(chat_id)
+                else:
+                    failed += 1
+                    logger.warning("Рассылка %s: не доставлено в %s: %s", key, chat_id, result)
+            broadcast_messages.inc(("sent",), sent)
+            broadcast_messages.inc(("blocked",), len(blocked))
+            broadcast_messages.inc(("failed",), failed)
+            after = chats[-1]
+            total += len(chats)
+            await self.writer.run(_save_progress, key, after, sent, failed, blocked)
+        await self.writer.run(_finish, key, time.time())
+        self._finished.add(key)
+        logger.info("Рассылка %s: закончена, получателей %s за %.0f с",
+                    key, total, time.perf_counter() - started)
+
+
+def main():
+    from db import DB_PATH, Database
+    from migrations import migrate
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("text", nargs="?", help="текст объявления (обычный текст, без разметки)")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--status", action="store_true", help="показать последние рассылки")
+    args = parser.parse_args()
+    if not args.text and not args.status:
+        parser.error("нужен текст объявления или --status")
+
+    db = Database(args.db, size=1)
+    db.open()
+    try:
+        with db.connection() as conn:
+            migrate(conn)
+            if args.text:
+                _create(conn, f"notice:{time.time_ns()}", "notice", args.text + UNSUBSCRIBE_HINT, None, time.time())
+                conn.commit()
+                print("Объявление поставлено в очередь")
+            subscribers = conn.execute("SELECT count(*) FROM subscriptions").fetchone()[0]
+            print(f"Подписчиков: {subscribers}")
+            if args.status:
+                for key, sent, failed, blocked, finished_at in conn.execute('''
+                        SELECT key, sent, failed, blocked, finished_at FROM broadcasts
+                        ORDER BY created_at DESC LIMIT 10'''):
+                    state = "готово" if finished_at else "идёт"
+                    print(f"{key:>32}  {state:>6}  отправлено {sent}, ошибок {failed}, заблокировали {blocked}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
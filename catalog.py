@@ -0,0 +1,211 @@
+import asyncio
+import logging
+from typing import NamedTuple
+
+from normalize import register_functions
+from render import render_material, sync_rendered
+
+logger = logging.getLogger(__name__)
+
+
+class Section(NamedTuple):
+    id: int
+    name: str
+    description: str
+
+
+class Material(NamedTuple):
+    id: int
+    section_id: int
+    title: str
+    # None, пока текст не догружен (см. Catalog.load_sync)
+    content: str
+    review_card: int = 0
+    preview: str = ""
+
+
+class Quote(NamedTuple):
+    id: int
+    author: str
+    text: str
+
+
+def read_generation(conn) -> int:
+    row = conn.execute("SELECT value FROM content_meta WHERE key = 'generation'").fetchone()
+    return row[0] if row else 0
+
+
+def init_material_preview(conn):
+    """
+    Начало текста для описания результата inline-поиска считается при
+    записи материала функцией math_preview (normalize.py): каталогу при
+    запуске не нужно читать весь текст ради первых ста символов.
+    """
+    register_functions(conn)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(materials)")}
+    if "preview" not in columns:
+        conn.execute("ALTER TABLE materials ADD COLUMN preview TEXT NOT NULL DEFAULT ''")
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS materials_preview_insert AFTER INSERT ON materials
+        BEGIN
+            UPDATE materials SET preview = math_preview(new.content) WHERE id = new.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS materials_preview_update AFTER UPDATE OF content ON materials
+        BEGIN
+            UPDATE materials SET preview = math_preview(new.content) WHERE id = new.id;
+        END
+    ''')
+    conn.execute("UPDATE materials SET preview = math_preview(content)")
+
+
+def _load_snapshot(conn, render: bool = True, save: bool = True, content: bool = True):
+    # Всё читаем в одной транзакции, чтобы поколение соответствовало данным
+    conn.execute("BEGIN")
+    generation = read_generation(conn)
+    sections = [Section(*row) for row in conn.execute(
+        "SELECT id, name, description FROM sections ORDER BY id")]
+    materials = [Material(*row) for row in conn.execute(
+        f"SELECT id, section_id, title, {'content' if content else 'NULL'}, review_card, preview "
+        "FROM materials ORDER BY id")]
+    quotes = [Quote(*row) for row in conn.execute(
+        "SELECT id, author, quote_text FROM quotes ORDER BY id")]
+    conn.commit()
+    # Готовые к отправке части текста: из rendered_chunks или свежеотрисованные
+    rendered = sync_rendered(conn, materials, save) if render else None
+    return generation, sections, materials, quotes, rendered
+
+
+def _read_content(conn, material_id):
+    row = conn.execute("SELECT content FROM materials WHERE id = ?", (material_id,)).fetchone()
+    return row[0] if row else ""
+
+
+class Catalog:
+    """
+    Разделы, материалы и цитаты, загруженные из базы один раз.
+    Навигация обслуживается из памяти; фоновая задача раз в `interval`
+    секунд сверяет счётчик поколения контента в базе и перечитывает
+    каталог, только если он изменился.
+    """
+
+    def __init__(self, db, interval: float = 30.0):
+        self.db = db
+        self.interval = interval
+        self.generation = -1
+        self.sections = ()
+        self.quotes = ()
+        self._sections_by_id = {}
+        self._materials = {}
+        self._by_section = {}
+        self._rendered = {}
+        # Загружен ли текст материалов и сверены ли части с rendered_chunks
+        self.complete = False
+        self._listeners = []
+        self._watcher = None
+
+    async def load(self):
+        self._apply(*await self.db.run(_load_snapshot, True, not self.db.readonly))
+
+    def load_sync(self, render: bool = False):
+        """
+        Загрузка при запуске. По умолчанию читаются только заголовки,
+        признаки и начало текста материалов: на большой базе весь текст и
+        сверка частей с rendered_chunks — это сотни миллисекунд до первого
+        ответа. Полный каталог загружает фоновая задача _watch, а текст
+        материала, открытого раньше, читается из базы по одному.
+        """
+        with self.db.connection() as conn:
+            self._apply(*_load_snapshot(conn, render, not self.db.readonly, content=render))
+
+    def _apply(self, generation, sections, materials, quotes, rendered):
+        by_section = {section.id: [] for section in sections}
+        for material in materials:
+            by_section.setdefault(material.section_id, []).append(material)
+        # Подменяем ссылки целиком: обработчики всегда видят согласованный снимок
+        self.sections = tuple(sections)
+        self.quotes = tuple(quotes)
+        self._sections_by_id = {section.id: section for section in sections}
+        self._materials = {material.id: material for material in materials}
+        self._by_section = {sid: tuple(items) for sid, items in by_section.items()}
+        self._rendered = {} if rendered is None else rendered
+        self.complete = rendered is not None
+        self.generation = generation
+        logger.info("Каталог загружен: поколение %s, разделов %s, материалов %s, цитат %s",
+                    generation, len(sections), len(materials), len(quotes))
+        for listener in self._listeners:
+            listener(self)
+
+    def add_listener(self, listener):
+        """listener(catalog) вызывается после каждой загрузки каталога."""
+        self._listeners.append(listener)
+        if self.generation >= 0:
+            listener(self)
+
+    async def refresh(self) -> bool:
+        """Перечитывает каталог, если поколение в базе изменилось."""
+        generation = await self.db.run(read_generation)
+        if generation == self.generation:
+            return False
+        await self.load()
+        return True
+
+    def section(self, section_id: int):
+        return self._sections_by_id.get(section_id)
+
+    def section_name(self, section_id: int, default: str = "Раздел") -> str:
+        section = self._sections_by_id.get(section_id)
+        return section.name if section else default
+
+    def materials_in(self, section_id: int):
+        return self._by_section.get(section_id, ())
+
+    def material(self, material_id: int):
+        return self._materials.get(material_id)
+
+    def rendered(self, material_id: int):
+        """Части материала, готовые к отправке с parse_mode='HTML'."""
+        chunks = self._rendered.get(material_id)
+        if chunks is None:
+            material = self._materials.get(material_id)
+            if material is None:
+                return None
+            chunks = self._rendered[material_id] = render_material(material.title, self.content(material))
+        return chunks
+
+    def content(self, material) -> str:
+        """Текст материала; пока каталог загружен не полностью, читается из базы."""
+        if material.content is not None:
+            return material.content
+        with self.db.connection() as conn:
+            return _read_content(conn, material.id)
+
+    def materials(self):
+        return self._materials.values()
+
+    def start_watcher(self):
+        if self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch())
+
+    async def stop_watcher(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+
+    async def _watch(self):
+        if not self.complete:
+            try:
+                await self.load()
+            except Exception:
+                logger.exception("Не удалось загрузить каталог полностью")
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Не удалось обновить каталог")
@@ -0,0 +1,82 @@
+import os
+
+# Все настройки читаются из переменных окружения, значения по умолчанию
+# соответствуют обычному запуску на одной машине в режиме polling.
+
+# Токен бота от @BotFather; без него бот не запускается
+BOT_TOKEN = os.environ.get("BOT_TOKEN", "")
+
+# Адрес Bot API; для нагрузочных тестов указывает на локальную заглушку,
+# например http://127.0.0.1:8081/bot
+BOT_API_URL = os.environ.get("BOT_API_URL")
+
+# polling или webhook
+BOT_MODE = os.environ.get("BOT_MODE", "polling")
+
+# Webhook: бот слушает обычный HTTP, TLS снимает обратный прокси перед ним.
+# WEBHOOK_URL — внешний адрес, который сообщается Telegram (без пути).
+WEBHOOK_LISTEN = os.environ.get("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "telegram")
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET")
+
+# Лимиты исходящих сообщений в секунду: на бота и на личный чат. Для
+# нагрузочных тестов против заглушки Bot API их можно поднять, чтобы
+# мерить сам бот, а не ожидание в очереди.
+OUTBOUND_GLOBAL_RATE = float(os.environ.get("OUTBOUND_GLOBAL_RATE", "30"))
+OUTBOUND_CHAT_RATE = float(os.environ.get("OUTBOUND_CHAT_RATE", "1"))
+
+# Эндпоинт метрик в формате Prometheus: http://METRICS_HOST:METRICS_PORT/metrics.
+# 0 — не запускать.
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+
+# Inline-режим: сколько результатов отдавать и сколько секунд Telegram
+# может кешировать ответ на одинаковый запрос
+INLINE_RESULTS = int(os.environ.get("INLINE_RESULTS", "20"))
+INLINE_CACHE_TIME = int(os.environ.get("INLINE_CACHE_TIME", "300"))
+
+# Каталог с материалами в Markdown/JSONL (см. importer.py). Если задан,
+# файлы импортируются при запуске, а изменённые подхватываются на ходу
+# раз в CONTENT_POLL_INTERVAL секунд.
+CONTENT_DIR = os.environ.get("CONTENT_DIR", "")
+CONTENT_POLL_INTERVAL = float(os.environ.get("CONTENT_POLL_INTERVAL", "5"))
+
+# Раз во сколько секунд состояние пользователей (последний материал,
+# закладки, недавние запросы) сбрасывается в базу
+SESSION_FLUSH_INTERVAL = float(os.environ.get("SESSION_FLUSH_INTERVAL", "2"))
+
+# Картинки формул $$ ... $$ из материалов (нужен matplotlib, см. formulas.py):
+# FORMULA_IMAGES=1 включает, PNG кешируются в FORMULA_CACHE_DIR
+FORMULA_IMAGES = os.environ.get("FORMULA_IMAGES", "") == "1"
+FORMULA_CACHE_DIR = os.environ.get("FORMULA_CACHE_DIR", "formula_cache")
+FORMULA_DPI = int(os.environ.get("FORMULA_DPI", "200"))
+FORMULA_WORKERS = int(os.environ.get("FORMULA_WORKERS", "2"))
+
+# Кеш результатов /search: сколько запросов помнить и сколько секунд
+SEARCH_CACHE_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE", "1024"))
+SEARCH_CACHE_TTL = float(os.environ.get("SEARCH_CACHE_TTL", "300"))
+
+# Прогрев при запуске по статистике использования (см. analytics.py):
+# сколько самых популярных материалов и запросов заранее положить в кеши
+WARM_MATERIALS = int(os.environ.get("WARM_MATERIALS", "50"))
+WARM_QUERIES = int(os.environ.get("WARM_QUERIES", "100"))
+
+# Допуск апдейтов (см. admission.py): сколько обработчиков выполняется
+# одновременно и сколько апдейтов в секунду (со всплеском до USER_BURST)
+# принимается от одного пользователя
+HANDLER_CONCURRENCY = int(os.environ.get("HANDLER_CONCURRENCY", "32"))
+USER_RATE = float(os.environ.get("USER_RATE", "2"))
+USER_BURST = float(os.environ.get("USER_BURST", "8"))
+
+# Рассылки подписчикам (см. broadcast.py): BROADCASTS=0 выключает,
+# BROADCAST_TIME — время цитаты дня по часам сервера, пусто — не слать
+BROADCASTS = os.environ.get("BROADCASTS", "1") != "0"
+BROADCAST_TIME = os.environ.get("BROADCAST_TIME", "09:00")
+
+# Администраторы бота (/stats, /profile): user_id через запятую
+ADMIN_IDS = {int(user_id) for user_id in os.environ.get("ADMIN_IDS", "").split(",") if user_id.strip()}
+
+# Напоминания о карточках повторения (см. review.py): REVIEW_REMINDERS=0 выключает
+REVIEW_REMINDERS = os.environ.get("REVIEW_REMINDERS", "1") != "0"
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+from normalize import register_functions
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = 'math_bot.db'
+
+# Настройки соединения: WAL позволяет читателям не ждать писателя,
+# остальное — разумные значения для небольшой базы, которая целиком
+# помещается в память.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=134217728",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA foreign_keys=ON",
+)
+
+# Соединения только на чтение (рабочие процессы, см. workers.py): режим
+# журнала задаёт писатель, страницы файла читаются через общий для всех
+# процессов mmap
+READONLY_PRAGMAS = (
+    "PRAGMA query_only=ON",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA busy_timeout=5000",
+)
+
+
+class Database:
+    """
+    Пул долгоживущих соединений SQLite.
+    Запросы выполняются в отдельных потоках через executor, поэтому
+    обработчики бота делают `await db.fetchall(...)` и не блокируют
+    event loop. Размер пула ограничен: одновременно выполняется не больше
+    `size` запросов, остальные ждут свободного соединения.
+    С readonly=True база открывается в режиме mode=ro: запись в ней
+    невозможна, изменения писателя при этом видны.
+    """
+
+    def __init__(self, path: str = DB_PATH, size: int = 4, readonly: bool = False):
+        self.path = path
+        self.size = size
+        self.readonly = readonly
+        self._pool = None
+        self._executor = None
+        # Сколько запросов выполнено и сколько времени они заняли в потоках пула
+        self.query_count = 0
+        self.query_time = 0.0
+        # Запросы, ждущие соединения или выполняющиеся
+        self.in_flight = 0
+        self._stats_lock = threading.Lock()
+        # Необязательный обработчик времени каждого запроса (например, метрика)
+        self.observer = None
+
+    def open(self):
+        if self._pool is not None:
+            return
+        self._pool = queue.LifoQueue(maxsize=self.size)
+        for _ in range(self.size):
+            self._pool.put(self._connect())
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="db")
+
+    def close(self):
+        if self._pool is None:
+            return
+        self._executor.shutdown(wait=True)
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+        self._pool = None
+        self._executor = None
+
+    @property
+    def in_use(self) -> int:
+        """Сколько соединений пула сейчас занято."""
+        return 0 if self._pool is None else self.size - self._pool.qsize()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.readonly:
+            uri = Path(self.path).resolve().as_uri() + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            pragmas = READONLY_PRAGMAS
+        else:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            pragmas = PRAGMAS
+        for pragma in pragmas:
+            conn.execute(pragma)
+        # Триггеры поискового индекса вызывают math_normalize
+        register_functions(conn)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Синхронно берёт соединение из пула (для кода запуска и фоновых потоков)."""
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def _call(self, fn, *args):
+        with self.connection() as conn:
+            started = time.perf_counter()
+            try:
+                result = fn(conn, *args)
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                with self._stats_lock:
+                    self.query_count += 1
+                    self.query_time += elapsed
+                if self.observer is not None:
+                    self.observer(elapsed)
+            if conn.in_transaction:
+                conn.commit()
+            return result
+
+    async def run(self, fn, *args):
+        """Выполняет fn(conn, *args) в потоке пула одной транзакцией."""
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        try:
+            return await loop.run_in_executor(self._executor, self._call, fn, *args)
+        finally:
+            self.in_flight -= 1
+
+    async def fetchall(self, sql: str, params=()):
+        return await self.run(lambda conn: conn.execute(sql, params).fetchall())
+
+    async def fetchone(self, sql: str, params=()):
+        return await self.run(lambda conn: conn.execute(sql, params).fetchone())
+
+    async def execute(self, sql: str, params=()) -> int:
+        return await self.run(lambda conn: conn.execute(sql, params).rowcount)
+
+    async def executemany(self, sql: str, seq_of_params) -> int:
+        return await self.run(lambda conn: conn.executemany(sql, seq_of_params).rowcount)
+
+    def serve_writes(self, requests):
+        """
+        Выполняет записи из очереди RemoteWriter, пока не придёт None.
+        Блокирует поток; запускается в процессе-писателе.
+        """
+        while True:
+            request = requests.get()
+            if request is None:
+                return
+            fn, args = request
+            try:
+                self._call(fn, *args)
+            except Exception:
+                logger.exception("Не удалось выполнить запись %s", getattr(fn, "__name__", fn))
+
+
+def _execute(conn, sql, params):
+    return conn.execute(sql, params).rowcount
+
+
+def _executemany(conn, sql, seq_of_params):
+    return conn.executemany(sql, seq_of_params).rowcount
+
+
+class RemoteWriter:
+    """
+    Запись через единственный процесс-писатель (Database.serve_writes):
+    fn(conn, *args) передаётся в очередь multiprocessing и выполняется там
+    одной транзакцией. fn — функция уровня модуля, аргументы сериализуются
+    pickle. Результат не возвращается: вызов завершается, как только запрос
+    поставлен в очередь, ошибки пишутся в лог писателя.
+    """
+
+    def __init__(self, requests):
+        self.requests = requests
+
+    async def run(self, fn, *args):
+        self.requests.put((fn, args))
+
+    async def execute(self, sql: str, params=()):
+        self.requests.put((_execute, (sql, params)))
+
+    async def executemany(self, sql: str, seq_of_params):
+        self.requests.put((_executemany, (sql, list(seq_of_params))))
@@ -0,0 +1,222 @@
+"""
+Формулы из материалов в виде картинок.
+
+Блок $$ ... $$ в тексте материала (синтаксис mathtext из matplotlib,
+подмножество TeX) отрисовывается в PNG и отправляется после страницы,
+на которой стоит; в один чат картинки страницы уходят один раз.
+Картинки лежат в каталоге кеша под именем — хешем формулы, поэтому одна
+формула отрисовывается один раз на все материалы и перезапуски. После
+первой отправки Telegram возвращает file_id; он сохраняется в таблице
+formula_files, и дальше картинка пересылается по нему без загрузки.
+
+matplotlib — необязательная зависимость: без неё формулы остаются в
+тексте как есть. Отрисовка идёт в пуле процессов и не блокирует event loop.
+
+    python formulas.py            # заранее отрисовать все формулы из базы
+"""
+import argparse
+import asyncio
+import hashlib
+import importlib.util
+import logging
+import os
+import re
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from render import material_pages
+
+logger = logging.getLogger(__name__)
+
+# Меняется вместе со способом отрисовки, чтобы старые картинки не использовались
+FORMULA_VERSION = 1
+
+FORMULA_RE = re.compile(r"\$\$(.+?)\$\$", re.DOTALL)
+# Сколько последних (чат, материал, страница) помнить, чтобы не слать картинки повторно
+SENT_LIMIT = 100000
+
+
+def extract_formulas(content: str):
+    """Формулы материала по порядку, без повторов."""
+    return tuple(dict.fromkeys(tex.strip() for tex in FORMULA_RE.findall(content) if tex.strip()))
+
+
+def formula_key(tex: str, dpi: int) -> str:
+    return hashlib.sha256(f"{FORMULA_VERSION}\0{dpi}\0{tex}".encode("utf-8")).hexdigest()
+
+
+def matplotlib_available() -> bool:
+    return importlib.util.find_spec("matplotlib") is not None
+
+
+def init_formula_files(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS formula_files (
+            key TEXT PRIMARY KEY,
+            file_id TEXT NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+
+def _render_png(tex: str, path: str, dpi: int):
+    # Выполняется в процессе пула: matplotlib загружается только там
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib import mathtext
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    mathtext.math_to_image(f"${tex}$", tmp, dpi=dpi, format="png")
+    os.replace(tmp, path)
+
+
+class FormulaImages:
+    """
+    Картинки формул: file_id из памяти, иначе PNG из кеша на диске,
+    иначе отрисовка в пуле процессов. Одновременные запросы одной формулы
+    ждут одну отрисовку.
+    """
+
+    def __init__(self, db, catalog, cache_dir: str, dpi: int = 200, workers: int = 2, writer=None):
+        self.db = db
+        self.catalog = catalog
+        # Куда сохранять file_id: база или RemoteWriter рабочего процесса
+        self.writer = writer or db
+        self.cache_dir = Path(cache_dir)
+        self.dpi = dpi
+        self.workers = workers
+        self._file_ids = {}
+        self._rendering = {}
+        # Формулы, которые mathtext не разобрал: не пытаться при каждом просмотре
+        self._failed = set()
+        self._formulas = {}
+        self._sent = OrderedDict()
+        self._pool = None
+        catalog.add_listener(self._reset)
+
+    def _reset(self, catalog):
+        # Формулы материалов выделяются при первом просмотре; после
+        # изменения контента страницы могли поменяться — картинки шлём заново
+        self._formulas = {}
+        self._sent = OrderedDict()
+
+    def load_sync(self):
+        with self.db.connection() as conn:
+            self._file_ids = dict(conn.execute("SELECT key, file_id FROM formula_files"))
+
+    def start(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+
+    def stop(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def formulas(self, material, page: int = 0):
+        """Формулы страницы материала (страницы — как в render_material)."""
+        pages = self._formulas.get(material.id)
+        if pages is None:
+            pages = self._formulas[material.id] = tuple(
+                extract_formulas(text) for text in material_pages(material.title, self.catalog.content(material)))
+        return pages[page] if page < len(pages) else ()
+
+    def unsent(self, chat_id: int, material, page: int = 0):
+        """Формулы страницы, если их ещё не отправляли в этот чат; отмечает отправленными."""
+        key = (chat_id, material.id, page)
+        if key in self._sent:
+            self._sent.move_to_end(key)
+            return ()
+        self._sent[key] = None
+        if len(self._sent) > SENT_LIMIT:
+            self._sent.popitem(last=False)
+        return self.formulas(material, page)
+
+    def path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.png"
+
+    async def photo(self, tex: str):
+        """
+        (ключ, file_id или путь к PNG) для отправки через send_photo;
+        None, если формулу не удалось отрисовать.
+        """
+        key = formula_key(tex, self.dpi)
+        file_id = self._file_ids.get(key)
+        if file_id is not None:
+            return key, file_id
+        if key in self._failed:
+            return None
+        path = self.path(key)
+        if not path.exists():
+            try:
+                await self._render(key, tex, path)
+            except Exception as error:
+                logger.warning("Не удалось отрисовать формулу %r: %s", tex, error)
+                self._failed.add(key)
+                return None
+        return key, path
+
+    async def _render(self, key, tex, path):
+        future = self._rendering.get(key)
+        if future is None:
+            path.parent.mkdir(exist_ok=True)
+            loop = asyncio.get_running_loop()
+            future = self._rendering[key] = loop.run_in_executor(self._pool, _render_png, tex, str(path), self.dpi)
+            future.add_done_callback(lambda _: self._rendering.pop(key, None))
+        await future
+
+    async def remember(self, key: str, message):
+        """Сохраняет file_id из ответа на первую отправку картинки."""
+        if key in self._file_ids or not getattr(message, "photo", None):
+            return
+        file_id = message.photo[-1].file_id
+        self._file_ids[key] = file_id
+        await self.writer.execute(
+            "INSERT OR REPLACE INTO formula_files (key, file_id) VALUES (?, ?)", (key, file_id))
+
+
+def main():
+    import config
+    from db import DB_PATH, Database
+    from migrations import migrate
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--cache-dir", default=config.FORMULA_CACHE_DIR)
+    parser.add_argument("--dpi", type=int, default=config.FORMULA_DPI)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    if not matplotlib_available():
+        parser.error("нужен matplotlib: pip install matplotlib")
+
+    db = Database(args.db, size=1)
+    db.open()
+    try:
+        with db.connection() as conn:
+            migrate(conn)
+            formulas = set()
+            for (content,) in conn.execute("SELECT content FROM materials"):
+                formulas.update(extract_formulas(content))
+    finally:
+        db.close()
+
+    cache_dir = Path(args.cache_dir)
+    jobs = {}
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for tex in formulas:
+            key = formula_key(tex, args.dpi)
+            path = cache_dir / key[:2] / f"{key}.png"
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                jobs[pool.submit(_render_png, tex, str(path), args.dpi)] = tex
+        for future, tex in jobs.items():
+            try:
+                future.result()
+            except Exception as error:
+                logger.warning("Не удалось отрисовать %r: %s", tex, error)
+    print(f"Формул: {len(formulas)}, отрисовано сейчас: {len(jobs)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+Импорт материалов из каталога файлов в базу.
+
+Поддерживаются два формата:
+
+* Markdown (*.md) — один материал на файл. Необязательный заголовок:
+
+      ---
+      section: 📐 Аксиомы
+      title: Аксиома полноты
+      key: axioms/completeness
+      ---
+      текст материала
+
+  Без заголовка раздел берётся из имени папки, название — из первой
+  строки вида «# Название».
+
+* JSON Lines (*.jsonl) — по материалу на строку:
+  {"section": "...", "title": "...", "content": "...", "key": "..."}
+
+Ключ (key) связывает запись в файле со строкой materials; по умолчанию
+это путь к файлу (для .md) или путь и название (для .jsonl). Записи
+пишутся пачками, вставка идемпотентна: материал с тем же ключом и тем же
+хешем содержимого не трогается. Материалы, пропавшие из файла или
+вместе с файлом, удаляются.
+
+    python importer.py content/            # разовый импорт
+    python importer.py content/ --watch    # следить за изменениями
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+EXTENSIONS = (".md", ".jsonl")
+
+
+def init_import_tables(conn):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(materials)")}
+    for column in ("source_key", "source_file", "content_hash"):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE materials ADD COLUMN {column} TEXT")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS materials_source_key ON materials (source_key)")
+    conn.execute("CREATE INDEX IF NOT EXISTS materials_source_file ON materials (source_file)")
+    # Что и когда импортировано: по mtime и размеру видно, изменился ли файл
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS import_files (
+            path TEXT PRIMARY KEY,
+            mtime_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL
+        )
+    ''')
+
+
+def content_hash(section: str, title: str, content: str) -> str:
+    return hashlib.sha1(f"{section}\0{title}\0{content}".encode("utf-8")).hexdigest()
+
+
+def _parse_markdown(path: str, relpath: str):
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    meta = {}
+    if text.startswith("---\n"):
+        end = text.find("\n---", 4)
+        if end != -1:
+            for line in text[4:end].splitlines():
+                if ":" in line:
+                    name, value = line.split(":", 1)
+                    meta[name.strip()] = value.strip()
+            text = text[end + 4:].lstrip("\n")
+    title = meta.get("title")
+    if title is None:
+        first, _, rest = text.partition("\n")
+        if first.startswith("# "):
+            title, text = first[2:].strip(), rest
+        else:
+            title = os.path.splitext(os.path.basename(relpath))[0]
+    section = meta.get("section") or os.path.basename(os.path.dirname(relpath)) or "Разное"
+    yield meta.get("key") or relpath, section, title, text.strip("\n")
+
+
+def _parse_jsonl(path: str, relpath: str):
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise TypeError(f"ожидался объект, а не {type(record).__name__}")
+                section, title, content = record["section"], record["title"], record["content"]
+                for name, value in (("section", section), ("title", title), ("content", content)):
+                    if not isinstance(value, str):
+                        raise TypeError(f"{name}: ожидалась строка, а не {type(value).__name__}")
+                key = record.get("key") or f"{relpath}#{title}"
+                if not isinstance(key, str):
+                    raise TypeError(f"key: ожидалась строка, а не {type(key).__name__}")
+            except (ValueError, KeyError, TypeError) as error:
+                logger.warning("%s:%s пропущена строка: %s", relpath, line_no, error)
+                continue
+            yield key, section, title, content
+
+
+def read_records(path: str, relpath: str):
+    """Потоково отдаёт (key, section, title, content) из одного файла."""
+    if path.endswith(".md"):
+        return _parse_markdown(path, relpath)
+    return _parse_jsonl(path, relpath)
+
+
+def scan(root: str) -> dict:
+    """{относительный путь: (mtime_ns, size)} для всех файлов контента."""
+    files = {}
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if name.endswith(EXTENSIONS):
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                relpath = os.path.relpath(path, root).replace(os.sep, "/")
+                files[relpath] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+class _Writer:
+    """Копит записи и сбрасывает их в базу пачками по BATCH_SIZE."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.sections = dict(conn.execute("SELECT name, id FROM sections"))
+        self.batch = []
+        self.written = 0
+
+    def section_id(self, name: str) -> int:
+        section_id = self.sections.get(name)
+        if section_id is None:
+            cursor = self.conn.execute("INSERT INTO sections (name, description) VALUES (?, '')", (name,))
+            section_id = self.sections[name] = cursor.lastrowid
+        return section_id
+
+    def add(self, relpath, key, section, title, content):
+        self.batch.append((self.section_id(section), title, content, key, relpath,
+                           content_hash(section, title, content)))
+        if len(self.batch) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.batch:
+            # Строка обновляется, только если хеш изменился: повторный импорт
+            # тех же файлов не пишет в базу и не сбрасывает кеши
+            cursor = self.conn.executemany('''
+                INSERT INTO materials (section_id, title, content, source_key, source_file, content_hash)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (source_key) DO UPDATE SET
+                    section_id = excluded.section_id,
+                    title = excluded.title,
+                    content = excluded.content,
+                    source_file = excluded.source_file,
+                    content_hash = excluded.content_hash
+                WHERE materials.content_hash IS NOT excluded.content_hash
+            ''', self.batch)
+            self.written += cursor.rowcount
+            self.batch = []
+        self.conn.commit()
+
+
+def import_changed(conn, root: str, full: bool = False) -> int:
+    """
+    Импортирует файлы, изменившиеся с прошлого импорта (или все при full=True),
+    и удаляет материалы исчезнувших файлов. Возвращает число изменённых строк.
+    """
+    known = {path: (mtime, size) for path, mtime, size in
+             conn.execute("SELECT path, mtime_ns, size FROM import_files")}
+    current = scan(root)
+    writer = _Writer(conn)
+    changed = 0
+
+    for relpath, signature in sorted(current.items()):
+        if not full and known.get(relpath) == signature:
+            continue
+        keys = set()
+        try:
+            for key, section, title, content in read_records(os.path.join(root, relpath), relpath):
+                keys.add(key)
+                writer.add(relpath, key, section, title, content)
+        except (OSError, UnicodeDecodeError) as error:
+            # Файл удалён после scan() или не в UTF-8: пропускаем его, не
+            # запоминая в import_files, — при следующем проходе попробуем снова
+            logger.error("Не удалось прочитать %s: %s", relpath, error)
+            writer.batch = []
+            continue
+        writer.flush()
+        # Записи, которых больше нет в файле
+        stale = [(row[0],) for row in conn.execute(
+            "SELECT source_key FROM materials WHERE source_file = ?", (relpath,))
+            if row[0] not in keys]
+        conn.executemany("DELETE FROM materials WHERE source_key = ?", stale)
+        changed += len(stale)
+        conn.execute("INSERT OR REPLACE INTO import_files (path, mtime_ns, size) VALUES (?, ?, ?)",
+                     (relpath, *signature))
+        conn.commit()
+        logger.info("Импортирован %s", relpath)
+
+    for relpath in known.keys() - current.keys():
+        changed += conn.execute("DELETE FROM materials WHERE source_file = ?", (relpath,)).rowcount
+        conn.execute("DELETE FROM import_files WHERE path = ?", (relpath,))
+        conn.commit()
+        logger.info("Удалены материалы файла %s", relpath)
+
+    return changed + writer.written
+
+
+class ContentWatcher:
+    """Фоновая задача: раз в `interval` секунд применяет изменённые файлы."""
+
+    def __init__(self, db, catalog, root: str, interval: float = 5.0):
+        self.db = db
+        self.catalog = catalog
+        self.root = root
+        self.interval = interval
+        self._task = None
+
+    async def sync(self):
+        changed = await self.db.run(import_changed, self.root)
+        if changed:
+            logger.info("Импорт контента: изменено строк %s", changed)
+            await self.catalog.refresh()
+        return changed
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sync()
+            except Exception:
+                logger.exception("Не удалось импортировать контент")
+
+
+def main():
+    from db import DB_PATH, Database
+    from migrations import migrate
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("root", help="каталог с файлами .md и .jsonl")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--full", action="store_true", help="перечитать все файлы, а не только изменённые")
+    parser.add_argument("--watch", action="store_true", help="продолжать следить за изменениями")
+    parser.add_argument("--interval", type=float, default=5.0)
+    args = parser.parse_args()
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+
+    db = Database(args.db, size=1)
+    db.open()
+    try:
+        with db.connection() as conn:
+            migrate(conn)
+            print(f"Изменено строк: {import_changed(conn, args.root, full=args.full)}")
+            while args.watch:
+                time.sleep(args.interval)
+                changed = import_changed(conn, args.root)
+                if changed:
+                    print(f"Изменено строк: {changed}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
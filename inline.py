@@ -0,0 +1,140 @@
+import bisect
+import heapq
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from normalize import words
+from search import stem
+
+logger = logging.getLogger(__name__)
+
+# Слово из заголовка весит как десять вхождений в тексте
+TITLE_WEIGHT = 10
+# Сколько слов словаря может раскрыть один префикс: ограничивает работу
+# на коротких префиксах вроде «п»
+MAX_EXPANSIONS = 64
+
+
+def _trigrams(word: str):
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+class PrefixIndex:
+    """
+    Индекс для поиска по мере набора.
+    Словарь отсортирован, поэтому все слова с данным префиксом находятся
+    двоичным поиском; если префикс ничего не дал, слово ищется как
+    подстрока через индекс триграмм. Для каждого слова хранится
+    {material_id: вес}.
+    """
+
+    def __init__(self, materials):
+        postings = defaultdict(dict)
+        for material in materials:
+            # Сначала считаем слова материала, потом один раз пишем в словарь:
+            # в тексте одни и те же термины повторяются десятки раз
+            counts = Counter(words(material.content))
+            for word in words(material.title):
+                counts[word] += TITLE_WEIGHT
+            for word, weight in counts.items():
+                postings[word][material.id] = weight
+        self.terms = sorted(postings)
+        self.postings = [postings[term] for term in self.terms]
+        trigrams = defaultdict(set)
+        for term_no, term in enumerate(self.terms):
+            for trigram in _trigrams(term):
+                trigrams[trigram].add(term_no)
+        self.trigrams = dict(trigrams)
+
+    def _expand(self, token: str):
+        lo = bisect.bisect_left(self.terms, token)
+        hi = bisect.bisect_left(self.terms, token + "\U0010ffff", lo)
+        if hi > lo:
+            return range(lo, min(hi, lo + MAX_EXPANSIONS))
+        if len(token) < 3:
+            return ()
+        candidates = None
+        for trigram in _trigrams(token):
+            term_nos = self.trigrams.get(trigram)
+            if not term_nos:
+                return ()
+            candidates = term_nos if candidates is None else candidates & term_nos
+        matches = sorted(n for n in candidates if token in self.terms[n])
+        return matches[:MAX_EXPANSIONS]
+
+    def search(self, text: str, limit: int):
+        """id материалов, где есть все слова запроса, по убыванию веса."""
+        scores = None
+        for token in (stem(word) for word in words(text)):
+            token_scores = {}
+            for term_no in self._expand(token):
+                for material_id, weight in self.postings[term_no].items():
+                    token_scores[material_id] = token_scores.get(material_id, 0) + weight
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {mid: scores[mid] + score for mid, score in token_scores.items() if mid in scores}
+            if not scores:
+                return []
+        if not scores:
+            return []
+        return heapq.nlargest(limit, scores, key=scores.get)
+
+
+class InlineSearch:
+    """
+    Держит индекс по текущему каталогу и перестраивает его при перезагрузке.
+    На большом каталоге построение занимает секунды, поэтому индекс
+    строится в фоновом потоке и только после первого inline-запроса: до
+    этого он не нужен и не должен замедлять запуск. Пока индекса нет,
+    ready() ложно и обработчик ищет через FTS5; при перезагрузке каталога
+    до готовности нового индекса работает старый.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.index = None
+        self._generation = None
+        self._building = False
+        catalog.add_listener(self._rebuild)
+
+    def ready(self) -> bool:
+        """
+        Готов ли индекс; первый вызов запускает его построение. Пока
+        каталог загружен без текста материалов, строить индекс не из чего.
+        """
+        if self.index is None and not self._building and self.catalog.complete:
+            self._start()
+        return self.index is not None
+
+    def _rebuild(self, catalog):
+        self._generation = catalog.generation
+        if self.index is not None or self._building:
+            self._start()
+
+    def _start(self):
+        self._building = True
+        threading.Thread(target=self._build, args=(self.catalog.generation, self.catalog.materials()),
+                         name="inline-index", daemon=True).start()
+
+    def _build(self, generation, materials):
+        started = time.perf_counter()
+        try:
+            index = PrefixIndex(materials)
+            # Пока строили, каталог мог смениться ещё раз: этот индекс уже
+            # устарел, новый строит следующий поток — он же и сбросит флаг
+            if generation == self._generation:
+                self.index = index
+                logger.info("Индекс inline-поиска: %s слов за %.0f мс",
+                            len(index.terms), (time.perf_counter() - started) * 1000)
+        except Exception:
+            logger.exception("Не удалось построить индекс inline-поиска")
+        finally:
+            if generation == self._generation:
+                self._building = False
+
+    def search(self, text: str, limit: int):
+        materials = (self.catalog.material(mid) for mid in self.index.search(text, limit))
+        return [material for material in materials if material is not None]
@@ -0,0 +1,131 @@
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from search import PAGE_SIZE, encode_cursor
+
+MAIN_MENU_BUTTON = InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu")
+HOME_BUTTON = InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")
+
+BACK_TO_MENU = InlineKeyboardMarkup([[MAIN_MENU_BUTTON]])
+START_REVIEW = InlineKeyboardMarkup([[InlineKeyboardButton("🧠 Повторить", callback_data="review")]])
+
+# Оценки карточки повторения: (подпись, качество для SM-2)
+REVIEW_GRADES = (("❌ Не помню", 1), ("😓 Трудно", 3), ("🙂 Хорошо", 4), ("😎 Легко", 5))
+
+
+class Keyboards:
+    """
+    Клавиатуры меню, собранные по разделам и материалам из каталога.
+    InlineKeyboardMarkup неизменяемы, поэтому один объект раздаётся всем
+    обработчикам. Главное меню собирается при перезагрузке каталога,
+    клавиатуры разделов и материалов — при первом обращении: на большом
+    каталоге собирать их все заранее значит задерживать запуск.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.main_menu = BACK_TO_MENU
+        self.help_sections = ""
+        self._sections = {}
+        self._material_back = {}
+        self._review = {}
+        catalog.add_listener(self._rebuild)
+
+    def _rebuild(self, catalog):
+        rows = [[InlineKeyboardButton(section.name, callback_data=f"section_{section.id}")]
+                for section in catalog.sections]
+        rows.append([InlineKeyboardButton("▶️ Продолжить", callback_data="continue"),
+                     InlineKeyboardButton("⭐ Закладки", callback_data="bookmarks")])
+        rows.append([InlineKeyboardButton("🧠 Повторение", callback_data="review")])
+        rows.append([InlineKeyboardButton("💬 Случайная цитата", callback_data="random_quote")])
+        rows.append([InlineKeyboardButton("🔍 Поиск", callback_data="search")])
+
+        self.main_menu = InlineKeyboardMarkup(rows)
+        self.help_sections = "\n".join(f"• {section.name}" for section in catalog.sections)
+        self._sections = {}
+        self._material_back = {}
+        self._review = {}
+
+    def section(self, section_id: int):
+        markup = self._sections.get(section_id)
+        if markup is None:
+            if self.catalog.section(section_id) is None:
+                return BACK_TO_MENU
+            rows = [[material_button(material)] for material in self.catalog.materials_in(section_id)]
+            rows.append([MAIN_MENU_BUTTON])
+            markup = self._sections[section_id] = InlineKeyboardMarkup(rows)
+        return markup
+
+    def material(self, material, page: int = 0):
+        markup = self._material_back.get((material.id, page))
+        if markup is None:
+            # Под материалом: листание страниц, закладка, назад к его разделу и в главное меню
+            rows = self._pages(f"mp:{material.id}", material.id, page)
+            rows.append([InlineKeyboardButton("⭐ Закладка", callback_data=f"bookmark_{material.id}")])
+            rows.append([InlineKeyboardButton("🔙 Назад к разделу", callback_data=f"section_{material.section_id}")])
+            rows.append([HOME_BUTTON])
+            markup = self._material_back[(material.id, page)] = InlineKeyboardMarkup(rows)
+        return markup
+
+    def review_card(self, card_id: int, answer: bool, page: int = 0):
+        """
+        Под карточкой: до ответа — «Показать ответ» (rv:show:<id>), после —
+        листание страниц ответа (rv:show:<id>:<страница>) и оценки
+        (rv:g:<id>:<качество>).
+        """
+        markup = self._review.get((card_id, answer, page))
+        if markup is None:
+            if answer:
+                buttons = [InlineKeyboardButton(label, callback_data=f"rv:g:{card_id}:{quality}")
+                           for label, quality in REVIEW_GRADES]
+                rows = self._pages(f"rv:show:{card_id}", card_id, page)
+                rows += [buttons[:2], buttons[2:]]
+            else:
+                rows = [[InlineKeyboardButton("👁 Показать ответ", callback_data=f"rv:show:{card_id}")],
+                        [MAIN_MENU_BUTTON]]
+            markup = self._review[(card_id, answer, page)] = InlineKeyboardMarkup(rows)
+        return markup
+
+    def _pages(self, prefix: str, material_id: int, page: int):
+        """Ряд ◀️ n/N ▶️ для длинного материала (callback_data — prefix:<страница>) или пустой список."""
+        pages = len(self.catalog.rendered(material_id))
+        if pages <= 1:
+            return []
+        row = []
+        if page > 0:
+            row.append(InlineKeyboardButton("◀️", callback_data=f"{prefix}:{page - 1}"))
+        row.append(InlineKeyboardButton(f"{page + 1}/{pages}", callback_data="noop"))
+        if page < pages - 1:
+            row.append(InlineKeyboardButton("▶️", callback_data=f"{prefix}:{page + 1}"))
+        return [row]
+
+
+def material_button(material):
+    return InlineKeyboardButton(f"📄 {material.title}", callback_data=f"material_{material.id}")
+
+
+def bookmarks(materials):
+    """Список закладок пользователя; строится на каждый запрос."""
+    rows = [[material_button(material)] for material in materials]
+    rows.append([MAIN_MENU_BUTTON])
+    return InlineKeyboardMarkup(rows)
+
+
+def search_pages(query_id: str, tag: str, start: int, results, has_prev: bool, has_next: bool):
+    """
+    Кнопки листания результатов поиска. В callback_data — номер запроса,
+    хеш его выражения MATCH (search.match_tag), номер первого результата
+    страницы и позиция (rank, id), от которой листать:
+    sp:<запрос>:<хеш>:<начало>:<n|p>:<позиция>.
+    """
+    row = []
+    if has_prev:
+        first = results[0]
+        row.append(InlineKeyboardButton(
+            "◀️ Назад",
+            callback_data=f"sp:{query_id}:{tag}:{max(0, start - PAGE_SIZE)}:p:{encode_cursor(first.rank, first.id)}"))
+    if has_next:
+        last = results[-1]
+        row.append(InlineKeyboardButton(
+            "Дальше ▶️",
+            callback_data=f"sp:{query_id}:{tag}:{start + len(results)}:n:{encode_cursor(last.rank, last.id)}"))
+    return InlineKeyboardMarkup([row]) if row else None
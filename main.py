@@ -1,20 +1,41 @@
-import logging
-import sqlite3
-import random
+import argparse
+import asyncio
 import html
-import re
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
-
-def neutralize_slashes_for_telegram(text_html_escaped: str) -> str:
-    """
-    Заменяет обычный '/' на символ деления '∕' (U+2215), если сразу
-    после слэша идёт буква или цифра. Так '/2', '/n', '/k' и т.п.
-    перестают считаться командами Telegram.
-    Работает по уже экранированному HTML-тексту.
-    """
-    # Меняем только шаблон "слэш + буква/цифра", чтобы ссылки с протоколом и прочие случаи не трогать
-    return re.sub(r'/(?=[0-9A-Za-zА-Яа-я])', '∕', text_html_escaped)
+import io
+import logging
+import resource
+import time
+from datetime import datetime
+from telegram import (
+    Update, InlineQueryResultArticle, InputTextMessageContent,
+)
+from telegram.ext import (
+    Application, CommandHandler, CallbackQueryHandler, ContextTypes, InlineQueryHandler, filters
+)
+from telegram.helpers import escape_markdown
+
+import config
+from admission import AdmissionControl
+from analytics import UsageLog
+from broadcast import Broadcaster
+from catalog import Catalog
+from db import DB_PATH, Database
+from formulas import FormulaImages, matplotlib_available
+from importer import ContentWatcher, import_changed
+from inline import InlineSearch
+from keyboards import BACK_TO_MENU, START_REVIEW, Keyboards, bookmarks, search_pages
+from quotes import QuoteRotation
+from review import ReviewEngine
+from metrics import REGISTRY, Gauge, db_query_seconds, handler_observers, start_metrics_server, timed
+from migrations import migrate
+from normalize import words
+from profiling import DEFAULT_WINDOW, Profiler
+from search import (
+    PAGE_SIZE, SearchCache, SearchQueries, build_match_query, decode_cursor, match_tag,
+    search_materials, search_page,
+)
+from sender import BULK, OutboundScheduler
+from sessions import SessionStore
 
 # Настройка логирования
 logging.basicConfig(
@@ -22,438 +43,154 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Инициализация базы данных
+# Пул соединений с базой, открывается в main()
+db = Database(DB_PATH)
+
+# Разделы и материалы в памяти, перечитываются при смене поколения контента
+catalog = Catalog(db)
+
+# Клавиатуры меню, пересобираются вместе с каталогом
+keyboards = Keyboards(catalog)
+
+# Поиск по мере набора для inline-режима (@bot запрос)
+inline_search = InlineSearch(catalog)
+
+# Запросы /search, результаты которых листают кнопками
+search_queries = SearchQueries()
+
+# Кеш результатов поиска, сбрасывается сменой поколения контента
+search_cache = SearchCache(catalog, size=config.SEARCH_CACHE_SIZE, ttl=config.SEARCH_CACHE_TTL)
+
+# Последний материал, закладки и недавние запросы пользователей;
+# пишутся в базу в фоне
+sessions = SessionStore(db, config.SESSION_FLUSH_INTERVAL)
+
+# Цитаты без повторов для каждого пользователя, позиция хранится в сессии
+quotes = QuoteRotation(catalog, state=sessions.quote_states)
+
+# Импорт материалов из файлов с подхватом изменений на ходу
+content_watcher = None
+if config.CONTENT_DIR:
+    content_watcher = ContentWatcher(db, catalog, config.CONTENT_DIR, config.CONTENT_POLL_INTERVAL)
+
+# Картинки формул: только если включены и установлен matplotlib
+formula_images = None
+if config.FORMULA_IMAGES:
+    if matplotlib_available():
+        formula_images = FormulaImages(db, catalog, config.FORMULA_CACHE_DIR,
+                                       dpi=config.FORMULA_DPI, workers=config.FORMULA_WORKERS)
+    else:
+        logger.warning("FORMULA_IMAGES=1, но matplotlib не установлен: формулы остаются текстом")
+# Фоновые отправки картинок формул: ссылки, чтобы задачи не собрал GC
+formula_sends = set()
+
+# Ограничение одновременных обработчиков и частоты апдейтов от пользователя
+admission = AdmissionControl(config.HANDLER_CONCURRENCY, rate=config.USER_RATE, burst=config.USER_BURST)
+
+# Очередь исходящих запросов с учётом лимитов Telegram
+outbound = OutboundScheduler(
+    global_rate=config.OUTBOUND_GLOBAL_RATE,
+    chat_rate=config.OUTBOUND_CHAT_RATE,
+)
+
+# Цитата дня и объявления подписчикам, уходят через outbound с приоритетом BULK
+broadcaster = Broadcaster(db, outbound, daily=lambda day: format_daily_quote(quotes.daily(day.toordinal())),
+                          at=config.BROADCAST_TIME)
+
+# Карточки повторения определений и теорем с напоминаниями о сроках
+reviews = ReviewEngine(db, catalog, outbound, reminder_markup=START_REVIEW)
+
+# Статистика использования: события обработчиков, открытые материалы и запросы
+usage = UsageLog(db)
+handler_observers.append(usage.handler)
+warm_up_task = None
+
+# Метрики: время запросов к базе и состояние очереди исходящих
+db.observer = db_query_seconds.observe
+REGISTRY.register(Gauge("bot_outbound_queued", "Запросы в очереди исходящих", lambda: outbound.queued))
+REGISTRY.register(Gauge("bot_outbound_in_flight", "Выполняющиеся запросы к Bot API",
+                        lambda: outbound.in_flight))
+REGISTRY.register(Gauge("bot_handlers_in_flight", "Выполняющиеся обработчики апдейтов",
+                        lambda: admission.in_flight))
+REGISTRY.register(Gauge("bot_content_generation", "Поколение загруженного каталога",
+                        lambda: catalog.generation))
+REGISTRY.register(Gauge("bot_search_cache_entries", "Записи в кеше поиска", lambda: len(search_cache)))
+REGISTRY.register(Gauge("bot_sessions_dirty", "Пользователи с несохранённым состоянием",
+                        lambda: sessions.dirty))
+REGISTRY.register(Gauge("bot_review_users_scheduled", "Пользователи в очереди напоминаний о повторении",
+                        lambda: reviews.scheduled))
+metrics_server = None
+
+# Профилирование по команде администратора (/profile)
+profiler = Profiler()
+started_at = time.monotonic()
+
+# Инициализация базы данных: миграции схемы и импорт файлов
 def init_database():
-    conn = sqlite3.connect('math_bot.db')
-    cursor = conn.cursor()
-    
-    # Таблица с разделами
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sections (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            description TEXT
-        )
-    ''')
-    
-    # Таблица с материалами
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS materials (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            section_id INTEGER,
-            title TEXT NOT NULL,
-            content TEXT NOT NULL,
-            FOREIGN KEY (section_id) REFERENCES sections (id)
-        )
-    ''')
-    
-    # Таблица с цитатами
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS quotes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            author TEXT NOT NULL,
-            quote_text TEXT NOT NULL
-        )
-    ''')
-    
-    # Заполняем начальными данными
-    fill_initial_data(cursor)
-    
-    conn.commit()
-    conn.close()
+    with db.connection() as conn:
+        migrate(conn)
+        if config.CONTENT_DIR:
+            changed = import_changed(conn, config.CONTENT_DIR)
+            logger.info("Импорт из %s: изменено строк %s", config.CONTENT_DIR, changed)
 
-def fill_initial_data(cursor):
-    # Проверяем, есть ли уже данные
-    cursor.execute("SELECT COUNT(*) FROM sections")
-    if cursor.fetchone()[0] > 0:
+async def warm_caches():
+    """
+    Кладёт в кеши то, что чаще всего открывали и искали за последние дни:
+    клавиатуры разделов, отрисовку и клавиатуры материалов, результаты
+    поиска. Идёт в фоне после запуска, ответы пользователям не ждут её.
+    """
+    started = time.perf_counter()
+    try:
+        for key, _, _ in await usage.hottest("section", len(catalog.sections)):
+            keyboards.section(int(key))
+        materials = 0
+        for key, _, _ in await usage.hottest("material", config.WARM_MATERIALS):
+            material = catalog.material(int(key))
+            if material is not None:
+                catalog.rendered(material.id)
+                keyboards.material(material)
+                materials += 1
+        queries = await usage.hottest("query", config.WARM_QUERIES)
+        for text, _, _ in queries:
+            await search_materials(db, text, limit=PAGE_SIZE, cache=search_cache)
+    except Exception:
+        logger.exception("Не удалось прогреть кеши")
         return
-    
-    # Добавляем разделы
-    sections = [
-        ("📐 Аксиомы", "Аксиоматика вещественных чисел"),
-        ("📊 Супремум и инфимум", "Верхние и нижние грани множеств"),
-        ("🎯 Предел последовательности", "Теория пределов и сходимость"),
-        ("🔍 Доказательства", "Важные математические доказательства"),
-        ("🛠️ Методы решения", "Методы решения задач")
-    ]
-    cursor.executemany("INSERT INTO sections (name, description) VALUES (?, ?)", sections) 
-    # Добавляем материалы для Аксиом
-    axioms_materials = [
-        (1, "16 аксиом ℝ", """
-📚 16 АКСИОМ ВЕЩЕСТВЕННЫХ ЧИСЕЛ
-
-Аксиомы сложения (A1-A4):
-A1. (x + y) + z = x + (y + z) - ассоциативность
-A2. x + y = y + x - коммутативность  
-A3. ∃0: x + 0 = x - нулевой элемент
-A4. ∀x ∃(-x): x + (-x) = 0 - противоположный элемент
-
-Аксиомы умножения (A5-A8):
-A5. (x·y)·z = x·(y·z) - ассоциативность
-A6. x·y = y·x - коммутативность
-A7. ∃1≠0: x·1 = x - единичный элемент
-A8. ∀x≠0 ∃x⁻¹: x·x⁻¹ = 1 - обратный элемент
-
-Аксиома дистрибутивности (A9):
-A9. (x + y)·z = x·z + y·z
-
-Аксиомы порядка (A10-A15):
-A10. x ≤ x - рефлексивность
-A11. (x ≤ y ∧ y ≤ z) ⇒ x ≤ z - транзитивность
-A12. (x ≤ y ∧ y ≤ x) ⇒ x = y - антисимметричность
-A13. x ≤ y ∨ y ≤ x - линейная упорядоченность
-A14. x ≤ y ⇒ x + z ≤ y + z
-A15. (0 ≤ x ∧ 0 ≤ y) ⇒ 0 ≤ x·y
-
-Аксиома полноты (A16):
-A16. ∀X,Y⊂ℝ, X≤Y ⇒ ∃c∈ℝ: X≤c≤Y
-        """),
-        
-        (1, "Аксиома полноты", """
-🎯 АКСИОМА ПОЛНОТЫ (НЕПРЕРЫВНОСТИ)
-
-Формулировка:
-Для любых непустых множеств X, Y ⊂ ℝ таких, что 
-∀x∈X ∀y∈Y: x ≤ y, 
-существует число c ∈ ℝ такое, что 
-∀x∈X ∀y∈Y: x ≤ c ≤ y.
-
-Геометрический смысл:
-Числовая прямая не имеет "дырок" - между любыми двумя непересекающимися множествами найдётся разделяющее число.
-
-Пример:
-X = {x ∈ ℚ: x² < 2}, Y = {x ∈ ℚ: x² > 2}
-c = √2 ∉ ℚ, но c ∈ ℝ
-        """),
-        
-        (1, "Свойства операций", """
-⚙️ СВОЙСТВА ОПЕРАЦИЙ
-
-Из аксиом следуют:
-1. Единственность нуля: если 0' - другой нуль, то 0' = 0
-2. Единственность противоположного: -x определяется однозначно
-3. 0·x = 0 для любого x ∈ ℝ
-4. (-1)·x = -x
-5. x·y = 0 ⇒ (x=0 ∨ y=0)
-        """)
-    ]
-    
-    # Добавляем материалы для Супремума и инфимума
-    supremum_materials = [
-        (2, "Определения", """
-📖 ОПРЕДЕЛЕНИЯ
-
-Множество X ⊂ ℝ называется:
-• Ограниченным сверху, если ∃M∈ℝ: ∀x∈X x ≤ M
-• Ограниченным снизу, если ∃m∈ℝ: ∀x∈X x ≥ m
-• Ограниченным, если ограничено сверху и снизу
-
-Верхняя грань (супремум):
-sup X = min{M ∈ ℝ: ∀x∈X x ≤ M}
-
-Нижняя грань (инфимум):
-inf X = max{m ∈ ℝ: ∀x∈X x ≥ m}
-        """),
-        
-        (2, "Свойства sup и inf", """
-🔧 СВОЙСТВА SUP И INF
-
-1. ∀x∈X: x ≤ sup X, x ≥ inf X
-2. ∀ε>0 ∃x∈X: x > sup X - ε
-3. ∀ε>0 ∃x∈X: x < inf X + ε
-4. Если X ⊂ Y, то inf Y ≤ inf X ≤ sup X ≤ sup Y
-5. sup(X ∪ Y) = max{sup X, sup Y}
-6. inf(X ∪ Y) = min{inf X, inf Y}
-
-Примеры:
-• sup[0,1) = 1, inf[0,1) = 0
-• sup(0,1) = 1, inf(0,1) = 0
-• supℕ = +∞, infℕ = 1
-        """),
-        
-        (2, "Критерий sup", """
-🎯 КРИТЕРИЙ СУПРЕМУМА
-
-Число α = sup X тогда и только тогда, когда:
-1. α - верхняя граница: ∀x∈X x ≤ α
-2. α - наименьшая верхняя граница: 
-   ∀ε>0 ∃x∈X: x > α - ε
-
-Эквивалентная формулировка:
-α = sup X ⇔ [∀x∈X x≤α] ∧ [∀α'<α ∃x∈X x>α']
-        """)
-    ]
-    
-
-# Добавляем материалы для Пределов
-    limits_materials = [
-        (3, "Определение предела", """
-🎯 ОПРЕДЕЛЕНИЕ ПРЕДЕЛА
-
-Число a называется пределом последовательности {xₙ}, если:
-∀ε>0 ∃N∈ℕ ∀n≥N: |xₙ - a| < ε
-
-Обозначение: lim(xₙ) = a или xₙ → a
-
-Геометрический смысл:
-В любой ε-окрестности точки a лежат все члены последовательности, начиная с некоторого номера.
-        """),
-        
-        (3, "Свойства пределов", """
-🔧 СВОЙСТВА ПРЕДЕЛОВ
-
-1. Единственность: если lim xₙ = a и lim xₙ = b, то a = b
-2. Ограниченность: сходящаяся последовательность ограничена
-3. Предел и неравенства: 
-   если xₙ ≤ yₙ и lim xₙ = a, lim yₙ = b, то a ≤ b
-4. Арифметические операции:
-   • lim(xₙ + yₙ) = lim xₙ + lim yₙ
-   • lim(xₙ · yₙ) = lim xₙ · lim yₙ
-   • lim(xₙ / yₙ) = lim xₙ / lim yₙ (если lim yₙ ≠ 0)
-        """),
-        
-        (3, "Важные пределы", """
-📊 ВАЖНЫЕ ПРЕДЕЛЫ
-
-1. lim(1/n) = 0
-2. lim(1/nᵖ) = 0 (p > 0)
-3. lim(qⁿ) = 0 (|q| < 1)
-4. lim(1 + 1/n)ⁿ = e ≈ 2.71828
-5. lim(ⁿ√n) = 1
-6. lim(ⁿ√a) = 1 (a > 0)
-7. lim(n!/nⁿ) = 0
-        """),
-        
-        (3, "Монотонные последовательности", """
-📈 МОНОТОННЫЕ ПОСЛЕДОВАТЕЛЬНОСТИ
-
-Теорема (Вейерштрасса):
-Всякая монотонная ограниченная последовательность сходится.
-
-• Если {xₙ} неубывает и ограничена сверху, то 
-  lim xₙ = sup{xₙ}
-• Если {xₙ} невозрастает и ограничена снизу, то
-  lim xₙ = inf{xₙ}
-
-Пример: xₙ = (1 + 1/n)ⁿ - возрастает и ограничена ⇒ сходится к e
-        """)
-    ]
-    
-    # Добавляем материалы для Доказательств
-    proofs_materials = [
-        (4, "√2 иррационально", """
-🔍 ИРРАЦИОНАЛЬНОСТЬ √2
-
-Доказательство от противного:
-
-Предположим: √2 ∈ ℚ, т.е. √2 = m/n, где m,n ∈ ℕ, дробь несократима
-
-Тогда: 
-m² = 2n² ⇒ m² чётно ⇒ m чётно ⇒ m = 2k
-
-Подставляем:
-(2k)² = 2n² ⇒ 4k² = 2n² ⇒ n² = 2k² ⇒ n² чётно ⇒ n чётно
-
-Получили: m и n оба чётны ⇒ дробь m/n сократима
-
-Противоречие с предположением о несократимости.
-        """),
-        
-        (4, "0 < 1", """
-🔢 ДОКАЗАТЕЛЬСТВО 0 < 1
-
-1. По аксиоме (A7): 1 ≠ 0
-2. По трихотомии (A13): либо 1 > 0, либо 1 < 0
-3. Предположим: 1 < 0
-4. Тогда -1 > 0 (по свойству)
-5. (-1)·(-1) = 1 > 0 (по аксиоме A15)
-6. Но если 1 < 0, то 1 не может быть > 0
-7. Противоречие ⇒ 1 > 0
-        """),
-        
-        (4, "Принцип индукции", """
-🌀 ПРИНЦИП МАТЕМАТИЧЕСКОЙ ИНДУКЦИИ
-
-Формулировка:
-Если:
-1. P(1) истинно
-2. ∀n∈ℕ: P(n) ⇒ P(n+1)
-Тогда: ∀n∈ℕ P(n) истинно
-
-Доказательство эквивалентности принципу минимума:
-
-Пусть M = {n∈ℕ: P(n) ложно}. 
-Если M ≠ ∅, то по принципу минимума ∃min M = m.
-Тогда m > 1 (т.к. P(1) истинно) и P(m-1) истинно.
-Но тогда по условию 2 P(m) истинно ⇒ противоречие.
-        """),
-        
-        (4, "Бесконечность ℕ", """
-∞ БЕСКОНЕЧНОСТЬ МНОЖЕСТВА ℕ
-
-Доказательство от противного:
-
-Предположим: ℕ конечно ⇒ ∃max ℕ = M
-
-Рассмотрим M + 1:
-• M + 1 > M (по построению)
-• M + 1 ∈ ℕ (по определению)
-
-Противоречие: M не является максимумом ⇒ ℕ бесконечно.
-        """)
-    ]
-    
- # Добавляем материалы для Методов решения
-    methods_materials = [
-        (5, "Неопределённые коэффициенты", """
-🧮 МЕТОД НЕОПРЕДЕЛЁННЫХ КОЭФФИЦИЕНТОВ
-
-Применяется для разложения рациональных дробей:
-
-P(x)/Q(x) = A₁/(x-a₁) + A₂/(x-a₂) + ... + Aₖ/(x-aₖ)
-
-Пример:
-(3x+1)/((x-1)(x+2)) = A/(x-1) + B/(x+2)
-
-Умножаем на знаменатель:
-3x + 1 = A(x+2) + B(x-1)
-
-Решаем систему:
-{ A + B = 3
-{ 2A - B = 1
-
-Решение: A = 4/3, B = 5/3
-        """),
-        
-        (5, "Метод математической индукции", """
-🌀 МЕТОД МАТЕМАТИЧЕСКОЙ ИНДУКЦИИ
-
-Шаги доказательства:
-1. База индукции: проверяем утверждение для n=1
-2. Индукционный переход: 
-   Предполагаем верным для n=k
-   Доказываем для n=k+1
-
-Пример: 1 + 2 + ... + n = n(n+1)/2
-
-База: n=1: 1 = 1·2/2 ✓
-Переход: 
-1+...+k+(k+1) = k(k+1)/2 + (k+1) = (k+1)(k/2+1) = (k+1)(k+2)/2
-        """),
-        
-        (5, "Зажатие (теорема о двух милиционерах)", """
-🎯 ТЕОРЕМА О ЗАЖАТОЙ ПОСЛЕДОВАТЕЛЬНОСТИ
-
-Если:
-1. lim xₙ = lim yₙ = a
-2. ∃N: ∀n≥N xₙ ≤ zₙ ≤ yₙ
-Тогда: lim zₙ = a
-
-Пример:
-lim (sin n)/n = 0, т.к.
--1/n ≤ (sin n)/n ≤ 1/n
-и lim ±1/n = 0
-        """),
-        
-        (5, "Критерий Коши", """
-📏 КРИТЕРИЙ КОШИ СХОДИМОСТИ
-
-Последовательность {xₙ} сходится тогда и только тогда, когда:
-∀ε>0 ∃N∈ℕ ∀m,n≥N: |xₘ - xₙ| < ε
-
-Геометрический смысл:
-Члены последовательности становятся сколь угодно близкими друг к другу.
-
-Применение:
-Позволяет доказывать сходимость, не зная предела.
-        """)
-    ]
-    
-    # Объединяем все материалы
-    all_materials = (axioms_materials + supremum_materials + 
-                    limits_materials + proofs_materials + methods_materials)
-    
-    cursor.executemany(
-        "INSERT INTO materials (section_id, title, content) VALUES (?, ?, ?)", 
-        all_materials
-    )
-    
-    # Добавляем цитаты
-    quotes = [
-        ("Платон", "Математика — это занятие для души"),
-        ("Аристотель", "Математика выявляет порядок, симметрию и определённость"),
-        ("Пифагор", "Всё есть число"),
-        ("Евклид", "В математике нет царской дороги"),
-        ("Архимед", "Дайте мне точку опоры, и я переверну мир"),
-        ("Платон", "Бог вечно геометризует"),
-        ("Пифагор", "Начало есть половина целого"),
-        ("Аристотель", "Природа боится пустоты"),
-        ("Евклид", "Что и требовалось доказать"),
-        ("Архимед", "Эврика!")
-    ]
-    cursor.executemany(
-        "INSERT INTO quotes (author, quote_text) VALUES (?, ?)", 
-        quotes
-    )
+    logger.info("Кеши прогреты за %.2f с: материалов %s, запросов %s",
+                time.perf_counter() - started, materials, len(queries))
 
 # Функции для работы с базой данных
-def get_sections():
-    conn = sqlite3.connect('math_bot.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name, description FROM sections ORDER BY id")
-    sections = cursor.fetchall()
-    conn.close()
-    return sections
-
-def get_section_materials(section_id):
-    conn = sqlite3.connect('math_bot.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, title, content FROM materials WHERE section_id = ?", (section_id,))
-    materials = cursor.fetchall()
-    conn.close()
-    return materials
-
-def get_random_quote():
-    conn = sqlite3.connect('math_bot.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT author, quote_text FROM quotes ORDER BY RANDOM() LIMIT 1")
-    quote = cursor.fetchone()
-    conn.close()
-    return quote
-
-def search_materials(query):
-    conn = sqlite3.connect('math_bot.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT m.id, m.title, m.content, s.name 
-        FROM materials m 
-        JOIN sections s ON m.section_id = s.id 
-        WHERE m.title LIKE ? OR m.content LIKE ?
-    ''', (f'%{query}%', f'%{query}%'))
-    results = cursor.fetchall()
-    conn.close()
-    return results
+# Все сообщения уходят через очередь outbound
+async def reply(update: Update, text, **kwargs):
+    return await outbound.send(update.effective_chat.id, update.message.reply_text, text, **kwargs)
+
+async def edit(query, text, **kwargs):
+    return await outbound.send(query.message.chat_id, query.edit_message_text, text, **kwargs)
+
+def callback_kind(update: Update) -> str:
+    data = update.callback_query.data or ""
+    if data.startswith(("section_", "material_", "bookmark_")):
+        return data.split("_", 1)[0]
+    if data.startswith("sp:"):
+        return "search_page"
+    if data.startswith("rv:"):
+        return "review"
+    if data.startswith("mp:"):
+        return "material_page"
+    return data
 
 # Команды бота
+@timed("start")
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    keyboard = [
-        [InlineKeyboardButton("📐 Аксиомы", callback_data="section_1")],
-        [InlineKeyboardButton("📊 Супремум и инфимум", callback_data="section_2")],
-        [InlineKeyboardButton("🎯 Предел последовательности", callback_data="section_3")],
-        [InlineKeyboardButton("🔍 Доказательства", callback_data="section_4")],
-        [InlineKeyboardButton("🛠️ Методы решения", callback_data="section_5")],
-        [InlineKeyboardButton("💬 Случайная цитата", callback_data="random_quote")],
-        [InlineKeyboardButton("🔍 Поиск", callback_data="search")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await update.message.reply_text(
+    await reply(
+        update,
         "📚 *Добро пожаловать в бот по математическому анализу!*\n\n"
         "Выберите раздел:",
-        reply_markup=reply_markup,
+        reply_markup=keyboards.main_menu,
         parse_mode='Markdown'
     )
 
+@timed("help")
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     help_text = """
 📖 *Доступные команды:*
@@ -462,202 +199,518 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 /help - помощь  
 /quote - случайная цитата
 /search - поиск по материалам
+/review - повторить определения и теоремы
+/subscribe - цитата дня и новости каждый день
+/unsubscribe - отписаться от рассылки
 
 *Или используйте кнопки меню!*
 
 🎯 *Разделы:*
-• Аксиомы вещественных чисел
-• Супремум и инфимум  
-• Предел последовательности
-• Доказательства
-• Методы решения задач
-    """
-    await update.message.reply_text(help_text, parse_mode='Markdown')
+"""
+    await reply(update, help_text + keyboards.help_sections, parse_mode='Markdown')
 
+@timed("button_handler", kind=callback_kind)
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    await query.answer()
-    
     data = query.data
     
+    if data.startswith("bookmark_"):
+        # Ответ на нажатие — всплывающее уведомление, сообщение не меняется
+        await toggle_bookmark(query, int(data.split("_")[1]))
+        return
+    
+    await query.answer()
+    
     if data == "random_quote":
         await show_random_quote(query)
     elif data == "search":
-        await query.edit_message_text("🔍 *Поиск по материалам*\n\nВведите: /search <запрос>\n\nНапример: /search предел", parse_mode='Markdown')
+        await edit(query, "🔍 *Поиск по материалам*\n\nВведите: /search <запрос>\n\nНапример: /search предел", parse_mode='Markdown')
     elif data == "main_menu":
         await show_main_menu(query)
+    elif data == "continue":
+        await continue_reading(query)
+    elif data == "bookmarks":
+        await show_bookmarks(query)
+    elif data == "review":
+        await show_review(query)
+    elif data.startswith("rv:"):
+        await review_action(query, data)
     elif data.startswith("section_"):
         section_id = int(data.split("_")[1])
         await show_section_materials(query, section_id)
     elif data.startswith("material_"):
         material_id = int(data.split("_")[1])
         await show_material(query, material_id)
+    elif data.startswith("sp:"):
+        await show_search_page(query, data)
+    elif data.startswith("mp:"):
+        _, material_id, page = data.split(":")
+        await show_material_page(query, int(material_id), int(page))
 
 async def show_main_menu(query):
-    keyboard = [
-        [InlineKeyboardButton("📐 Аксиомы", callback_data="section_1")],
-        [InlineKeyboardButton("📊 Супремум и инфимум", callback_data="section_2")],
-        [InlineKeyboardButton("🎯 Предел последовательности", callback_data="section_3")],
-        [InlineKeyboardButton("🔍 Доказательства", callback_data="section_4")],
-        [InlineKeyboardButton("🛠️ Методы решения", callback_data="section_5")],
-        [InlineKeyboardButton("💬 Случайная цитата", callback_data="random_quote")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(
+    await edit(
+        query,
         "📚 *Выберите раздел:*",
-        reply_markup=reply_markup,
+        reply_markup=keyboards.main_menu,
         parse_mode='Markdown'
     )
 
 async def show_section_materials(query, section_id):
-    sections = get_sections()
-    section_name = next((name for id, name, desc in sections if id == section_id), "Раздел")
-    materials = get_section_materials(section_id)
+    section_name = catalog.section_name(section_id)
+    usage.record("section", section_id)
     
-    if not materials:
-        await query.edit_message_text(f"В разделе '{section_name}' пока нет материалов")
+    if not catalog.materials_in(section_id):
+        await edit(query, f"В разделе '{section_name}' пока нет материалов")
         return
     
-    keyboard = []
-    for material_id, title, content in materials:
-        keyboard.append([InlineKeyboardButton(f"📄 {title}", callback_data=f"material_{material_id}")])
-    
-    keyboard.append([InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu")])
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(
+    await edit(
+        query,
         f"📚 *{section_name}:*\n\nВыберите тему:",
-        reply_markup=reply_markup,
+        reply_markup=keyboards.section(section_id),
         parse_mode='Markdown'
     )
 
 async def show_material(query, material_id):
-    conn = sqlite3.connect('math_bot.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT m.title, m.content, s.name 
-        FROM materials m 
-        JOIN sections s ON m.section_id = s.id 
-        WHERE m.id = ?
-    ''', (material_id,))
-    row = cursor.fetchone()
-    conn.close()
-
-    if not row:
+    material = catalog.material(material_id)
+
+    if not material:
         await query.answer("Материал не найден", show_alert=True)
         return
 
-    title, content, section_name = row
+    sessions.viewed(query.from_user.id, material_id)
+    usage.record("material", material_id)
 
-    # Кнопки «назад»
-    section_id_for_back = next((sid for sid, name, _ in get_sections() if name == section_name), 1)
-    keyboard = [
-        [InlineKeyboardButton("🔙 Назад к разделу", callback_data=f"section_{section_id_for_back}")],
-        [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    # 1) Экранируем HTML
-    safe_title = html.escape(title)
-    safe_content = html.escape(content)
-
-    # 2) Убираем автодетект команд Telegram ("/2", "/n", "/k" и т.п.)
-    safe_content = neutralize_slashes_for_telegram(safe_content)
-
-    header = f"<b>{safe_title}</b>\n\n"
-    max_len = 4096
-    first_chunk_space = max_len - len(header)
-
-    # Отправка с parse_mode='HTML'
-    if len(safe_content) > first_chunk_space:
-        # Первая часть с заголовком
-        await query.edit_message_text(
-            header + safe_content[:first_chunk_space],
-            reply_markup=reply_markup,
-            parse_mode='HTML'
-        )
-        # Остальные части
-        for i in range(first_chunk_space, len(safe_content), max_len):
-            await query.message.reply_text(
-                safe_content[i:i+max_len],
-                parse_mode='HTML'
-            )
+    # Текст отрисован и разбит на страницы заранее при загрузке каталога;
+    # первая страница с заголовком, остальные — кнопками ◀️/▶️ в том же сообщении
+    await edit(
+        query,
+        catalog.rendered(material_id)[0],
+        reply_markup=keyboards.material(material),
+        parse_mode='HTML'
+    )
+    send_formulas_later(query, material, 0)
+
+async def show_material_page(query, material_id, page):
+    material = catalog.material(material_id)
+    pages = catalog.rendered(material_id) if material else None
+    if not pages:
+        await edit(query, "Материал не найден", reply_markup=BACK_TO_MENU)
+        return
+    # Каталог мог обновиться, пока сообщение висело в чате
+    page = min(page, len(pages) - 1)
+    await edit(query, pages[page], reply_markup=keyboards.material(material, page), parse_mode='HTML')
+    send_formulas_later(query, material, page)
+
+def send_formulas_later(query, material, page):
+    # Отрисовка и отправка картинок занимают секунды (лимит чата — сообщение
+    # в секунду), поэтому идут в фоне и не держат слот обработчика
+    if formula_images is None:
+        return
+    formulas = formula_images.unsent(query.message.chat_id, material, page)
+    if formulas:
+        task = asyncio.create_task(send_formulas(query, formulas))
+        formula_sends.add(task)
+        task.add_done_callback(formula_sends.discard)
+
+async def send_formulas(query, formulas):
+    for tex in formulas:
+        try:
+            photo = await formula_images.photo(tex)
+            if photo is None:
+                continue
+            key, file = photo
+            message = await outbound.send(query.message.chat_id, query.message.reply_photo, file, priority=BULK)
+            # Следующие просмотры отправят картинку по file_id, без загрузки
+            await formula_images.remember(key, message)
+        except Exception as error:
+            logger.warning("Не удалось отправить формулу %r: %s", tex, error)
+
+async def continue_reading(query):
+    state = sessions.get(query.from_user.id)
+    if state is None or catalog.material(state.last_material) is None:
+        await edit(query, "📚 Вы ещё не открывали материалы. Выберите раздел:",
+                   reply_markup=keyboards.main_menu)
+        return
+    await show_material(query, state.last_material)
+
+async def show_bookmarks(query):
+    state = sessions.get(query.from_user.id)
+    materials = [catalog.material(material_id) for material_id in (state.bookmarks if state else ())]
+    materials = [material for material in materials if material is not None]
+    if not materials:
+        await edit(query, "⭐ Закладок пока нет. Нажмите «⭐ Закладка» под материалом, чтобы добавить.",
+                   reply_markup=BACK_TO_MENU)
+        return
+    await edit(query, "⭐ *Ваши закладки:*", reply_markup=bookmarks(materials), parse_mode='Markdown')
+
+async def toggle_bookmark(query, material_id):
+    if catalog.material(material_id) is None:
+        await query.answer("Материал не найден", show_alert=True)
+        return
+    if sessions.toggle_bookmark(query.from_user.id, material_id):
+        await query.answer("⭐ Добавлено в закладки")
     else:
-        await query.edit_message_text(
-            header + safe_content,
-            reply_markup=reply_markup,
-            parse_mode='HTML'
-        )
+        await query.answer("Убрано из закладок")
+
+def format_when(timestamp) -> str:
+    left = timestamp - time.time()
+    if left < 3600:
+        return f"через {max(1, round(left / 60))} мин"
+    if left < 86400:
+        return f"через {round(left / 3600)} ч"
+    return datetime.fromtimestamp(timestamp).strftime("%d.%m")
+
+async def review_card_text(user_id):
+    """Текст и клавиатура следующей карточки или сообщение, что всё повторено."""
+    card = await reviews.next_card(user_id)
+    if card is None:
+        next_at = reviews.next_review(user_id)
+        text = "🧠 *Все карточки повторены!*"
+        if next_at is not None:
+            text += f"\n\nСледующее повторение {format_when(next_at)}."
+        return text, BACK_TO_MENU
+    material, is_new = card
+    due = await reviews.due_count(user_id)
+    header = "🆕 Новая карточка" if is_new else f"🧠 Повторение · осталось {due}"
+    return (f"{header}\n\n*{escape_markdown(material.title)}*\n\nВспомните формулировку и откройте ответ.",
+            keyboards.review_card(material.id, answer=False))
+
+async def show_review(query):
+    text, markup = await review_card_text(query.from_user.id)
+    await edit(query, text, reply_markup=markup, parse_mode='Markdown')
+
+async def review_action(query, data):
+    # rv:show:<id>[:<страница>] — показать ответ, rv:g:<id>:<оценка> — оценить и перейти к следующей
+    parts = data.split(":")
+    card_id = int(parts[2])
+    material = catalog.material(card_id)
+    if material is None:
+        await show_review(query)
+        return
+    if parts[1] == "show":
+        # Ответ — тот же постраничный материал, только под ним оценки
+        pages = catalog.rendered(card_id)
+        page = min(int(parts[3]) if len(parts) > 3 else 0, len(pages) - 1)
+        await edit(query, pages[page],
+                   reply_markup=keyboards.review_card(card_id, answer=True, page=page), parse_mode='HTML')
+        send_formulas_later(query, material, page)
+        return
+    await reviews.grade(query.from_user.id, card_id, int(parts[3]))
+    await show_review(query)
+
+def format_quote(quote) -> str:
+    if quote is None:
+        return "💬 Цитат пока нет"
+    return f"_{quote.text}_\n\n— *{quote.author}*"
+
+def format_daily_quote(quote):
+    if quote is None:
+        return None
+    return f"🌅 *Цитата дня*\n\n{format_quote(quote)}"
 
 async def show_random_quote(query):
-    author, quote_text = get_random_quote()
-    
-    keyboard = [[InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    quote = quotes.next_for(query.from_user.id)
     
-    await query.edit_message_text(
-        f"_{quote_text}_\n\n— *{author}*",
-        reply_markup=reply_markup,
+    await edit(
+        query,
+        format_quote(quote),
+        reply_markup=BACK_TO_MENU,
         parse_mode='Markdown'
     )
 
+@timed("search_command")
 async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not context.args:
-        await update.message.reply_text(
+        await reply(
+            update,
             "🔍 *Поиск по материалам*\n\n"
             "Использование: `/search <запрос>`\n\n"
             "Примеры:\n"
             "• `/search предел`\n"
             "• `/search аксиома`\n"
-            "• `/search доказательство`",
+            "• `/search доказательство`"
+            + format_recent_searches(update.effective_user.id),
             parse_mode='Markdown'
         )
         return
     
     query = " ".join(context.args)
-    results = search_materials(query)
+    sessions.searched(update.effective_user.id, query)
+    # Нормализованный запрос даёт то же выражение MATCH, что и исходный, — по нему и прогреваем кеш
+    usage.record("query", " ".join(words(query)))
+    results, total = await search_materials(db, query, limit=PAGE_SIZE, cache=search_cache)
     
     if not results:
-        await update.message.reply_text(f"🔍 По запросу '*{query}*' ничего не найдено", parse_mode='Markdown')
+        await reply(update, f"🔍 По запросу '*{query}*' ничего не найдено", parse_mode='Markdown')
         return
     
+    has_next = total > len(results)
+    match = build_match_query(query)
+    query_id = search_queries.add(query, match, total) if has_next else None
+    await reply(
+        update,
+        format_search_page(query, total, 0, results),
+        reply_markup=search_pages(query_id, match_tag(match), 0, results, False, has_next),
+        parse_mode='Markdown'
+    )
+
+def format_recent_searches(user_id) -> str:
+    state = sessions.get(user_id)
+    if state is None or not state.searches:
+        return ""
+    return "\n\nНедавние запросы:\n" + "\n".join(f"• `/search {text.replace('`', '')}`" for text in state.searches)
+
+def format_search_page(query, total, start, results):
     text = f"🔍 *Результаты поиска по запросу '{query}':*\n\n"
-    for i, (material_id, title, content, section_name) in enumerate(results[:5], 1):
-        # Создаем превью содержимого
-        preview = content.replace('\n', ' ')[:100] + "..." if len(content) > 100 else content
-        text += f"{i}. **{title}** (*{section_name}*)\n{preview}\n\n"
-    
-    if len(results) > 5:
-        text += f"*... и ещё {len(results) - 5} результатов*"
-    
-    await update.message.reply_text(text, parse_mode='Markdown')
+    for i, result in enumerate(results, start + 1):
+        # Превью — фрагмент вокруг совпадения, его готовит FTS5
+        preview = " ".join(result.snippet.split())
+        text += f"{i}. **{result.title}** (*{result.section_name}*)\n{preview}\n\n"
+    
+    if total > len(results):
+        text += f"*Результаты {start + 1}–{start + len(results)} из {total}*"
+    return text
+
+async def show_search_page(query, data):
+    parts = data.split(":")
+    # Кнопка старого формата, вытесненный запрос или номер из другого процесса
+    entry = search_queries.get(parts[1]) if len(parts) == 6 else None
+    if entry is None or match_tag(entry[1]) != parts[2]:
+        await edit(query, "🔍 Результаты устарели, повторите поиск: /search <запрос>")
+        return
+    _, query_id, tag, start, direction, cursor = parts
+    text, match, total = entry
+    start = int(start)
+    position = decode_cursor(cursor)
+    if direction == "n":
+        results, more = await search_page(db, match, PAGE_SIZE, after=position, cache=search_cache)
+        has_prev, has_next = True, more
+    else:
+        results, more = await search_page(db, match, PAGE_SIZE, before=position, cache=search_cache)
+        has_prev, has_next = more, True
+        if not more:
+            start = 0
+    if not results:
+        await edit(query, "🔍 Больше результатов нет, повторите поиск: /search <запрос>")
+        return
+    await edit(
+        query,
+        format_search_page(text, total, start, results),
+        reply_markup=search_pages(query_id, tag, start, results, has_prev, has_next),
+        parse_mode='Markdown'
+    )
 
+@timed("quote_command")
 async def quote_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    author, quote_text = get_random_quote()
-    await update.message.reply_text(
-        f"_{quote_text}_\n\n— *{author}*",
+    quote = quotes.next_for(update.effective_user.id)
+    await reply(
+        update,
+        format_quote(quote),
         parse_mode='Markdown'
     )
 
-def main():
-    # Инициализируем базу данных
-    init_database()
-    
-    # Создаем приложение
-    application = Application.builder().token("8373835216:AAF8m-ktBUj36hfgGm9x4pFwHPw_T2zfzck").build()
+@timed("subscribe")
+async def subscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await broadcaster.subscribe(update.effective_chat.id)
+    await reply(update, "🔔 Вы подписаны: цитата дня и новости бота будут приходить сюда.\n"
+                        "/unsubscribe — отписаться")
+
+@timed("unsubscribe")
+async def unsubscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await broadcaster.unsubscribe(update.effective_chat.id)
+    await reply(update, "🔕 Вы отписались от рассылки. /subscribe — подписаться снова")
+
+@timed("review_command")
+async def review_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    text, markup = await review_card_text(update.effective_user.id)
+    await reply(update, text, reply_markup=markup, parse_mode='Markdown')
+
+@timed("stats")
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    uptime = time.monotonic() - started_at
+    query_avg = db.query_time / db.query_count * 1000 if db.query_count else 0.0
+    lookups = search_cache.hits + search_cache.misses
+    sending = outbound.stats()
+    lines = [
+        "📈 *Состояние бота*",
+        "",
+        f"Работает: {uptime / 3600:.1f} ч, пик памяти {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024} МБ",
+        f"Обработчики: выполняется {admission.in_flight} из {config.HANDLER_CONCURRENCY}",
+        f"Исходящие: в очереди {sending['queued']}, выполняется {sending['in_flight']}, "
+        f"отправлено {sending['sent']}, ошибок {sending['failed']}, повторов {sending['retries']}, "
+        f"ожидание в среднем {sending['wait_avg_ms']:.0f} мс, максимум {sending['wait_max_ms']:.0f} мс",
+        f"База: занято соединений {db.in_use} из {db.size}, запросов в работе {db.in_flight}, "
+        f"всего {db.query_count}, в среднем {query_avg:.2f} мс",
+        f"Кеш поиска: {len(search_cache)} из {search_cache.size}, попаданий "
+        f"{search_cache.hits / lookups * 100 if lookups else 0:.0f}%",
+        f"Каталог: поколение {catalog.generation}, материалов {len(catalog.materials())}",
+        f"Пользователи: в памяти {len(sessions)}, не сохранено {sessions.dirty}, "
+        f"ждут повторения {reviews.scheduled}",
+        f"Профилирование: {'идёт' if profiler.active else 'выключено'}",
+    ]
+    await reply(update, "\n".join(lines), parse_mode='Markdown')
+
+@timed("profile")
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # /profile [секунды] — включить на окно, /profile stop — остановить и прислать отчёт
+    chat_id = update.effective_chat.id
+
+    async def send_report(summary, full):
+        await outbound.send(chat_id, context.bot.send_message, chat_id,
+                            f"<pre>{html.escape(summary[:4000])}</pre>", parse_mode='HTML')
+        await outbound.send(chat_id, context.bot.send_document, chat_id,
+                            io.BytesIO(full.encode("utf-8")), filename="profile.txt")
+
+    if context.args and context.args[0] == "stop":
+        report = profiler.stop()
+        if report is None:
+            await reply(update, "Профилирование не запущено")
+        else:
+            await send_report(*report)
+        return
+    try:
+        window = float(context.args[0]) if context.args else DEFAULT_WINDOW
+    except ValueError:
+        await reply(update, "Использование: /profile [секунды] или /profile stop")
+        return
+    window = profiler.start(window, on_done=send_report)
+    if window is None:
+        await reply(update, "Профилирование уже идёт. /profile stop — остановить")
+        return
+    await reply(update, f"⏱ Профилирование включено на {window:.0f} с, отчёт придёт сюда. "
+                        "/profile stop — остановить раньше")
+
+@timed("inline_query")
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    text = update.inline_query.query.strip()
+    results = []
+    if text:
+        if inline_search.ready():
+            materials = inline_search.search(text, config.INLINE_RESULTS)
+        else:
+            # Индекс ещё строится: тот же поиск по префиксам через FTS5
+            found, _ = await search_materials(db, text, limit=config.INLINE_RESULTS, cache=search_cache)
+            materials = [catalog.material(result.id) for result in found]
+            materials = [material for material in materials if material is not None]
+        for material in materials:
+            results.append(InlineQueryResultArticle(
+                id=str(material.id),
+                title=material.title,
+                description=f"{catalog.section_name(material.section_id)} · {material.preview}",
+                # Первая часть материала уже отрисована и влезает в одно сообщение
+                input_message_content=InputTextMessageContent(
+                    catalog.rendered(material.id)[0], parse_mode='HTML'
+                ),
+            ))
+    await update.inline_query.answer(results, cache_time=config.INLINE_CACHE_TIME)
+
+async def on_startup(application: Application):
+    global metrics_server, warm_up_task
+    outbound.start()
+    usage.start()
+    warm_up_task = asyncio.create_task(warm_caches())
+    catalog.start_watcher()
+    sessions.start()
+    if formula_images is not None:
+        formula_images.start()
+    if content_watcher is not None:
+        content_watcher.start()
+    if config.BROADCASTS:
+        broadcaster.start(application.bot)
+    if config.REVIEW_REMINDERS:
+        reviews.start(application.bot)
+    if config.METRICS_PORT:
+        metrics_server = await start_metrics_server(config.METRICS_HOST, config.METRICS_PORT)
+
+async def on_shutdown(application: Application):
+    if metrics_server is not None:
+        metrics_server.close()
+    if content_watcher is not None:
+        await content_watcher.stop()
+    await catalog.stop_watcher()
+    if warm_up_task is not None:
+        warm_up_task.cancel()
+    await broadcaster.stop()
+    await reviews.stop()
+    profiler.stop()
+    for task in list(formula_sends):
+        task.cancel()
+    await outbound.stop()
+    await sessions.stop()
+    await usage.stop()
+    if formula_images is not None:
+        formula_images.stop()
+    db.close()
+
+def build_application(updater: bool = True) -> Application:
+    """updater=False — без приёма апдейтов: их передаёт главный процесс (workers.py)."""
+    builder = (
+        Application.builder()
+        .token(config.BOT_TOKEN)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .concurrent_updates(admission)
+    )
+    if config.BOT_API_URL:
+        builder = builder.base_url(config.BOT_API_URL)
+    if not updater:
+        builder = builder.updater(None)
+    application = builder.build()
     
     # Добавляем обработчики
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CommandHandler("search", search_command))
     application.add_handler(CommandHandler("quote", quote_command))
+    application.add_handler(CommandHandler("subscribe", subscribe_command))
+    application.add_handler(CommandHandler("unsubscribe", unsubscribe_command))
+    application.add_handler(CommandHandler("review", review_command))
+    # Команды администраторов; без ADMIN_IDS они не отвечают никому
+    admins = filters.User(user_id=config.ADMIN_IDS)
+    application.add_handler(CommandHandler("stats", stats_command, filters=admins))
+    application.add_handler(CommandHandler("profile", profile_command, filters=admins))
     
     application.add_handler(CallbackQueryHandler(button_handler))
+    application.add_handler(InlineQueryHandler(inline_query))
+    return application
+
+def main():
+    parser = argparse.ArgumentParser(description="Бот по математическому анализу")
+    parser.add_argument("--mode", choices=("polling", "webhook"), default=config.BOT_MODE,
+                        help="способ получения апдейтов (по умолчанию BOT_MODE или polling)")
+    args = parser.parse_args()
+    if not config.BOT_TOKEN:
+        parser.error("задайте BOT_TOKEN — токен бота от @BotFather")
+    if args.mode == "webhook" and not config.WEBHOOK_URL:
+        parser.error("для режима webhook задайте WEBHOOK_URL — внешний адрес, который сообщается Telegram")
+    
+    # Инициализируем базу данных
+    db.open()
+    init_database()
+    catalog.load_sync()
+    sessions.load_sync()
+    reviews.load_sync()
+    if formula_images is not None:
+        formula_images.load_sync()
+    
+    # Создаем приложение
+    application = build_application()
     
     # Запускаем бота
-    logger.info("Бот запущен...")
-    application.run_polling()
+    if args.mode == "webhook":
+        webhook_url = f"{config.WEBHOOK_URL.rstrip('/')}/{config.WEBHOOK_PATH}"
+        logger.info("Бот запущен (webhook на %s:%s/%s)...",
+                    config.WEBHOOK_LISTEN, config.WEBHOOK_PORT, config.WEBHOOK_PATH)
+        application.run_webhook(
+            listen=config.WEBHOOK_LISTEN,
+            port=config.WEBHOOK_PORT,
+            url_path=config.WEBHOOK_PATH,
+            secret_token=config.WEBHOOK_SECRET,
+            webhook_url=webhook_url,
+        )
+    else:
+        logger.info("Бот запущен...")
+        application.run_polling()
 
 if __name__ == "__main__":
     main()
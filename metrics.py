@@ -0,0 +1,190 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм в секундах
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self):
+        for labels, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [счётчики по корзинам (последняя — +Inf), сумма, количество]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels=()):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            plain = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{plain} {total}"
+            yield f"{self.name}_count{plain} {count}"
+
+
+class Gauge:
+    """Значение считывается функцией в момент выдачи метрик."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn):
+        self.name = name
+        self.help = help
+        self.fn = fn
+
+    def render(self):
+        yield f"{self.name} {self.fn()}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+handler_seconds = REGISTRY.register(Histogram(
+    "bot_handler_seconds", "Время обработки апдейта", ("handler", "kind")))
+handler_errors = REGISTRY.register(Counter(
+    "bot_handler_errors_total", "Исключения в обработчиках", ("handler", "kind")))
+db_query_seconds = REGISTRY.register(Histogram(
+    "bot_db_query_seconds", "Время запросов к базе в потоках пула"))
+api_call_seconds = REGISTRY.register(Histogram(
+    "bot_api_call_seconds", "Время вызовов Bot API", ("method",)))
+outbound_wait_seconds = REGISTRY.register(Histogram(
+    "bot_outbound_wait_seconds", "Ожидание запроса в очереди исходящих", ("priority",)))
+api_errors = REGISTRY.register(Counter(
+    "bot_api_errors_total", "Ошибки вызовов Bot API", ("method",)))
+search_cache_requests = REGISTRY.register(Counter(
+    "bot_search_cache_requests_total", "Обращения к кешу поиска", ("result",)))
+search_cache_evictions = REGISTRY.register(Counter(
+    "bot_search_cache_evictions_total", "Записи, вытесненные из кеша поиска по размеру"))
+admission_rejected = REGISTRY.register(Counter(
+    "bot_admission_rejected_total", "Апдейты, отброшенные до обработчиков", ("reason",)))
+broadcast_messages = REGISTRY.register(Counter(
+    "bot_broadcast_messages_total", "Сообщения рассылок по результату", ("result",)))
+review_answers = REGISTRY.register(Counter(
+    "bot_review_answers_total", "Оценки карточек повторения", ("grade",)))
+review_reminders = REGISTRY.register(Counter(
+    "bot_review_reminders_total", "Отправленные напоминания о повторении"))
+usage_events_dropped = REGISTRY.register(Counter(
+    "bot_usage_events_dropped_total", "События использования, вытесненные из переполненного буфера"))
+
+# Дополнительные наблюдатели обработчиков: fn(handler, kind, секунды)
+handler_observers = []
+
+
+def timed(handler: str, kind=None):
+    """
+    Декоратор обработчика: пишет время в bot_handler_seconds и считает
+    исключения. kind(update) уточняет вид апдейта, например тип кнопки.
+    Время передаётся и наблюдателям из handler_observers.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(update, context):
+            labels = (handler, kind(update) if kind else "")
+            started = time.perf_counter()
+            try:
+                return await fn(update, context)
+            except Exception:
+                handler_errors.inc(labels)
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                handler_seconds.observe(elapsed, labels)
+                for observer in handler_observers:
+                    observer(*labels, elapsed)
+        return wrapper
+    return decorator
+
+
+async def _serve(reader, writer):
+    try:
+        request_line = await reader.readline()
+        # Заголовки запроса не нужны, но их надо дочитать
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1] == "/metrics":
+            body = REGISTRY.render().encode("utf-8")
+            status = b"200 OK"
+        else:
+            body = b"not found\n"
+            status = b"404 Not Found"
+        writer.write(
+            b"HTTP/1.1 " + status + b"\r\n"
+            b"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+            b"Connection: close\r\n\r\n" + body)
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(host: str, port: int):
+    server = await asyncio.start_server(_serve, host, port)
+    logger.info("Метрики доступны на http://%s:%s/metrics", host, port)
+    return server
@@ -0,0 +1,123 @@
+"""
+Версии схемы базы.
+
+Номер применённой миграции хранится в PRAGMA user_version. При запуске
+читается только он; если база свежая, миграции не выполняются совсем.
+Новая миграция добавляется в конец MIGRATIONS, существующие не меняются.
+Все миграции идемпотентны (IF NOT EXISTS и проверки столбцов), поэтому
+база, созданная до появления версий (user_version = 0), проходит их
+без потерь.
+"""
+import logging
+import time
+
+from analytics import init_usage
+from broadcast import init_broadcasts
+from catalog import init_material_preview
+from formulas import init_formula_files
+from importer import init_import_tables
+from render import init_rendered_chunks
+from review import init_review, init_review_card_flag
+from search import init_normalized_search, init_search_index
+from sessions import init_user_state
+
+logger = logging.getLogger(__name__)
+
+
+def _base_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sections (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS materials (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            section_id INTEGER,
+            title TEXT NOT NULL,
+            content TEXT NOT NULL,
+            FOREIGN KEY (section_id) REFERENCES sections (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS quotes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            author TEXT NOT NULL,
+            quote_text TEXT NOT NULL
+        )
+    ''')
+
+
+def _content_generation(conn):
+    # Счётчик поколения контента: триггеры увеличивают его при любом
+    # изменении разделов, материалов и цитат, каталог по нему понимает, что пора перечитать
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS content_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("INSERT OR IGNORE INTO content_meta (key, value) VALUES ('generation', 1)")
+    for table in ("sections", "materials", "quotes"):
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_generation
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE content_meta SET value = value + 1 WHERE key = 'generation';
+                END
+            ''')
+
+
+def _seed(conn):
+    # Большой литерал с начальным содержимым нужен только при создании базы
+    from seed import fill_initial_data
+    fill_initial_data(conn.cursor())
+
+
+# Порядок важен: номер миграции — её позиция в списке, начиная с 1
+MIGRATIONS = (
+    _base_tables,
+    _content_generation,
+    _seed,
+    init_search_index,        # полнотекстовый индекс по материалам
+    init_rendered_chunks,     # отрисованные части материалов
+    init_import_tables,       # ключи и хеши импортированных материалов
+    init_user_state,          # состояние пользователей
+    init_normalized_search,   # индекс по нормализованному тексту (normalize.py)
+    init_formula_files,       # file_id отправленных картинок формул
+    init_broadcasts,          # подписки и рассылки с курсором
+    init_review,              # карточки повторения и сроки
+    init_usage,               # события использования и дневные счётчики
+    init_review_card_flag,    # признак карточки повторения у материалов
+    init_material_preview,    # начало текста материала для inline-поиска
+)
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn) -> int:
+    """Применяет недостающие миграции, каждую в своей транзакции. Возвращает версию."""
+    version = schema_version(conn)
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"База версии {version} новее кода (версия {SCHEMA_VERSION})")
+    for number in range(version + 1, SCHEMA_VERSION + 1):
+        migration = MIGRATIONS[number - 1]
+        started = time.perf_counter()
+        conn.execute("BEGIN")
+        try:
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        logger.info("Миграция %s (%s) применена за %.0f мс",
+                    number, migration.__name__.lstrip("_"), (time.perf_counter() - started) * 1000)
+    return SCHEMA_VERSION
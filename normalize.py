@@ -0,0 +1,121 @@
+"""
+Нормализация математического текста для поиска.
+
+Одна и та же функция normalize() применяется к материалам при
+индексации и к запросу при поиске, поэтому «xn» находит «xₙ»,
+«sqrt 2» — «√2», «R» — «ℝ», а набранная кириллицей «х» — латинскую x.
+
+* NFKC: нижние и верхние индексы и буквы вроде ℝ, ℕ превращаются в
+  обычные (xₙ → xn, ⁿ√n → n√n, ℝ → R);
+* символы заменяются названиями на двух языках (√ → sqrt корень);
+* ё → е, знаки «_» и «^» убираются (x_n → xn, x^2 → x2);
+* в словах, где смешаны латиница и кириллица, и в однобуквенных словах
+  похожие кириллические буквы заменяются латинскими.
+
+Меняя правила, увеличьте NORMALIZE_VERSION и добавьте миграцию, которая
+вызывает search.reindex_search(): индекс хранит уже нормализованный текст.
+"""
+import re
+import unicodedata
+
+NORMALIZE_VERSION = 1
+
+_ALIASES = {
+    "√": "sqrt корень",
+    "∛": "cbrt корень",
+    "∞": "infty бесконечность",
+    "∀": "forall любой",
+    "∃": "exists существует",
+    "∄": "nexists",
+    "∈": "in принадлежит",
+    "∉": "notin",
+    "⊂": "subset подмножество",
+    "⊆": "subseteq подмножество",
+    "∪": "cup объединение",
+    "∩": "cap пересечение",
+    "∅": "emptyset пустое",
+    "→": "to стремится",
+    "⇒": "implies следует",
+    "⇔": "iff равносильно",
+    "≤": "leq",
+    "≥": "geq",
+    "≠": "neq",
+    "≈": "approx",
+    "±": "pm",
+    "∑": "sum сумма",
+    "∏": "prod произведение",
+    "∫": "int интеграл",
+    "∂": "partial",
+    "α": "alpha альфа",
+    "β": "beta бета",
+    "γ": "gamma гамма",
+    "δ": "delta дельта",
+    "ε": "epsilon эпсилон",
+    "λ": "lambda лямбда",
+    "π": "pi пи",
+    "σ": "sigma сигма",
+}
+
+# Символы окружены пробелами, чтобы «√2» стало «sqrt корень 2», а не «sqrt корень2»
+_FOLD = str.maketrans({
+    **{symbol: f" {names} " for symbol, names in _ALIASES.items()},
+    "ё": "е",
+    "_": "",
+    "^": "",
+})
+
+# Кириллические буквы, которые выглядят как латинские
+_LATIN = str.maketrans("аескмнорстух", "aeckmhopctyx")
+
+_WORD_RE = re.compile(r"\w+")
+# Слово со смесью алфавитов или одна «похожая» кириллическая буква
+_LOOKALIKE_RE = re.compile(r"\b(?:(?=\w*[a-z])(?=\w*[а-я])\w+|[аескмнорстух])\b")
+
+
+def _to_latin(match) -> str:
+    return match.group().translate(_LATIN)
+
+
+def normalize(text: str) -> str:
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", text).lower().translate(_FOLD)
+    return _LOOKALIKE_RE.sub(_to_latin, text)
+
+
+def words(text: str):
+    """Слова нормализованного текста в порядке следования."""
+    return _WORD_RE.findall(normalize(text))
+
+
+# Материал — карточка повторения (review.py), если в названии или первой
+# строке текста есть одна из этих основ
+_CARD_STEMS = ("определени", "критери", "теорем", "аксиом", "принцип", "лемм")
+# Сколько символов от начала текста смотреть в поисках первой строки
+_CARD_HEADING_CHARS = 200
+
+
+def is_review_card(title: str, content: str) -> int:
+    heading = (content or "")[:_CARD_HEADING_CHARS].lstrip().partition("\n")[0]
+    text = f"{title}\n{heading}".lower()
+    return int(any(stem in text for stem in _CARD_STEMS))
+
+
+# Длина начала текста в описании результата inline-поиска
+PREVIEW_LEN = 100
+
+
+def preview(content: str) -> str:
+    # Пробелы схлопываются только в начале текста: весь материал разбивать незачем
+    return " ".join((content or "")[:PREVIEW_LEN * 4].split())[:PREVIEW_LEN]
+
+
+def register_functions(conn):
+    """
+    Делает normalize(), is_review_card() и preview() доступными в SQL
+    (триггеры поискового индекса, признака карточки повторения и начала
+    текста материала).
+    """
+    conn.create_function("math_normalize", 1, normalize, deterministic=True)
+    conn.create_function("math_review_card", 2, is_review_card, deterministic=True)
+    conn.create_function("math_preview", 1, preview, deterministic=True)
@@ -0,0 +1,125 @@
+"""
+Профилирование работающего бота по команде администратора.
+
+/profile [секунды] включает на заданное окно cProfile и tracemalloc, по
+его окончании (или по /profile stop) бот присылает самые затратные
+функции и места, где выросла память, а полный отчёт — файлом. Профилируется
+поток event loop, то есть обработчики, очередь исходящих и фоновые
+задачи; запросы к базе идут в потоках пула, их время видно по
+bot_db_query_seconds и в /stats.
+
+Пока профилирование выключено, никаких хуков не установлено: обработчики
+работают с нулевыми накладными расходами.
+"""
+import asyncio
+import cProfile
+import io
+import logging
+import pstats
+import time
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+# Окно профилирования по умолчанию и наибольшее, секунды
+DEFAULT_WINDOW = 30.0
+MAX_WINDOW = 600.0
+# Сколько кадров стека хранить для каждого выделения памяти
+TRACE_FRAMES = 10
+# Строк в коротком отчёте
+TOP = 15
+# Ожидание событий в select/epoll — простой event loop, а не работа бота
+IDLE_MARKERS = ("select.", "selectors.py")
+
+
+def format_size(size: float) -> str:
+    for unit in ("Б", "КБ", "МБ"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} ГБ"
+
+
+class Profiler:
+    """
+    Одно окно профилирования за раз. start() включает cProfile и
+    tracemalloc и через window секунд вызывает on_done(краткий отчёт,
+    полный отчёт) — если окно остановили раньше, отчёт возвращает stop().
+    """
+
+    def __init__(self):
+        self._profile = None
+        self._snapshot = None
+        self._started = 0.0
+        self._task = None
+
+    @property
+    def active(self) -> bool:
+        return self._profile is not None
+
+    def start(self, window: float = DEFAULT_WINDOW, memory: bool = True, on_done=None):
+        """Возвращает длину окна после ограничения или None, если окно уже идёт."""
+        if self.active:
+            return None
+        window = min(max(window, 1.0), MAX_WINDOW)
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+            self._snapshot = tracemalloc.take_snapshot()
+        self._profile = cProfile.Profile()
+        self._started = time.perf_counter()
+        self._profile.enable()
+        self._task = asyncio.create_task(self._finish_later(window, on_done))
+        logger.info("Профилирование включено на %.0f с", window)
+        return window
+
+    async def _finish_later(self, window, on_done):
+        await asyncio.sleep(window)
+        # Дальше stop() не должен отменять эту задачу: отчёт уже отправляется
+        self._task = None
+        report = self._collect()
+        if on_done is not None:
+            await on_done(*report)
+
+    def stop(self):
+        """Останавливает окно досрочно; (краткий, полный) отчёт или None, если не было."""
+        if not self.active:
+            return None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        return self._collect()
+
+    def _collect(self):
+        self._profile.disable()
+        elapsed = time.perf_counter() - self._started
+        profile, self._profile = self._profile, None
+        memory = None
+        if self._snapshot is not None:
+            memory = tracemalloc.take_snapshot().compare_to(self._snapshot, "lineno")
+            traced, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self._snapshot = None
+        logger.info("Профилирование выключено через %.0f с", elapsed)
+
+        full = io.StringIO()
+        stats = pstats.Stats(profile, stream=full)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(60)
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(60)
+
+        lines = [f"Профиль за {elapsed:.0f} с", "", "Функции по собственному времени:"]
+        busy = [item for item in stats.stats.items()
+                if not any(marker in item[0][0] or marker in item[0][2] for marker in IDLE_MARKERS)]
+        top = sorted(busy, key=lambda item: item[1][2], reverse=True)[:TOP]
+        for (filename, line, name), (_, calls, own, cumulative, _) in top:
+            place = f"{filename.rsplit('/', 1)[-1]}:{line}" if line else filename
+            lines.append(f"{own * 1000:8.1f} мс {cumulative * 1000:8.1f} мс {calls:>7} {name} ({place})")
+        if memory is not None:
+            lines += ["", f"Память: сейчас {format_size(traced)}, пик {format_size(peak)}; рост по строкам:"]
+            for diff in memory[:TOP]:
+                frame = diff.traceback[0]
+                lines.append(f"{format_size(diff.size_diff):>10} {diff.count_diff:>+7} "
+                             f"{frame.filename.rsplit('/', 1)[-1]}:{frame.lineno}")
+            full.write("\nРост памяти по строкам:\n")
+            for diff in memory[:60]:
+                full.write(f"{diff}\n")
+        return "\n".join(lines), full.getvalue()
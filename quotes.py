@@ -0,0 +1,77 @@
+_MASK64 = (1 << 64) - 1
+_ROUNDS = 4
+
+# Постоянное зерно: перестановки зависят только от пользователя и номера
+# круга, поэтому сохранённое состояние ротации остаётся верным после перезапуска
+ROTATION_SEED = 0x6D617468626F74
+
+
+def _mix(x: int) -> int:
+    # splitmix64: дешёвое перемешивание битов для раундовой функции
+    x = (x + 0x9E3779B97F4A7C15) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+def permute(index: int, size: int, key: int) -> int:
+    """
+    Псевдослучайная перестановка [0, size), заданная ключом.
+    Сеть Фейстеля на ближайшей сверху чётной степени двойки плюс обход
+    цикла: значения вне диапазона прогоняются через сеть ещё раз.
+    В среднем меньше четырёх проходов, памяти не требует.
+    """
+    if size <= 1:
+        return 0
+    bits = max(2, (size - 1).bit_length())
+    bits += bits & 1
+    half = bits // 2
+    mask = (1 << half) - 1
+    x = index
+    while True:
+        left, right = x >> half, x & mask
+        for round_no in range(_ROUNDS):
+            left, right = right, left ^ (_mix(key ^ (round_no << 56) ^ right) & mask)
+        x = (left << half) | right
+        if x < size:
+            return x
+
+
+class QuoteRotation:
+    """
+    Выдача цитат без повторов для каждого пользователя.
+    Для пользователя хранится одно число: номер круга и позиция в нём.
+    Порядок внутри круга — перестановка permute() с ключом от пользователя
+    и круга, поэтому выбор следующей цитаты занимает O(1) и не требует
+    хранить перемешанный список.
+    """
+
+    def __init__(self, catalog, seed: int = ROTATION_SEED, state=None):
+        self.catalog = catalog
+        self.seed = seed
+        # user_id -> (круг << 32) | позиция; нужны только get и
+        # присваивание, поэтому можно передать хранилище с сохранением в базу
+        self._state = {} if state is None else state
+
+    def daily(self, day: int):
+        """Цитата дня по номеру дня (date.toordinal()): без повторов в пределах круга."""
+        quotes = self.catalog.quotes
+        size = len(quotes)
+        if not size:
+            return None
+        epoch, position = divmod(day, size)
+        return quotes[permute(position, size, _mix(self.seed ^ epoch))]
+
+    def next_for(self, user_id: int):
+        quotes = self.catalog.quotes
+        size = len(quotes)
+        if not size:
+            return None
+        packed = self._state.get(user_id, 0)
+        epoch, position = packed >> 32, packed & 0xFFFFFFFF
+        if position >= size:
+            epoch += 1
+            position = 0
+        key = _mix(self.seed ^ _mix(user_id & _MASK64) ^ epoch)
+        self._state[user_id] = (epoch << 32) | (position + 1)
+        return quotes[permute(position, size, key)]
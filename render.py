@@ -0,0 +1,171 @@
+import hashlib
+import html
+import re
+
+MAX_MESSAGE_LEN = 4096
+
+# Меняется при любом изменении формата вывода, чтобы сохранённые
+# в rendered_chunks части перерисовались
+RENDER_VERSION = 3
+
+_SLASH_RE = re.compile(r'/(?=[0-9A-Za-zА-Яа-я])')
+
+
+def neutralize_slashes_for_telegram(text_html_escaped: str) -> str:
+    """
+    Заменяет обычный '/' на символ деления '∕' (U+2215), если сразу
+    после слэша идёт буква или цифра. Так '/2', '/n', '/k' и т.п.
+    перестают считаться командами Telegram.
+    Работает по уже экранированному HTML-тексту.
+    """
+    # Меняем только шаблон "слэш + буква/цифра", чтобы ссылки с протоколом и прочие случаи не трогать
+    return _SLASH_RE.sub('∕', text_html_escaped)
+
+
+def content_hash(title: str, content: str) -> str:
+    digest = hashlib.sha1(f"{RENDER_VERSION}\0{title}\0{content}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def utf16_len(text: str) -> int:
+    """Длина в единицах UTF-16 — так Telegram считает лимит длины сообщения."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _hard_split(text: str, limit: int, joiner: str):
+    # Кусок без пробелов длиннее страницы: режем по символам, не разрывая суррогатных пар
+    piece = []
+    size = 0
+    for char in text:
+        width = 2 if ord(char) > 0xFFFF else 1
+        if size + width > limit:
+            yield joiner, "".join(piece)
+            joiner = ""
+            piece = []
+            size = 0
+        piece.append(char)
+        size += width
+    yield joiner, "".join(piece)
+
+
+def _units(text: str, limit: int, separators=("\n\n", "\n", " "), joiner: str = ""):
+    """
+    Куски текста не длиннее limit с разделителем перед каждым: абзацы,
+    слишком длинный абзац — строки, слишком длинная строка — слова.
+    """
+    if utf16_len(text) <= limit:
+        yield joiner, text
+        return
+    if not separators:
+        yield from _hard_split(text, limit, joiner)
+        return
+    separator, rest = separators[0], separators[1:]
+    for i, part in enumerate(text.split(separator)):
+        yield from _units(part, limit, rest, separator if i else joiner)
+
+
+def split_pages(text: str, first_limit: int, limit: int = MAX_MESSAGE_LEN) -> list:
+    """
+    Делит текст на страницы по границам абзацев: первая не длиннее
+    first_limit, остальные — limit единиц UTF-16. Разделитель и пробельные
+    куски на границе страниц отбрасываются: страница из одних пробелов —
+    пустой текст, который Telegram не примет.
+    """
+    pages = []
+    current = []
+    size = 0
+    budget = first_limit
+    for joiner, piece in _units(text, min(first_limit, limit)):
+        width = utf16_len(piece)
+        if current and size + utf16_len(joiner) + width > budget:
+            pages.append("".join(current))
+            current = []
+            size = 0
+            budget = limit
+        if current:
+            current.append(joiner)
+            size += utf16_len(joiner)
+        elif pages and not piece.strip():
+            continue
+        current.append(piece)
+        size += width
+    if current or not pages:
+        pages.append("".join(current))
+    return pages
+
+
+def material_pages(title: str, content: str) -> list:
+    """Текст страниц материала до экранирования, без заголовка."""
+    return split_pages(content, MAX_MESSAGE_LEN - utf16_len(f"{title}\n\n"))
+
+
+def render_material(title: str, content: str) -> tuple:
+    """
+    Готовит материал к отправке с parse_mode='HTML': режет на страницы не
+    длиннее лимита Telegram, экранирует и убирает автодетект команд.
+    Первая страница начинается с заголовка.
+
+    Лимит в 4096 символов Telegram применяет к тексту после разбора
+    разметки и считает в единицах UTF-16, поэтому страницы меряются по
+    исходному тексту, а экранируются после разбиения: граница страницы
+    не попадает внутрь HTML-сущности, а &lt; считается одним символом.
+    """
+    pages = material_pages(title, content)
+
+    # Экранируем HTML и убираем автодетект команд Telegram ("/2", "/n", "/k" и т.п.);
+    # замена '/' на '∕' длину не меняет
+    chunks = [neutralize_slashes_for_telegram(html.escape(page)) for page in pages]
+    chunks[0] = f"<b>{html.escape(title)}</b>\n\n" + chunks[0]
+    return tuple(chunks)
+
+
+def init_rendered_chunks(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS rendered_chunks (
+            material_id INTEGER NOT NULL,
+            chunk_no INTEGER NOT NULL,
+            content_hash TEXT NOT NULL,
+            text TEXT NOT NULL,
+            PRIMARY KEY (material_id, chunk_no)
+        ) WITHOUT ROWID
+    ''')
+
+
+def sync_rendered(conn, materials, save: bool = True) -> dict:
+    """
+    Возвращает {material_id: части} для всех материалов.
+    Берёт готовые части из rendered_chunks, если хеш содержимого совпадает,
+    иначе перерисовывает материал и сохраняет результат (если save —
+    соединение только на чтение сохранять не может).
+    """
+    stored = {}
+    for material_id, chunk_no, digest, text in conn.execute(
+            "SELECT material_id, chunk_no, content_hash, text FROM rendered_chunks "
+            "ORDER BY material_id, chunk_no"):
+        stored.setdefault(material_id, (digest, []))[1].append(text)
+
+    rendered = {}
+    stale = []
+    fresh_rows = []
+    for material in materials:
+        digest = content_hash(material.title, material.content)
+        cached = stored.pop(material.id, None)
+        if cached is not None and cached[0] == digest:
+            rendered[material.id] = tuple(cached[1])
+            continue
+        chunks = render_material(material.title, material.content)
+        rendered[material.id] = chunks
+        if cached is not None:
+            stale.append((material.id,))
+        fresh_rows.extend((material.id, n, digest, text) for n, text in enumerate(chunks))
+
+    # Оставшиеся в stored материалы удалены из базы
+    stale.extend((material_id,) for material_id in stored)
+    if save and (stale or fresh_rows):
+        conn.executemany("DELETE FROM rendered_chunks WHERE material_id = ?", stale)
+        conn.executemany(
+            "INSERT INTO rendered_chunks (material_id, chunk_no, content_hash, text) VALUES (?, ?, ?, ?)",
+            fresh_rows,
+        )
+        conn.commit()
+    return rendered
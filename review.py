@@ -0,0 +1,330 @@
+"""
+Повторение определений и теорем карточками.
+
+Карточка — материал, в названии или заголовке которого есть определение,
+теорема, критерий, аксиома, принцип или лемма (признак review_card
+в materials, его ведут триггеры при записи материала): пользователь видит
+название, вспоминает формулировку, открывает текст материала и оценивает,
+насколько легко вспомнил. По оценке алгоритм в духе SM-2 назначает
+следующее повторение: интервал растёт в «лёгкость» раз, лёгкость
+меняется от оценки, забытая карточка возвращается через RELEARN_DELAY.
+
+Состояние — таблица review_cards (пользователь × карточка) с индексом
+(user_id, due): «что повторять сейчас» — чтение начала диапазона индекса
+одного пользователя, сколько бы строк ни было в таблице. Ближайший срок
+пользователя хранится в review_users; при запуске из неё строится куча
+в памяти (когда в следующий раз посмотреть на пользователя), и фоновая
+задача пачками рассылает напоминания тем, у кого подошёл срок, не чаще
+раза в REMIND_GAP.
+"""
+import asyncio
+import heapq
+import logging
+import time
+
+from telegram.error import Forbidden
+
+from metrics import review_answers, review_reminders
+from normalize import register_functions
+from sender import BULK
+
+logger = logging.getLogger(__name__)
+
+DAY = 86400.0
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+# Через сколько секунд вернуть забытую карточку
+RELEARN_DELAY = 600.0
+# Напоминать не чаще, чем раз в столько секунд, и не раньше, чем через
+# столько же после последнего повторения
+REMIND_GAP = 20 * 3600.0
+REMIND_INTERVAL = 60.0
+REMIND_BATCH = 500
+# Через сколько секунд повторить напоминание, которое не удалось отправить
+REMIND_RETRY = 3600.0
+# Сколько секунд помнить свежие ответы: запись через RemoteWriter доходит
+# до базы не мгновенно, и карточка не должна показаться снова
+RECENT_TTL = 60.0
+
+REMINDER_TEXT = "🧠 Пора повторить карточки: определения и теоремы ждут."
+
+
+def init_review(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS review_cards (
+            user_id INTEGER NOT NULL,
+            card_id INTEGER NOT NULL,
+            due REAL NOT NULL,
+            interval REAL NOT NULL,
+            ease REAL NOT NULL,
+            reps INTEGER NOT NULL,
+            lapses INTEGER NOT NULL,
+            PRIMARY KEY (user_id, card_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS review_cards_due ON review_cards (user_id, due)")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS review_users (
+            user_id INTEGER PRIMARY KEY,
+            next_due REAL,
+            seen_at REAL NOT NULL
+        )
+    ''')
+
+
+def init_review_card_flag(conn):
+    """
+    Признак карточки считается один раз при записи материала функцией
+    math_review_card (normalize.py), а не при каждой загрузке каталога.
+    """
+    register_functions(conn)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(materials)")}
+    if "review_card" not in columns:
+        conn.execute("ALTER TABLE materials ADD COLUMN review_card INTEGER NOT NULL DEFAULT 0")
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS materials_review_card_insert AFTER INSERT ON materials
+        BEGIN
+            UPDATE materials SET review_card = math_review_card(new.title, new.content) WHERE id = new.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS materials_review_card_update AFTER UPDATE OF title, content ON materials
+        BEGIN
+            UPDATE materials SET review_card = math_review_card(new.title, new.content) WHERE id = new.id;
+        END
+    ''')
+    conn.execute("UPDATE materials SET review_card = math_review_card(title, content)")
+
+
+def sm2(interval: float, ease: float, reps: int, lapses: int, quality: int):
+    """
+    Новое состояние карточки после оценки quality от 0 до 5:
+    (интервал в днях, лёгкость, повторений подряд, забываний).
+    Оценка ниже 3 — карточка забыта: интервал 0, серия начинается заново.
+    """
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    if quality < 3:
+        return 0.0, ease, 0, lapses + 1
+    if reps == 0:
+        interval = 1.0
+    elif reps == 1:
+        interval = 6.0
+    else:
+        interval = round(interval * ease)
+    return interval, ease, reps + 1, lapses
+
+
+def _due_cards(conn, user_id, now, limit):
+    return conn.execute('''
+        SELECT card_id FROM review_cards
+        WHERE user_id = ? AND due <= ? ORDER BY due LIMIT ?
+    ''', (user_id, now, limit)).fetchall()
+
+
+def _due_count(conn, user_id, now):
+    return conn.execute(
+        "SELECT count(*) FROM review_cards WHERE user_id = ? AND due <= ?", (user_id, now)).fetchone()[0]
+
+
+def _user_cards(conn, user_id):
+    return [row[0] for row in conn.execute("SELECT card_id FROM review_cards WHERE user_id = ?", (user_id,))]
+
+
+def _answer_state(conn, user_id, card_id):
+    # Состояние карточки и ближайший срок остальных карточек пользователя
+    state = conn.execute(
+        "SELECT interval, ease, reps, lapses FROM review_cards WHERE user_id = ? AND card_id = ?",
+        (user_id, card_id)).fetchone()
+    other = conn.execute(
+        "SELECT min(due) FROM review_cards WHERE user_id = ? AND card_id != ?", (user_id, card_id)).fetchone()[0]
+    return state, other
+
+
+def _save_answer(conn, user_id, card_id, due, interval, ease, reps, lapses, next_due, now):
+    conn.execute('''
+        INSERT OR REPLACE INTO review_cards (user_id, card_id, due, interval, ease, reps, lapses)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (user_id, card_id, due, interval, ease, reps, lapses))
+    conn.execute('''
+        INSERT INTO review_users (user_id, next_due, seen_at) VALUES (?, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET next_due = excluded.next_due, seen_at = excluded.seen_at
+    ''', (user_id, next_due, now))
+
+
+def _save_seen(conn, rows):
+    conn.executemany("UPDATE review_users SET seen_at = ? WHERE user_id = ?", rows)
+
+
+def _forget_users(conn, user_ids):
+    conn.executemany("UPDATE review_users SET next_due = NULL WHERE user_id = ?", [(u,) for u in user_ids])
+
+
+def _load_users(conn, shard=None):
+    sql = "SELECT user_id, next_due, seen_at FROM review_users WHERE next_due IS NOT NULL"
+    if shard is None:
+        return conn.execute(sql).fetchall()
+    index, count = shard
+    return conn.execute(sql + " AND user_id % ? = ?", (count, index)).fetchall()
+
+
+class ReviewEngine:
+    """
+    Выбор карточек, оценки и напоминания. Чтение — из базы по индексу,
+    запись — через `writer` (база или RemoteWriter рабочего процесса);
+    `shard` = (номер, всего) ограничивает кучу напоминаний пользователями
+    этого процесса, как в SessionStore.
+    """
+
+    def __init__(self, db, catalog, outbound, reminder_markup=None, writer=None, shard=None):
+        self.db = db
+        self.catalog = catalog
+        self.outbound = outbound
+        self.reminder_markup = reminder_markup
+        self.writer = writer or db
+        self.shard = shard
+        self.cards = ()
+        # user_id -> ближайший срок и время последнего повторения или напоминания
+        self._next_due = {}
+        self._seen = {}
+        # Куча (когда посмотреть, user_id); запись устарела, если время
+        # не совпадает с _check_at[user_id]
+        self._heap = []
+        self._check_at = {}
+        # user_id -> {card_id: (срок, когда ответил)}
+        self._recent = {}
+        self._bot = None
+        self._task = None
+        catalog.add_listener(self._reload_cards)
+
+    def _reload_cards(self, catalog):
+        self.cards = tuple(material.id for material in catalog.materials() if material.review_card)
+
+    def load_sync(self):
+        with self.db.connection() as conn:
+            rows = _load_users(conn, self.shard)
+        self._next_due = {user_id: next_due for user_id, next_due, _ in rows}
+        self._seen = {user_id: seen_at for user_id, _, seen_at in rows}
+        self._check_at = {user_id: max(next_due, seen_at + REMIND_GAP) for user_id, next_due, seen_at in rows}
+        self._heap = [(check_at, user_id) for user_id, check_at in self._check_at.items()]
+        heapq.heapify(self._heap)
+        logger.info("Повторение: %s пользователей с карточками", len(self._heap))
+
+    @property
+    def scheduled(self) -> int:
+        return len(self._check_at)
+
+    def _schedule(self, user_id: int):
+        next_due = self._next_due.get(user_id)
+        if next_due is None:
+            self._check_at.pop(user_id, None)
+            return
+        check_at = max(next_due, self._seen.get(user_id, 0.0) + REMIND_GAP)
+        self._check_at[user_id] = check_at
+        heapq.heappush(self._heap, (check_at, user_id))
+
+    def _recently_answered(self, user_id: int, now: float) -> dict:
+        recent = self._recent.get(user_id)
+        if not recent:
+            return {}
+        for card_id in [card_id for card_id, (_, at) in recent.items() if now - at > RECENT_TTL]:
+            del recent[card_id]
+        if not recent:
+            del self._recent[user_id]
+        return recent
+
+    async def next_card(self, user_id: int):
+        """(материал, новая ли карточка) — самая просроченная, иначе новая; None, если всё повторено."""
+        now = time.time()
+        recent = self._recently_answered(user_id, now)
+        for (card_id,) in await self.db.run(_due_cards, user_id, now, len(recent) + 5):
+            if card_id in recent and recent[card_id][0] > now:
+                continue
+            material = self.catalog.material(card_id)
+            if material is not None:
+                return material, False
+        known = set(await self.db.run(_user_cards, user_id))
+        known.update(recent)
+        for card_id in self.cards:
+            if card_id not in known:
+                return self.catalog.material(card_id), True
+        return None
+
+    async def due_count(self, user_id: int) -> int:
+        return await self.db.run(_due_count, user_id, time.time())
+
+    def next_review(self, user_id: int):
+        """Когда у пользователя подойдёт следующая карточка (unix time) или None."""
+        return self._next_due.get(user_id)
+
+    async def grade(self, user_id: int, card_id: int, quality: int):
+        now = time.time()
+        state, other = await self.db.run(_answer_state, user_id, card_id)
+        interval, ease, reps, lapses = sm2(*(state or (0.0, INITIAL_EASE, 0, 0)), quality)
+        due = now + (interval * DAY if interval else RELEARN_DELAY)
+        next_due = due if other is None else min(due, other)
+        self._recent.setdefault(user_id, {})[card_id] = (due, now)
+        await self.writer.run(_save_answer, user_id, card_id, due, interval, ease, reps, lapses, next_due, now)
+        review_answers.inc((str(quality),))
+        self._next_due[user_id] = next_due
+        self._seen[user_id] = now
+        self._schedule(user_id)
+
+    def start(self, bot):
+        if self._task is None:
+            self._bot = bot
+            self._task = asyncio.create_task(self._remind_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _remind_loop(self):
+        while True:
+            await asyncio.sleep(REMIND_INTERVAL)
+            try:
+                while await self.remind_due() == REMIND_BATCH:
+                    pass
+            except Exception:
+                logger.exception("Не удалось разослать напоминания")
+
+    async def remind_due(self) -> int:
+        """Напоминает пачке пользователей, у которых подошёл срок; возвращает размер пачки."""
+        now = time.time()
+        users = []
+        while self._heap and self._heap[0][0] <= now and len(users) < REMIND_BATCH:
+            check_at, user_id = heapq.heappop(self._heap)
+            if self._check_at.get(user_id) == check_at:
+                users.append(user_id)
+        if not users:
+            return 0
+        results = await asyncio.gather(
+            *(self.outbound.send(user_id, self._bot.send_message, user_id, REMINDER_TEXT,
+                                 reply_markup=self.reminder_markup, priority=BULK) for user_id in users),
+            return_exceptions=True)
+        seen = []
+        gone = []
+        for user_id, result in zip(users, results):
+            if isinstance(result, Forbidden):
+                # Бот заблокирован: больше не напоминать
+                gone.append(user_id)
+                self._next_due.pop(user_id, None)
+            elif isinstance(result, Exception):
+                logger.warning("Не удалось напомнить %s: %s", user_id, result)
+                self._check_at[user_id] = retry_at = now + REMIND_RETRY
+                heapq.heappush(self._heap, (retry_at, user_id))
+                continue
+            else:
+                seen.append((now, user_id))
+                self._seen[user_id] = now
+            self._schedule(user_id)
+        review_reminders.inc(amount=len(seen))
+        if seen:
+            await self.writer.run(_save_seen, seen)
+        if gone:
+            await self.writer.run(_forget_users, gone)
+        return len(users)
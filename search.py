@@ -0,0 +1,381 @@
+import base64
+import hashlib
+import re
+import asyncio
+import secrets
+import struct
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from metrics import search_cache_evictions, search_cache_requests
+from normalize import register_functions, words
+
+# Вес заголовка в bm25 относительно текста материала
+TITLE_WEIGHT = 10.0
+CONTENT_WEIGHT = 1.0
+SNIPPET_TOKENS = 16
+# Результатов на странице /search
+PAGE_SIZE = 5
+
+# Слова и отдельные символы исходного текста, из них собирается фрагмент
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_MATCH_TERM_RE = re.compile(r'"([^"]*)"\*')
+
+# Окончания русских слов, от длинных к коротким. Это не полноценный
+# стеммер Портера, но для запросов вида «пределы», «аксиомой»,
+# «доказательства» хватает: отрезаем окончание и ищем по префиксу.
+_RU_ENDINGS = sorted((
+    "ами", "ями", "ией", "иям", "иях", "ием", "ого", "его", "ому", "ему",
+    "ыми", "ими", "ой", "ей", "ий", "ый", "ая", "яя", "ое", "ее", "ые", "ие",
+    "ых", "их", "ым", "им", "ую", "юю", "ам", "ям", "ах", "ях", "ом", "ем",
+    "ов", "ев", "ия", "ие", "ию", "ии", "ть", "ся", "а", "я", "о", "е", "ы",
+    "и", "у", "ю", "ь", "й",
+), key=len, reverse=True)
+_MIN_STEM = 4
+
+
+class SearchResult(NamedTuple):
+    id: int
+    title: str
+    snippet: str
+    section_name: str
+    rank: float
+
+
+def stem(word: str) -> str:
+    word = word.lower()
+    if not re.search("[а-яё]", word):
+        return word
+    for ending in _RU_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def build_match_query(text: str) -> str:
+    """
+    Превращает пользовательский запрос в выражение FTS5 MATCH:
+    каждое слово — префиксный поиск по основе, все слова обязательны.
+    Слова берутся в кавычки, поэтому синтаксис FTS5 из запроса не проходит.
+    """
+    return " ".join(f'"{term}"*' for term in query_terms(text))
+
+
+def query_terms(text: str):
+    """Основы слов запроса после той же нормализации, что и у индекса."""
+    return [term for term in (stem(word) for word in words(text)) if term]
+
+
+def make_snippet(text: str, terms, size: int = SNIPPET_TOKENS) -> str:
+    """
+    Фрагмент исходного текста вокруг слова, нормализованная форма которого
+    начинается с основы запроса, как в префиксном поиске FTS5; первое
+    слово запроса важнее остальных. Индекс хранит нормализованный текст,
+    поэтому snippet() из FTS5 показал бы его, а не то, что написано в материале.
+    """
+    tokens = list(_TOKEN_RE.finditer(text))
+    if not tokens:
+        return ""
+    normalized = [None] * len(tokens)
+    hit = 0
+    for term in terms:
+        found = None
+        for i, token in enumerate(tokens):
+            if normalized[i] is None:
+                normalized[i] = words(token.group())
+            if any(word.startswith(term) for word in normalized[i]):
+                found = i
+                break
+        if found is not None:
+            hit = found
+            break
+    start = max(0, min(hit - size // 4, len(tokens) - size))
+    end = min(len(tokens), start + size)
+    fragment = text[tokens[start].start():tokens[end - 1].end()]
+    return ("…" if start else "") + fragment + ("…" if end < len(tokens) else "")
+
+
+def init_search_index(conn):
+    """Создаёт FTS5-индекс по материалам и триггеры синхронизации."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'materials_fts'"
+    ).fetchone()
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS materials_fts USING fts5(
+            title, content,
+            content='materials', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    ''')
+    # Индекс с внешним содержимым: триггеры повторяют изменения materials
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS materials_fts_insert AFTER INSERT ON materials
+        BEGIN
+            INSERT INTO materials_fts (rowid, title, content)
+            VALUES (new.id, new.title, new.content);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS materials_fts_delete AFTER DELETE ON materials
+        BEGIN
+            INSERT INTO materials_fts (materials_fts, rowid, title, content)
+            VALUES ('delete', old.id, old.title, old.content);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS materials_fts_update AFTER UPDATE ON materials
+        BEGIN
+            INSERT INTO materials_fts (materials_fts, rowid, title, content)
+            VALUES ('delete', old.id, old.title, old.content);
+            INSERT INTO materials_fts (rowid, title, content)
+            VALUES (new.id, new.title, new.content);
+        END
+    ''')
+    if not exists:
+        # Индекс появился у базы, где материалы уже есть
+        conn.execute("INSERT INTO materials_fts (materials_fts) VALUES ('rebuild')")
+
+
+def init_normalized_search(conn):
+    """
+    Заменяет индекс по исходному тексту индексом по нормализованному
+    (normalize.py). Текст нормализуется в триггерах функцией
+    math_normalize, поэтому она должна быть зарегистрирована в каждом
+    соединении, которое меняет materials (см. db.py). Индекс хранит
+    нормализованный текст сам: внешнее содержимое здесь не подходит.
+    """
+    register_functions(conn)
+    for event in ("insert", "delete", "update"):
+        conn.execute(f"DROP TRIGGER IF EXISTS materials_fts_{event}")
+    conn.execute("DROP TABLE IF EXISTS materials_fts")
+    conn.execute('''
+        CREATE VIRTUAL TABLE materials_fts USING fts5(
+            title, content,
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER materials_fts_insert AFTER INSERT ON materials
+        BEGIN
+            INSERT INTO materials_fts (rowid, title, content)
+            VALUES (new.id, math_normalize(new.title), math_normalize(new.content));
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER materials_fts_delete AFTER DELETE ON materials
+        BEGIN
+            DELETE FROM materials_fts WHERE rowid = old.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER materials_fts_update AFTER UPDATE OF title, content ON materials
+        BEGIN
+            DELETE FROM materials_fts WHERE rowid = old.id;
+            INSERT INTO materials_fts (rowid, title, content)
+            VALUES (new.id, math_normalize(new.title), math_normalize(new.content));
+        END
+    ''')
+    reindex_search(conn)
+
+
+def reindex_search(conn):
+    """Переиндексирует все материалы, например после изменения правил нормализации."""
+    conn.execute("DELETE FROM materials_fts")
+    conn.execute('''
+        INSERT INTO materials_fts (rowid, title, content)
+        SELECT id, math_normalize(title), math_normalize(content) FROM materials
+    ''')
+
+
+_RANK = f"bm25(materials_fts, {TITLE_WEIGHT}, {CONTENT_WEIGHT})"
+
+
+def _search(conn, match: str, limit: int, after=None, before=None):
+    """
+    Страница результатов по ключу (rank, id): after — позиция последнего
+    результата предыдущей страницы, before — первого результата следующей.
+    Возвращает (результаты, есть ли ещё в направлении листания).
+    Страница выбирается условием по ключу, а не OFFSET, поэтому дальние
+    страницы стоят столько же, сколько первая; фрагменты текста
+    строятся только для строк страницы.
+    """
+    if before is not None:
+        keyset, order, params = f"AND ({_RANK}, rowid) < (?, ?)", "DESC", before
+    elif after is not None:
+        keyset, order, params = f"AND ({_RANK}, rowid) > (?, ?)", "ASC", after
+    else:
+        keyset, order, params = "", "ASC", ()
+    hits = conn.execute(f'''
+        SELECT rowid, {_RANK} FROM materials_fts
+        WHERE materials_fts MATCH ? {keyset}
+        ORDER BY {_RANK} {order}, rowid {order}
+        LIMIT ?
+    ''', (match, *params, limit + 1)).fetchall()
+    more = len(hits) > limit
+    hits = sorted(hits[:limit], key=lambda hit: (hit[1], hit[0]))
+    if not hits:
+        return [], more
+    ranks = dict(hits)
+    rows = conn.execute(f'''
+        SELECT m.id, m.title, m.content, s.name
+        FROM materials m
+        JOIN sections s ON s.id = m.section_id
+        WHERE m.id IN ({", ".join("?" * len(hits))})
+    ''', tuple(ranks)).fetchall()
+    terms = _MATCH_TERM_RE.findall(match)
+    results = [SearchResult(material_id, title, make_snippet(content, terms), section_name, ranks[material_id])
+               for material_id, title, content, section_name in rows]
+    results.sort(key=lambda result: (result.rank, result.id))
+    return results, more
+
+
+def _count(conn, match: str) -> int:
+    return conn.execute(
+        "SELECT count(*) FROM materials_fts WHERE materials_fts MATCH ?", (match,)
+    ).fetchone()[0]
+
+
+async def search_materials(db, query: str, limit: int = 5, cache=None):
+    """
+    Возвращает (лучшие `limit` результатов, общее число совпадений).
+    С кешем одинаковые после нормализации запросы не доходят до базы;
+    результаты из кеша общие, менять их нельзя.
+    """
+    match = build_match_query(query)
+    if not match:
+        return [], 0
+
+    async def compute():
+        results, more = await db.run(_search, match, limit)
+        total = await db.run(_count, match) if more else len(results)
+        return results, total
+
+    if cache is None:
+        return await compute()
+    return await cache.fetch(("first", match, limit), compute)
+
+
+async def search_page(db, match: str, limit: int, after=None, before=None, cache=None):
+    if cache is None:
+        return await db.run(_search, match, limit, after, before)
+    return await cache.fetch(("page", match, limit, after, before),
+                             lambda: db.run(_search, match, limit, after, before))
+
+
+class SearchCache:
+    """
+    LRU-кеш результатов поиска с временем жизни. Ключ — выражение MATCH,
+    то есть запрос после нормализации и выделения основ, поэтому
+    «Пределы» и «предел» попадают в одну запись. Запись помечена
+    поколением контента каталога: после любого изменения материалов
+    старые записи считаются промахом. Одновременные промахи по одному
+    ключу ждут один запрос к базе.
+    """
+
+    def __init__(self, catalog, size: int = 1024, ttl: float = 300.0):
+        self.catalog = catalog
+        self.size = size
+        self.ttl = ttl
+        # ключ -> (поколение, момент истечения, значение)
+        self._entries = OrderedDict()
+        self._pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            generation, expires, value = entry
+            if generation == self.catalog.generation and expires > time.monotonic():
+                self._entries.move_to_end(key)
+                return value
+            del self._entries[key]
+        return None
+
+    def put(self, key, value, generation):
+        self._entries[key] = (generation, time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+            search_cache_evictions.inc()
+
+    async def fetch(self, key, compute):
+        value = self._lookup(key)
+        if value is not None:
+            self.hits += 1
+            search_cache_requests.inc(("hit",))
+            return value
+        pending = self._pending.get(key)
+        if pending is not None:
+            # Такой же запрос уже выполняется: ждём его, в базу не идём
+            self.coalesced += 1
+            search_cache_requests.inc(("coalesced",))
+            return await asyncio.shield(pending)
+        self.misses += 1
+        search_cache_requests.inc(("miss",))
+        # Поколение до запроса: если контент сменится во время запроса,
+        # запись сразу окажется устаревшей
+        generation = self.catalog.generation
+        future = self._pending[key] = asyncio.ensure_future(compute())
+        try:
+            value = await asyncio.shield(future)
+        finally:
+            self._pending.pop(key, None)
+        self.put(key, value, generation)
+        return value
+
+
+def encode_cursor(rank: float, material_id: int) -> str:
+    """Позиция (rank, id) в 22 символах base64 для callback_data."""
+    packed = struct.pack(">dq", rank, material_id)
+    return base64.urlsafe_b64encode(packed).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(text: str):
+    return struct.unpack(">dq", base64.urlsafe_b64decode(text + "=="))
+
+
+class SearchQueries:
+    """
+    Запросы, результаты которых листают кнопками. В callback_data
+    помещается только 64 байта, поэтому текст запроса остаётся здесь,
+    а в кнопку попадает его короткий случайный номер: порядковый номер
+    после перезапуска или в другом рабочем процессе указал бы на чужой
+    запрос. Хранятся последние `size` запросов; для вытесненного придётся
+    повторить /search.
+    """
+
+    def __init__(self, size: int = 10000):
+        self.size = size
+        self._queries = OrderedDict()
+
+    def add(self, text: str, match: str, total: int) -> str:
+        query_id = secrets.token_urlsafe(6)
+        while query_id in self._queries:
+            query_id = secrets.token_urlsafe(6)
+        self._queries[query_id] = (text, match, total)
+        if len(self._queries) > self.size:
+            self._queries.popitem(last=False)
+        return query_id
+
+    def get(self, query_id: str):
+        """(текст, выражение MATCH, число результатов) или None."""
+        entry = self._queries.get(query_id)
+        if entry is not None:
+            self._queries.move_to_end(query_id)
+        return entry
+
+
+def match_tag(match: str) -> str:
+    """Короткий хеш выражения MATCH: кнопка листания проверяет, что номер указывает на тот же запрос."""
+    digest = hashlib.blake2b(match.encode("utf-8"), digest_size=4).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
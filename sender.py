@@ -0,0 +1,281 @@
+import asyncio
+import heapq
+import logging
+import time
+from collections import deque
+from datetime import timedelta
+
+from telegram.error import RetryAfter
+
+from metrics import api_call_seconds, api_errors, outbound_wait_seconds
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты: ответы на действия пользователя обгоняют массовые рассылки
+INTERACTIVE = 0
+BULK = 1
+
+# Лимиты Telegram: ~30 сообщений в секунду на бота, ~1 в секунду в личный
+# чат (с короткими всплесками) и ~20 в минуту в группу
+GLOBAL_RATE = 30.0
+CHAT_RATE = 1.0
+CHAT_BURST = 3
+GROUP_RATE = 20 / 60
+GROUP_BURST = 3
+
+MAX_RETRIES = 3
+# RetryAfter в двух разных чатах в пределах этого окна — значит, упёрлись
+# в общий лимит бота, и на паузу встаёт вся очередь
+GLOBAL_RETRY_WINDOW = 1.0
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Сколько секунд ждать до появления токена."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def full_in(self, now: float) -> float:
+        self._refill(now)
+        return (self.capacity - self.tokens) / self.rate
+
+
+class _Job:
+    __slots__ = ("name", "priority", "call", "future", "enqueued", "attempts")
+
+    def __init__(self, name, priority, call, future, enqueued):
+        self.name = name
+        self.priority = priority
+        self.call = call
+        self.future = future
+        self.enqueued = enqueued
+        self.attempts = 0
+
+
+class _ChatState:
+    __slots__ = ("bucket", "jobs", "in_flight", "paused_until")
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.jobs = deque()
+        self.in_flight = False
+        self.paused_until = 0.0
+
+
+def _retry_delay(error: RetryAfter) -> float:
+    delay = error.retry_after
+    if isinstance(delay, timedelta):
+        return delay.total_seconds()
+    return float(delay)
+
+
+class OutboundScheduler:
+    """
+    Единая очередь исходящих запросов к Bot API.
+
+    Запросы в один чат уходят строго по порядку и не чаще лимита чата,
+    все вместе — не чаще глобального лимита бота. Из готовых к отправке
+    чатов первым обслуживается тот, у кого приоритет выше. На RetryAfter
+    чат ставится на паузу на указанное время, и запрос повторяется; если
+    RetryAfter почти одновременно пришёл в другой чат, на паузу ставится
+    вся очередь.
+    """
+
+    def __init__(self, global_rate: float = GLOBAL_RATE, chat_rate: float = CHAT_RATE):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self._global = None
+        self._chats = {}
+        self._ready = []
+        self._seq = 0
+        self._paused_until = 0.0
+        self._last_retry = (None, float("-inf"))
+        self._wakeup = None
+        self._dispatcher = None
+        self._tasks = set()
+        # Метрики
+        self.queued = 0
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def start(self):
+        if self._dispatcher is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._global = TokenBucket(self.global_rate, self.global_rate, loop.time())
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def stop(self):
+        if self._dispatcher is None:
+            return
+        self._dispatcher.cancel()
+        try:
+            await self._dispatcher
+        except asyncio.CancelledError:
+            pass
+        self._dispatcher = None
+        for state in self._chats.values():
+            for job in state.jobs:
+                job.future.cancel()
+        self._chats.clear()
+        self._ready.clear()
+        self.queued = 0
+
+    async def send(self, chat_id: int, method, *args, priority: int = INTERACTIVE, **kwargs):
+        """Ставит вызов method(*args, **kwargs) в очередь и ждёт его результата."""
+        loop = asyncio.get_running_loop()
+        job = _Job(getattr(method, "__name__", "call"), priority,
+                   lambda: method(*args, **kwargs), loop.create_future(), loop.time())
+        state = self._chats.get(chat_id)
+        if state is None:
+            if chat_id < 0:
+                bucket = TokenBucket(GROUP_RATE, GROUP_BURST, loop.time())
+            else:
+                bucket = TokenBucket(self.chat_rate, CHAT_BURST, loop.time())
+            state = self._chats[chat_id] = _ChatState(bucket)
+        state.jobs.append(job)
+        self.queued += 1
+        if len(state.jobs) == 1 and not state.in_flight:
+            self._schedule(chat_id, state)
+        return await job.future
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "wait_avg_ms": self.wait_total / self.sent * 1000 if self.sent else 0.0,
+            "wait_max_ms": self.wait_max * 1000,
+        }
+
+    def _schedule(self, chat_id, state):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        delay = max(state.bucket.delay(now), state.paused_until - now)
+        if delay > 0:
+            loop.call_later(delay, self._push, chat_id, state)
+        else:
+            self._push(chat_id, state)
+
+    def _push(self, chat_id, state):
+        if not state.jobs or self._chats.get(chat_id) is not state:
+            return
+        self._seq += 1
+        heapq.heappush(self._ready, (state.jobs[0].priority, self._seq, chat_id))
+        self._wakeup.set()
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._ready:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            now = loop.time()
+            wait = max(self._global.delay(now), self._paused_until - now)
+            if wait > 0:
+                # Пока ждём, может прийти запрос с более высоким приоритетом
+                await asyncio.sleep(wait)
+                continue
+
+            _, _, chat_id = heapq.heappop(self._ready)
+            state = self._chats.get(chat_id)
+            if state is None or not state.jobs:
+                continue
+            job = state.jobs.popleft()
+            self.queued -= 1
+            if job.future.cancelled():
+                self._after(chat_id, state)
+                continue
+
+            self._global.take(now)
+            state.bucket.take(now)
+            state.in_flight = True
+            waited = now - job.enqueued
+            outbound_wait_seconds.observe(waited, (PRIORITY_NAMES.get(job.priority, str(job.priority)),))
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            task = asyncio.create_task(self._perform(chat_id, state, job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _perform(self, chat_id, state, job):
+        loop = asyncio.get_running_loop()
+        labels = (job.name,)
+        started = time.perf_counter()
+        try:
+            result = await job.call()
+        except RetryAfter as error:
+            api_errors.inc(labels)
+            delay = _retry_delay(error)
+            self.retries += 1
+            job.attempts += 1
+            now = loop.time()
+            logger.warning("RetryAfter %.1f с для чата %s", delay, chat_id)
+            state.paused_until = now + delay
+            last_chat, last_at = self._last_retry
+            if last_chat != chat_id and now - last_at <= GLOBAL_RETRY_WINDOW:
+                logger.warning("RetryAfter в нескольких чатах: пауза всей очереди на %.1f с", delay)
+                self._paused_until = max(self._paused_until, now + delay)
+            self._last_retry = (chat_id, now)
+            if job.attempts <= MAX_RETRIES:
+                state.jobs.appendleft(job)
+                self.queued += 1
+            else:
+                self.failed += 1
+                if not job.future.done():
+                    job.future.set_exception(error)
+        except Exception as error:
+            api_errors.inc(labels)
+            self.failed += 1
+            if not job.future.done():
+                job.future.set_exception(error)
+        else:
+            self.sent += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            api_call_seconds.observe(time.perf_counter() - started, labels)
+            state.in_flight = False
+            self._after(chat_id, state)
+
+    def _after(self, chat_id, state):
+        if state.jobs:
+            self._schedule(chat_id, state)
+            return
+        # Пустой чат забываем, когда его ведро наполнится: раньше нельзя,
+        # иначе новый запрос получит полный запас токенов
+        loop = asyncio.get_running_loop()
+        loop.call_later(state.bucket.full_in(loop.time()), self._forget, chat_id, state)
+
+    def _forget(self, chat_id, state):
+        if not state.jobs and not state.in_flight and self._chats.get(chat_id) is state:
+            del self._chats[chat_id]
@@ -0,0 +1,181 @@
+import asyncio
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Сколько последних запросов поиска помнить
+RECENT_SEARCHES = 5
+# Строк на одну транзакцию при сбросе
+FLUSH_BATCH = 500
+
+
+def init_user_state(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_state (
+            user_id INTEGER PRIMARY KEY,
+            last_material INTEGER,
+            bookmarks TEXT NOT NULL DEFAULT '[]',
+            searches TEXT NOT NULL DEFAULT '[]',
+            quote_state INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL NOT NULL
+        )
+    ''')
+
+
+class UserState:
+    """Состояние одного пользователя; кортежи вместо списков экономят память."""
+    __slots__ = ("last_material", "bookmarks", "searches", "quote_state")
+
+    def __init__(self, last_material=None, bookmarks=(), searches=(), quote_state=0):
+        self.last_material = last_material
+        self.bookmarks = bookmarks
+        self.searches = searches
+        self.quote_state = quote_state
+
+
+def _load(conn, shard=None):
+    sql = "SELECT user_id, last_material, bookmarks, searches, quote_state FROM user_state"
+    if shard is None:
+        return conn.execute(sql).fetchall()
+    index, count = shard
+    return conn.execute(sql + " WHERE user_id % ? = ?", (count, index)).fetchall()
+
+
+def _write(conn, rows):
+    for start in range(0, len(rows), FLUSH_BATCH):
+        conn.executemany('''
+            INSERT OR REPLACE INTO user_state
+                (user_id, last_material, bookmarks, searches, quote_state, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', rows[start:start + FLUSH_BATCH])
+        conn.commit()
+
+
+class QuoteStates:
+    """
+    Словарь состояний ротации цитат для QuoteRotation, который хранит
+    значения в записях пользователей и тем самым переживает перезапуск.
+    """
+
+    def __init__(self, sessions):
+        self.sessions = sessions
+
+    def get(self, user_id: int, default=0):
+        state = self.sessions.get(user_id)
+        return state.quote_state if state is not None else default
+
+    def __setitem__(self, user_id: int, value: int):
+        self.sessions.touch(user_id).quote_state = value
+
+
+class SessionStore:
+    """
+    Состояние пользователей в памяти с отложенной записью.
+    Обработчики меняют только словарь и отмечают пользователя как
+    изменённого; фоновая задача раз в `interval` секунд пишет изменённые
+    записи пачками в одной транзакции на пачку, поэтому в обработчиках
+    нет синхронной записи в базу.
+
+    В рабочем процессе (workers.py) запись идёт через `writer` —
+    RemoteWriter процесса-писателя, а `shard` = (номер, всего) ограничивает
+    загрузку пользователями этого процесса.
+    """
+
+    def __init__(self, db, interval: float = 2.0, writer=None, shard=None):
+        self.db = db
+        self.writer = writer or db
+        self.shard = shard
+        self.interval = interval
+        self._states = {}
+        self._dirty = set()
+        self._task = None
+        self.quote_states = QuoteStates(self)
+
+    def load_sync(self):
+        with self.db.connection() as conn:
+            rows = _load(conn, self.shard)
+        self._states = {
+            user_id: UserState(last_material, tuple(json.loads(bookmarks)),
+                               tuple(json.loads(searches)), quote_state)
+            for user_id, last_material, bookmarks, searches, quote_state in rows
+        }
+        logger.info("Загружено состояние %s пользователей", len(self._states))
+
+    def __len__(self):
+        return len(self._states)
+
+    @property
+    def dirty(self) -> int:
+        return len(self._dirty)
+
+    def get(self, user_id: int):
+        return self._states.get(user_id)
+
+    def touch(self, user_id: int) -> UserState:
+        """Запись пользователя для изменения; попадёт в ближайший сброс."""
+        state = self._states.get(user_id)
+        if state is None:
+            state = self._states[user_id] = UserState()
+        self._dirty.add(user_id)
+        return state
+
+    def viewed(self, user_id: int, material_id: int):
+        state = self._states.get(user_id)
+        if state is None or state.last_material != material_id:
+            self.touch(user_id).last_material = material_id
+
+    def searched(self, user_id: int, text: str):
+        state = self.touch(user_id)
+        searches = tuple(s for s in state.searches if s != text)
+        state.searches = ((text,) + searches)[:RECENT_SEARCHES]
+
+    def toggle_bookmark(self, user_id: int, material_id: int) -> bool:
+        """Добавляет или убирает закладку; True, если закладка теперь есть."""
+        state = self.touch(user_id)
+        if material_id in state.bookmarks:
+            state.bookmarks = tuple(b for b in state.bookmarks if b != material_id)
+            return False
+        state.bookmarks += (material_id,)
+        return True
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def flush(self) -> int:
+        if not self._dirty:
+            return 0
+        dirty, self._dirty = self._dirty, set()
+        now = time.time()
+        rows = []
+        for user_id in dirty:
+            state = self._states[user_id]
+            rows.append((user_id, state.last_material, json.dumps(state.bookmarks),
+                         json.dumps(state.searches, ensure_ascii=False), state.quote_state, now))
+        try:
+            await self.writer.run(_write, rows)
+        except Exception:
+            # Не потерять изменения: вернуть пользователей в следующий сброс
+            self._dirty |= dirty
+            raise
+        return len(rows)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Не удалось сохранить состояние пользователей")
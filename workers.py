@@ -0,0 +1,198 @@
+"""
+Бот в нескольких процессах.
+
+    python workers.py --workers 4
+    python workers.py --workers 4 --mode webhook
+
+Главный процесс применяет миграции и импорт, загружает каталог вместе с
+отрисованными материалами и порождает рабочие процессы через fork. Каталог
+и клавиатуры достаются рабочим от родителя общими страницами памяти:
+gc.freeze() перед fork убирает эти объекты из-под сборщика мусора, чтобы
+он не трогал их и не вынуждал копировать страницы. Рабочие открывают базу
+только на чтение (mode=ro) с mmap, так что страницы файла базы тоже
+общие — в кеше ОС. Каталог рабочий перечитывает сам, когда меняется
+поколение контента.
+
+Апдейты получает главный процесс (polling или webhook) и раздаёт рабочим
+по user_id % N (по чату, если пользователя нет): состояние пользователя,
+его поисковые запросы, лимиты допуска и напоминания о повторении живут
+в одном процессе. Записи рабочих (состояние пользователей, оценки
+карточек, статистика использования, file_id картинок) идут через очередь
+в главный процесс — единственного писателя базы; там же работает импорт
+из CONTENT_DIR. Рассылки подписчикам ведёт рабочий 0. Глобальный лимит
+исходящих делится между рабочими поровну, метрики рабочий N отдаёт на
+METRICS_PORT + N.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+
+from telegram import Bot, Update
+from telegram.ext import Updater
+from telegram.request import HTTPXRequest
+
+import config
+import main
+from db import Database, RemoteWriter
+from importer import ContentWatcher
+
+logger = logging.getLogger(__name__)
+
+
+def shard_of(update: Update, count: int) -> int:
+    if update.effective_user is not None:
+        return update.effective_user.id % count
+    if update.effective_chat is not None:
+        return update.effective_chat.id % count
+    return update.update_id % count
+
+
+def _worker(index: int, count: int, inbox, writes):
+    # Ctrl+C приходит всей группе процессов; останавливает рабочих главный процесс
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    main.db.readonly = True
+    main.db.open()
+    writer = RemoteWriter(writes)
+    main.sessions.writer = writer
+    main.sessions.shard = (index, count)
+    main.sessions.load_sync()
+    main.broadcaster.writer = writer
+    main.usage.writer = writer
+    main.reviews.writer = writer
+    main.reviews.shard = (index, count)
+    main.reviews.load_sync()
+    # Рассылку ведёт один процесс: курсор и список подписчиков общие
+    config.BROADCASTS = config.BROADCASTS and index == 0
+    if main.formula_images is not None:
+        main.formula_images.writer = writer
+        main.formula_images.load_sync()
+    main.content_watcher = None
+    main.outbound.global_rate = config.OUTBOUND_GLOBAL_RATE / count
+    if config.METRICS_PORT:
+        config.METRICS_PORT += index
+    asyncio.run(_work(index, inbox))
+
+
+async def _work(index: int, inbox):
+    application = main.build_application(updater=False)
+    await application.initialize()
+    await main.on_startup(application)
+    await application.start()
+    logger.info("Рабочий процесс %s запущен (pid %s)", index, os.getpid())
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            data = await loop.run_in_executor(None, inbox.get)
+            if data is None:
+                break
+            await application.update_queue.put(Update.de_json(json.loads(data), application.bot))
+    finally:
+        await application.stop()
+        await main.on_shutdown(application)
+        await application.shutdown()
+
+
+async def _forward(updates: asyncio.Queue, inboxes):
+    while True:
+        update = await updates.get()
+        inboxes[shard_of(update, len(inboxes))].put(update.to_json())
+
+
+async def _receive(mode: str, inboxes, content_watcher):
+    # Как в ApplicationBuilder: длинный опрос getUpdates идёт по своему соединению
+    bot = Bot(config.BOT_TOKEN, get_updates_request=HTTPXRequest(),
+              **({"base_url": config.BOT_API_URL} if config.BOT_API_URL else {}))
+    updates = asyncio.Queue()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    async with Updater(bot, updates) as updater:
+        if mode == "webhook":
+            webhook_url = f"{config.WEBHOOK_URL.rstrip('/')}/{config.WEBHOOK_PATH}"
+            await updater.start_webhook(
+                listen=config.WEBHOOK_LISTEN,
+                port=config.WEBHOOK_PORT,
+                url_path=config.WEBHOOK_PATH,
+                secret_token=config.WEBHOOK_SECRET,
+                webhook_url=webhook_url,
+            )
+        else:
+            await updater.start_polling()
+        if content_watcher is not None:
+            content_watcher.start()
+        logger.info("Бот запущен: %s рабочих процессов, режим %s", len(inboxes), mode)
+        forward = asyncio.create_task(_forward(updates, inboxes))
+        await stop.wait()
+        await updater.stop()
+        forward.cancel()
+        # Уже полученные апдейты не теряем
+        while not updates.empty():
+            update = updates.get_nowait()
+            inboxes[shard_of(update, len(inboxes))].put(update.to_json())
+        if content_watcher is not None:
+            await content_watcher.stop()
+
+
+def serve(mode: str, count: int):
+    main.db.open()
+    main.init_database()
+    main.catalog.load_sync(render=True)
+    # Соединения и потоки пула не переживают fork: рабочие открывают базу заново
+    main.db.close()
+    gc.freeze()
+
+    context = multiprocessing.get_context("fork")
+    writes = context.Queue()
+    inboxes = [context.Queue() for _ in range(count)]
+    workers = [context.Process(target=_worker, args=(index, count, inbox, writes), name=f"worker-{index}")
+               for index, inbox in enumerate(inboxes)]
+    for process in workers:
+        process.start()
+
+    writer = Database(main.db.path, size=1)
+    writer.open()
+    writing = threading.Thread(target=writer.serve_writes, args=(writes,), name="writer")
+    writing.start()
+    content_watcher = None
+    if config.CONTENT_DIR:
+        # Каталог главного процесса нужен только для того, чтобы после импорта
+        # сохранить отрисовку новых материалов в rendered_chunks
+        main.catalog.db = writer
+        content_watcher = ContentWatcher(writer, main.catalog, config.CONTENT_DIR, config.CONTENT_POLL_INTERVAL)
+    try:
+        asyncio.run(_receive(mode, inboxes, content_watcher))
+    finally:
+        for inbox in inboxes:
+            inbox.put(None)
+        for process in workers:
+            process.join()
+        # Рабочие сбросили состояние пользователей в очередь перед выходом
+        writes.put(None)
+        writing.join()
+        writer.close()
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="число рабочих процессов (по умолчанию по числу ядер)")
+    parser.add_argument("--mode", choices=("polling", "webhook"), default=config.BOT_MODE,
+                        help="способ получения апдейтов (по умолчанию BOT_MODE или polling)")
+    args = parser.parse_args()
+    if not config.BOT_TOKEN:
+        parser.error("задайте BOT_TOKEN — токен бота от @BotFather")
+    if args.mode == "webhook" and not config.WEBHOOK_URL:
+        parser.error("для режима webhook задайте WEBHOOK_URL — внешний адрес, который сообщается Telegram")
+    serve(args.mode, max(1, args.workers))
+
+
+if __name__ == "__main__":
+    cli()